@@ -0,0 +1,132 @@
+import os
+import sys
+import time
+import random
+import argparse
+import datetime
+import tempfile
+import subprocess
+import shutil
+
+# Load-time benchmark for the record: CSVProcessor reading record2025.csv (read_csv with the
+# Decimal / quantity / time converters, and read_fixed with fixed-point amounts) against
+# reading the same rows from the Arrow directory written by columnar.py. Only
+# the load (CSVProcessor.read_record) is timed, each load in a fresh process, not the name
+# conversions that follow it; the frames must hold the same values (the fixed-point amounts
+# those of the Decimals, in units of 1/SCALE).
+#
+#   python bench_columnar.py                 # a year: 2.7M rows, 365 days, 17 branches
+#   python bench_columnar.py --record record2025.csv
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import columnar
+from pandasbiggs import CSVProcessor, MONEY, SCALE
+
+PRODUCTS = ["CARROT CAKE", "CHICKEN BBQ", "PORK SISIG", "HALO-HALO", "GUEST COUNT", "ICED TEA", "BIGGS BURGER, SPECIAL"]
+DEPARTMENTS = ["CAKES", "MEALS", "DESSERTS", "DRINKS", "REPRESENTATION"]
+DAYPARTS = ["Breakfast", "Lunch", "PM Snack", "Dinner", "GY"]
+
+
+def synth_record(path, rows, days=365, branches=17, seed=0):
+    # a record2025.csv-shaped file: rows spread evenly over the days of 2025, branches and pos;
+    # prices come from a fixed menu, so amounts repeat as they do in the exports
+    rng = random.Random(seed)
+    menu = [rng.randint(2000, 40000) / 100 for item in range(401)]
+    start = datetime.date(2025, 1, 1)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write(",".join(columnar.HEADERS) + "\n")
+        for i in range(rows):
+            day = start + datetime.timedelta(days=i * days // rows)
+            item = rng.randint(0, 400)
+            price = menu[item]
+            quantity = rng.choice([1, 1, 1, 2, 3, 0.5])
+            vat = price / 1.12
+            f.write('%d,"=""%08d""",IT%03d,%.3f,%.3f,%.4f,%.4f,"=""%d""",%s,%d:%02d,,T,1,%.4f,%.4f,%.4f,%.4f,%08d,"%s","%s",,"Take-Out",%s,00001,CASH,,BR%02d\n' % (
+                rng.randint(1, 2), i // 3, item, quantity, price, price * quantity, 0.0, rng.randint(1, 20),
+                day.isoformat(), rng.randint(6, 23), rng.randint(0, 59),
+                vat / 12, vat, rng.choice([0.0, 0.0, vat / 5]), vat, i // 3, rng.choice(PRODUCTS), rng.choice(DEPARTMENTS), rng.choice(DAYPARTS), rng.randint(1, branches)))
+
+
+def processor(fixed=True):
+    # a CSVProcessor with just what read_record() needs (no conversion tables)
+    proc = CSVProcessor.__new__(CSVProcessor)
+    proc.fixed = fixed
+    proc.columns = {name: 'str' for name in columnar.HEADERS if name not in columnar.AMOUNTS + ["DATE", "TIME"]}
+    return proc
+
+
+def cold_load(path, repeat, fixed=True):
+    # best of `repeat` loads, each in a fresh process (imports are not timed), and the frame's size
+    best = None
+    for i in range(repeat):
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "--load", path] + ([] if fixed else ["--decimal"]), check=True, capture_output=True, text=True).stdout
+        rows, elapsed, size = out.split()[-3:]
+        best = float(elapsed) if best is None else min(best, float(elapsed))
+    return best, int(rows), float(size)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=2700000, help='synthetic record rows (a year of latest/ is about 2.7M)')
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--branches', type=int, default=17)
+    parser.add_argument('--record', default=None, help='an existing record CSV instead of a synthetic one')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--load', default=None, help=argparse.SUPPRESS)  # one timed load, for cold_load()
+    parser.add_argument('--decimal', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.load:
+        started = time.perf_counter()
+        frame = processor(not args.decimal).read_record(args.load)
+        print(len(frame), time.perf_counter() - started, frame.memory_usage(deep=True).sum() / 1e6)
+        sys.exit(0)
+
+    workdir = tempfile.mkdtemp(prefix="bench_columnar_")
+    record = args.record or os.path.join(workdir, "record.csv")
+    if not args.record:
+        synth_record(record, args.rows, args.days, args.branches)
+    root = os.path.join(workdir, "arrow")
+    started = time.perf_counter()
+    columnar.convert(record, root)
+    print("arrow    converted in %.1fs" % (time.perf_counter() - started))
+
+    # all timed loads first: the frames held for the comparison below take most of the memory;
+    # "csv" is the Decimal load every other one is measured against
+    csv_time, rows, frame_size = cold_load(record, args.repeat, fixed=False)
+    print("%-9s %7.3fs  %9.0f rows/sec  %4.0f MB  frame %4.0f MB" % ("csv", csv_time, rows / csv_time, os.path.getsize(record) / 1e6, frame_size))
+    load_time, rows, frame_size = cold_load(record, args.repeat)
+    print("%-9s %7.3fs  %9.0f rows/sec  %4.0f MB  frame %4.0f MB  (%.1fx)" % ("csv-fixed", load_time, rows / load_time, os.path.getsize(record) / 1e6, frame_size, csv_time / load_time))
+    size = sum(os.path.getsize(os.path.join(root, name)) for name in os.listdir(root) if name.endswith(columnar.SUFFIX))
+    load_time, rows, frame_size = cold_load(root, args.repeat)
+    print("%-9s %7.3fs  %9.0f rows/sec  %4.0f MB  frame %4.0f MB  (%.1fx)" % ("arrow", load_time, rows / load_time, size / 1e6, frame_size, csv_time / load_time))
+
+    def differ(expected, actual):
+        return [name for name in expected.columns
+                if expected[name].dtype != actual[name].dtype
+                or not ((expected[name] == actual[name]) | (expected[name].isna() & actual[name].isna())).all()]
+
+    # the fixed-point frame holds the Decimal frame's values, amounts in units of 1/SCALE
+    proc = processor()
+    expected = proc.read_record(record)
+    decimals = processor(fixed=False).read_record(record)
+    failed = False
+    for name in MONEY:
+        decimals[name] = [int(value * SCALE) for value in decimals[name]]
+    if differ(decimals, expected):
+        print("csv-fixed frames differ: columns %s" % differ(decimals, expected))
+        failed = True
+    del decimals
+
+    # columnar files come back grouped by date and branch; compare as sorted frames
+    order = ["DATE", "BRANCH", "POS", "TRANSACTION NUMBER", "OR", "ITEM CODE", "TIME"]
+    expected = expected.sort_values(order, kind="stable").reset_index(drop=True)
+    actual = proc.read_record(root).sort_values(order, kind="stable").reset_index(drop=True)
+    if len(expected) != len(actual) or differ(expected, actual):
+        print("arrow frames differ: %d vs %d rows, columns %s" % (len(expected), len(actual), differ(expected, actual)))
+        failed = True
+    del actual
+    shutil.rmtree(workdir)
+    if failed:
+        sys.exit(1)
+    print("frames equal (%d rows)" % len(expected))
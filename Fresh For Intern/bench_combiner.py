@@ -0,0 +1,132 @@
+import os
+import io
+import sys
+import time
+import shutil
+import argparse
+import datetime
+import contextlib
+from standin_server import FILETYPES, synth_unit, make_workspace
+
+# Offline benchmark for Combiner.generate() on synthetic multi-branch days: every
+# (branch, pos, date) gets the seven exports from standin_server.synth_unit() in latest/ (or
+# the real exports copied from --recorded DIR), and each variant combines the same files
+# into its own record file.
+#
+#   python bench_combiner.py --branches 27 --rows 5000
+#   python bench_combiner.py --days 30 --rows 200 --variants uncached buffered
+#   python bench_combiner.py --recorded ../latest --variants buffered frame --verify
+#
+# "per-row" is the old csvGenAppend (open, append one line, close for every row),
+# "buffered" the RecordWriter that stays open for the whole run, "frame" the vectorized
+# frame_engine, "parallel" and "parallel-frame" the same engines on --workers processes,
+# "uncached" the buffered variant building every reference table again. Each run starts
+# with an empty refcache; the master files repeat across --days, so the hit count shows
+# what the cache saves. Every output is compared with the first variant's; --verify also
+# lists the first rows that differ.
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import refcache
+from combiner import Combiner
+
+
+class PerRowCombiner(Combiner):
+
+    def csvGenAppend(self, filename, line):
+        with open(self.record_file, "a", encoding="utf-8") as f_out:
+            f_out.write(str(line) + "\n")
+
+
+VARIANTS = {
+    "per-row": lambda workers, **kw: PerRowCombiner(engine="rows", workers=1, **kw),
+    "uncached": lambda workers, ref_cache, **kw: Combiner(engine="rows", workers=1, ref_cache=refcache.RefCache(0), **kw),
+    "buffered": lambda workers, **kw: Combiner(engine="rows", workers=1, **kw),
+    "frame": lambda workers, **kw: Combiner(engine="frame", workers=1, **kw),
+    "parallel": lambda workers, **kw: Combiner(engine="rows", workers=workers, **kw),
+    "parallel-frame": lambda workers, **kw: Combiner(engine="frame", workers=workers, **kw),
+}
+
+
+def write_days(folder, branches, dates, rows):
+    for date, branch in [(date, branch) for date in dates for branch in branches]:
+        for pos in ("1", "2"):
+            files = synth_unit(branch, pos, date, rows)
+            for ftype in FILETYPES:
+                with open(os.path.join(folder, "a_%s_%s_%s_%s_20-00_.csv" % (branch, pos, ftype, date)), "wb") as f:
+                    f.write(files[ftype])
+
+
+def copy_recorded(folder, recorded):
+    for name in os.listdir(recorded):
+        if name.endswith(".csv"):
+            shutil.copyfile(os.path.join(recorded, name), os.path.join(folder, name))
+
+
+def compare(name, path, reference, show):
+    with open(reference, "r", encoding="utf-8") as f:
+        expected = f.read().splitlines()
+    with open(path, "r", encoding="utf-8") as f:
+        actual = f.read().splitlines()
+    differing = [i for i in range(max(len(expected), len(actual)))
+                 if i >= len(expected) or i >= len(actual) or expected[i] != actual[i]]
+    print("%-14s %s" % (name, "identical to %s" % os.path.basename(reference) if not differing else
+                          "%d of %d rows differ" % (len(differing), len(expected))))
+    for i in differing[:show]:
+        print("  row %d\n    expected %s\n    actual   %s" % (i, expected[i] if i < len(expected) else "<missing>",
+                                                            actual[i] if i < len(actual) else "<missing>"))
+    return not differing
+
+
+def run(name, workspace, repeat, workers):
+    best = None
+    for i in range(repeat):
+        out_file = os.path.join(workspace, "record_%s.csv" % name)
+        if os.path.exists(out_file):
+            os.unlink(out_file)
+        combiner = VARIANTS[name](workers, workdir=os.path.join(workspace, "latest"), out_file=out_file, ref_cache=refcache.RefCache())
+        started = time.time()
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            combiner.generate()
+        elapsed = time.time() - started
+        best = elapsed if best is None else min(best, elapsed)
+    rows = rows_in(out_file)
+    print("%-14s %7.2fs  %8d rows  %9.0f rows/sec  %5d cache hits  %5d misses" % (
+        name, best, rows, rows / best, combiner.ref_cache.hits + combiner.ref_cache.disk_hits, combiner.ref_cache.misses))
+    return out_file
+
+
+def rows_in(path):
+    with open(path, "rb") as f:
+        return sum(1 for _ in f) - 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--branches', type=int, default=10)
+    parser.add_argument('--rows', type=int, default=2000, help='rd5000 lines per (branch, pos)')
+    parser.add_argument('--date', default=(datetime.date.today() - datetime.timedelta(days=1)).isoformat(), help='last date')
+    parser.add_argument('--days', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--recorded', default=None, help='combine real exports from this directory instead')
+    parser.add_argument('--variants', nargs='+', choices=list(VARIANTS), default=list(VARIANTS))
+    parser.add_argument('--verify', action='store_true', help='show the first differing rows')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='processes for the parallel variants')
+    args = parser.parse_args()
+
+    branches = ["BR%02d" % i for i in range(1, args.branches + 1)]
+    recorded = os.path.abspath(args.recorded) if args.recorded else None
+    workspace = make_workspace(branches)
+    os.chdir(workspace)
+    try:
+        if recorded:
+            copy_recorded(os.path.join(workspace, "latest"), recorded)
+        else:
+            end = datetime.date.fromisoformat(args.date)
+            dates = [(end - datetime.timedelta(days=i)).isoformat() for i in reversed(range(args.days))]
+            write_days(os.path.join(workspace, "latest"), branches, dates, args.rows)
+        outputs = [run(name, workspace, args.repeat, args.workers) for name in args.variants]
+        same = [compare(name, path, outputs[0], 5 if args.verify else 0) for name, path in zip(args.variants[1:], outputs[1:])]
+        if not all(same):
+            sys.exit(1)
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
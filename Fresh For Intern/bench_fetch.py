@@ -0,0 +1,113 @@
+import os
+import io
+import sys
+import time
+import shutil
+import argparse
+import datetime
+import contextlib
+from standin_server import StandInServer, make_workspace
+
+# Offline load benchmark for the fetch path: runs Receive.fetch()/fetch_async()/
+# fetch_pipelined()/fetch_incremental()/fetch_stream()/missing_fetch() against standin_server.py
+# in a throwaway workspace and reports files/sec, bytes/sec, per-request latency percentiles
+# and how long after the start the first unit was combined.
+#
+#   python bench_fetch.py --mode fetch_async --concurrency 8 --branches 27 --days 2 \
+#       --rows 2000 --latency 0.03 --error-rate 0.01
+#
+# --repeat 2 runs the same range again in the same workspace, which shows what the
+# listing cache, raw store and journal save on a re-run.
+
+MODES = ["fetch", "fetch_async", "fetch_pipelined", "fetch_incremental", "fetch_stream", "missing"]
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))]
+
+
+def first_combined(journal_path, since):
+    # seconds from `since` to the first unit the journal marks combined in this run (the
+    # journal keeps whole seconds)
+    since = int(since)
+    stamps = []
+    if os.path.exists(journal_path):
+        with open(journal_path, "r") as f:
+            for line in f:
+                fields = line.rstrip("\n").split("\t")
+                if len(fields) == 7 and fields[3] in ("combined", "empty") and int(fields[6]) >= since:
+                    stamps.append(int(fields[6]))
+    return min(stamps) - since if stamps else float("nan")
+
+
+def run_once(args, server, branches, start, end):
+    from fetcher import Receive
+    from scheduler import FetchScheduler
+
+    rep = Receive(start, end)
+    rep.baseUrl = server.base_url
+    rep.scheduler = FetchScheduler(rate=args.rate)
+    requests_before = server.requests
+    started = time.time()
+    with contextlib.redirect_stdout(io.StringIO()) as log, contextlib.redirect_stderr(log):
+        if args.mode == "fetch":
+            rep.fetch()
+        elif args.mode == "fetch_async":
+            rep.fetch_async(args.concurrency)
+        elif args.mode == "fetch_pipelined":
+            rep.fetch_pipelined(args.concurrency)
+        elif args.mode == "fetch_incremental":
+            rep.fetch_incremental(args.concurrency)
+        elif args.mode == "fetch_stream":
+            rep.fetch_stream(args.tee)
+        else:
+            days = [d.strftime("%Y-%m-%d") for d in rep.dlist]
+            rep.missing_fetch({branch: {1: days, 2: days} for branch in branches})
+    elapsed = time.time() - started
+    latencies = [value for stats in rep.scheduler.stats.values() for value in stats.latencies]
+    failures = sum(stats.failures for stats in rep.scheduler.stats.values())
+    print("%-17s %6.2fs  %5d files  %7.1f files/sec  %7.2f MB/sec  p50 %.1fms  p99 %.1fms  %5d server requests  %3d failed  %4d restored  first combined +%.0fs" % (
+        args.mode, elapsed, rep.filesFetched, rep.filesFetched / elapsed, rep.bytesFetched / 1e6 / elapsed,
+        percentile(latencies, 50) * 1000, percentile(latencies, 99) * 1000,
+        server.requests - requests_before, failures, rep.storeHits, first_combined(rep.parentDir + "/journal.log", started)))
+    if args.verbose:
+        sys.stdout.write(log.getvalue())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mode', choices=MODES, default="fetch_async")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--branches', type=int, default=5, help='first N branches of settings/branches.txt')
+    parser.add_argument('--days', type=int, default=1)
+    parser.add_argument('--end', default=None, help='last date fetched (YYYY-MM-DD), default yesterday')
+    parser.add_argument('--rows', type=int, default=500, help='rd5000 lines per (branch, pos, date)')
+    parser.add_argument('--snapshots', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate', type=float, default=1000.0, help='scheduler requests/sec ceiling')
+    parser.add_argument('--recorded', default=None, help='serve real exports from this directory instead')
+    parser.add_argument('--tee', action='store_true', help='fetch_stream: also write the raw files')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    with open("settings/branches.txt", "r") as f:
+        branches = [row.strip() for row in f.read().splitlines() if row.strip()][:args.branches]
+    end = datetime.date.fromisoformat(args.end) if args.end else datetime.date.today() - datetime.timedelta(days=1)
+    start = end - datetime.timedelta(days=args.days - 1)
+
+    recorded = os.path.abspath(args.recorded) if args.recorded else None
+    server = StandInServer(latency=args.latency, error_rate=args.error_rate, rows=args.rows, snapshots=args.snapshots, recorded=recorded).start()
+    workspace = make_workspace(branches)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(workspace)
+    try:
+        for i in range(args.repeat):
+            run_once(args, server, branches, start.isoformat(), end.isoformat())
+    finally:
+        server.shutdown()
+        shutil.rmtree(workspace, ignore_errors=True)
@@ -0,0 +1,63 @@
+import argparse
+import contextlib
+import datetime
+import io
+import os
+import shutil
+import time
+import requests
+from fetcher import Receive
+from scheduler import FetchScheduler
+from standin_server import StandInServer, make_workspace
+
+# Connection-reuse benchmark: drives Receive.send()/download_file() against the local
+# stand-in for biggsph.com (standin_server.py) and compares it with the old
+# one-connection-per-call pattern.
+#   python bench_http.py --calls 500
+
+def run(server, calls, call):
+    # returns (seconds, TCP connections accepted by the stand-in)
+    server.connections = 0
+    started = time.time()
+    with contextlib.redirect_stdout(io.StringIO()):  # send() logs every call
+        for i in range(calls):
+            call(i)
+    return time.time() - started, server.connections
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=300)
+    args = parser.parse_args()
+
+    server = StandInServer(rows=100).start()
+    base = server.base_url
+    # fresh workspace, today's date and unique file names so neither the listing cache nor
+    # the raw store short-circuits a request
+    workspace = make_workspace(["BMC"])
+    os.chdir(workspace)
+    today = datetime.date.today().isoformat()
+    names = ["a_BMC_1_rd5000_%s_%05d_.csv" % (today, i) for i in range(args.calls * 2)]
+
+    rep = Receive(today, today)
+    rep.baseUrl = base
+    rep.scheduler = FetchScheduler(rate=1e6)
+
+    def fresh(i):
+        # what send()/download_file() did before: a new connection per call
+        requests.Session().post(base + "fetch_list2.php", data={'branch': 'BMC', 'pos': 1, 'date': today}).text
+        with requests.get(base + "uploads/" + names[i], stream=True) as r:
+            for chunk in r.iter_content(chunk_size=8192):
+                pass
+
+    def pooled(i):
+        rep.send("BMC", 1, today)
+        rep.download_file("uploads/" + names[args.calls + i], "temp")
+
+    try:
+        for label, call in (("fresh", fresh), ("pooled", pooled)):
+            elapsed, connections = run(server, args.calls, call)
+            print("%-8s %5d requests  %6.2fs  %8.1f req/sec  %5d TCP connections" % (label, args.calls * 2, elapsed, args.calls * 2 / elapsed, connections))
+    finally:
+        server.shutdown()
+        shutil.rmtree(workspace, ignore_errors=True)
@@ -0,0 +1,85 @@
+import os
+import sys
+import time
+import argparse
+from standin_server import synth_unit
+
+# Micro-benchmark for the per-row rd5000 transform: Combiner.stringifyAppend() against a
+# RowPlan compiled once for the file (rowplan.py), on the same rows and reference tables.
+# Only the transform is timed, no reading or writing; the two outputs must be identical.
+#
+#   python bench_rowplan.py --rows 100000
+#   python bench_rowplan.py --recorded ../latest/a_BMC_1_rd5000_2026-02-09_20-00_.csv
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from combiner import Combiner, REFERENCE_TYPES, TYPE_DICT, TIME_DICT
+from rowplan import RowPlan, split_row
+
+
+def load(args):
+    # (rd5000 lines, {file type: lines}) of one unit
+    if args.recorded:
+        path = os.path.abspath(args.recorded)
+        files = {}
+        for ftype in ["rd5000"] + REFERENCE_TYPES:
+            name = path.replace("_rd5000_", "_%s_" % ftype)
+            if os.path.exists(name):
+                with open(name, "r", encoding="utf-8") as f:
+                    files[ftype] = f.read().splitlines()
+        return files.pop("rd5000"), files
+    files = {ftype: data.decode("utf-8").splitlines() for ftype, data in synth_unit("BR01", "1", args.date, args.rows).items()}
+    return files.pop("rd5000"), files
+
+
+def old(combiner, lines, tables):
+    out = []
+    for line in lines:
+        try:
+            out.append(combiner.stringifyAppend("rd5000", line, tables["item"], tables["disc"], tables["dept"], TYPE_DICT, TIME_DICT, tables["tnsc"], tables["paym"], tables["blpr"]))
+        except Exception:
+            out.append(None)
+    return out
+
+
+def new(combiner, lines, tables):
+    plan = RowPlan(lines[0], tables, combiner.pos, combiner.branch, combiner.branch in combiner.new_branches, TYPE_DICT, TIME_DICT)
+    out = []
+    for line in lines:
+        try:
+            out.append(plan.render(split_row(line))[0])
+        except Exception:
+            out.append(None)
+    return out
+
+
+def timed(fn, repeat, *args):
+    best = None
+    for i in range(repeat):
+        started = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000, help='synthetic rd5000 lines')
+    parser.add_argument('--date', default="2026-02-09")
+    parser.add_argument('--recorded', default=None, help='an rd5000 export; its reference files are found by name')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    lines, sources = load(args)
+    combiner = Combiner()
+    combiner.pos, combiner.branch, combiner.date = "1", "BR01", args.date
+    tables = combiner.build_tables(sources)
+
+    old_time, expected = timed(old, args.repeat, combiner, lines, tables)
+    new_time, actual = timed(new, args.repeat, combiner, lines, tables)
+    print("%-16s %7.3fs  %9.0f rows/sec" % ("stringifyAppend", old_time, len(lines) / old_time))
+    print("%-16s %7.3fs  %9.0f rows/sec  (%.2fx)" % ("RowPlan", new_time, len(lines) / new_time, old_time / new_time))
+    if actual != expected:
+        print("outputs differ in %d of %d rows" % (sum(a != b for a, b in zip(actual, expected)), len(lines)))
+        sys.exit(1)
+    print("outputs identical (%d rows)" % len(lines))
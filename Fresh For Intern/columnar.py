@@ -0,0 +1,227 @@
+import os
+import argparse
+from filelock import locked
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    import pyarrow.compute as pc
+    import pyarrow.ipc as ipc
+except ImportError:  # listed in requirements.txt; only needed for RECORD_COLUMNAR
+    pa = pacsv = pc = ipc = None
+
+# Typed columnar copy of the record, written by Combiner when RECORD_COLUMNAR=<dir> is set
+# (or Combiner(columnar=ColumnarStore(dir))). Loading record2025.csv means parsing text and
+# running a Python Decimal converter on every amount cell; the columnar files carry the
+# aaa_headers.csv columns already typed:
+#   amounts          decimal128(18, 6)  (fixed point; the exports carry at most 4 places)
+#   DATE             date32
+#   everything else  strings, exactly as the CSV reader returns them ("" stays "", and the
+#                    ="..." text-forcing of OR or DEPARTMENT CODE is kept)
+# POS and BRANCH are categorical (dictionary-encoded), and so is every other repetitive
+# column, amounts included (see CATEGORIES).
+# An amount the record wraps as ="05" (rowplan.excel forces a leading zero to text) is not
+# a number to the CSV reader: turn_decimal and convert_dtype read it as 0. It is stored as
+# null, which CSVProcessor reads as 0 too, so both records load into the same frame.
+# There is one file per date, <dir>/<YYYY-MM-DD>.arrow (Arrow IPC), with one record batch
+# per branch. Arrow files are memory-mapped and load without decoding. Parquet was tried
+# and dropped: it is smaller on disk, but decoding a year's ~6000 small (branch, date) row
+# groups made it load slower than the CSV. A date file is written once all of that
+# date's units have been added, through a temporary file and an atomic replace; units
+# combined again replace their (branch, pos) rows and keep the rest. The old file is read
+# and replaced under a lock (filelock.py), so processes writing units of the same date to
+# one directory keep each other's rows.
+# CSVProcessor("<dir>") loads the directory (pandasbiggs.read_columnar).
+#
+#   python columnar.py convert record2025.csv columnar
+
+HEADERS = ["POS", "OR", "ITEM CODE", "QUANTITY", "UNIT PRICE", "AMOUNT", "DISCOUNT", "DEPARTMENT CODE",
+           "DATE", "TIME", "DISCOUNT CODE", "TYPE CODE", "VAT FLAG", "VAT DIV", "VAT AMOUNT", "VAT DISCOUNT",
+           "VAT PRICE", "TRANSACTION NUMBER", "PRODUCT NAME", "DEPARTMENT NAME", "DISCOUNT NAME",
+           "TRANSACTION TYPE", "DAYPART", "PAYMENT CODE", "PAYMENT NAME", "PHONE NUMBER", "BRANCH"]
+AMOUNTS = ["QUANTITY", "UNIT PRICE", "AMOUNT", "DISCOUNT", "VAT DIV", "VAT AMOUNT", "VAT DISCOUNT", "VAT PRICE"]
+# dictionary-encoded: POS and BRANCH (categorical), and every other column that repeats a
+# few thousand values at most (amounts follow the menu prices), which keeps the files small
+# and lets readers convert each distinct value once; OR and TRANSACTION NUMBER are plain
+CATEGORIES = ["POS", "ITEM CODE", "DEPARTMENT CODE", "TIME", "DISCOUNT CODE", "TYPE CODE", "VAT FLAG",
+              "PRODUCT NAME", "DEPARTMENT NAME", "DISCOUNT NAME", "TRANSACTION TYPE", "DAYPART",
+              "PAYMENT CODE", "PAYMENT NAME", "PHONE NUMBER", "BRANCH"] + AMOUNTS
+SCALE = 6
+SUFFIX = ".arrow"
+
+
+def require():
+    if pa is None:
+        raise RuntimeError("columnar output needs pyarrow (pip install -r requirements.txt)")
+
+
+def schema():
+    require()
+    fields = []
+    for name in HEADERS:
+        if name in AMOUNTS:
+            fields.append(pa.field(name, pa.dictionary(pa.int32(), pa.decimal128(18, SCALE))))
+        elif name == "DATE":
+            fields.append(pa.field(name, pa.date32()))
+        elif name in CATEGORIES:
+            fields.append(pa.field(name, pa.dictionary(pa.int32(), pa.string())))
+        else:
+            fields.append(pa.field(name, pa.string()))
+    return pa.schema(fields)
+
+
+def decimal_column(values):
+    # strings -> decimal128(18, SCALE); anything that is not a plain number, a ="..." wrapped
+    # one included, becomes null (CSVProcessor reads nulls as 0, like turn_decimal)
+    valid = pc.match_substring_regex(values, r'^[-+]?(\d{1,15}(\.\d{0,9})?|\.\d{1,9})$')
+    wide = pc.cast(pc.if_else(valid, values, pa.scalar(None, pa.string())), pa.decimal128(38, 9))
+    return pc.cast(pc.round(wide, SCALE), pa.decimal128(18, SCALE))
+
+
+def read_unit(path):
+    # one staged unit (a CSV with the record header) as a table in schema(); rows with the
+    # wrong number of fields are skipped and counted in the second value
+    require()
+    skipped = []
+    table = pacsv.read_csv(path,
+                           read_options=pacsv.ReadOptions(column_names=HEADERS, skip_rows=1, block_size=1 << 22),
+                           parse_options=pacsv.ParseOptions(invalid_row_handler=lambda row: skipped.append(row.number) or "skip"),
+                           convert_options=pacsv.ConvertOptions(column_types={name: pa.string() for name in HEADERS},
+                                                                strings_can_be_null=False, quoted_strings_can_be_null=False))
+    columns = []
+    for field in schema():
+        values = table.column(field.name)
+        if field.name in AMOUNTS:
+            values = decimal_column(values)
+        elif field.name == "DATE":
+            values = pc.cast(pc.if_else(pc.match_substring_regex(values, r'^\d{4}-\d{2}-\d{2}$'), values, pa.scalar(None, pa.string())), pa.date32())
+        if field.name in CATEGORIES:
+            values = pc.dictionary_encode(values).cast(field.type)
+        columns.append(values)
+    return pa.Table.from_arrays(columns, schema=schema()), len(skipped)
+
+
+def read_file(path):
+    # one date file as a table in schema(), with one chunk per column: a year of per-branch
+    # batches would otherwise be ~6000 chunks, and every kernel run on a column pays per chunk
+    require()
+    with pa.memory_map(path) as source:
+        return ipc.open_file(source).read_all().combine_chunks()
+
+
+def read_table(path):
+    # a date file, or a whole store directory (its date files in date order)
+    require()
+    if not os.path.isdir(path):
+        return read_file(path)
+    names = sorted(name for name in os.listdir(path) if name.endswith(SUFFIX))
+    tables = [read_file(os.path.join(path, name)) for name in names]
+    if not tables:
+        return schema().empty_table()
+    # chunks keep their own dictionaries; combine_chunks() unifies a column when it needs to
+    return pa.concat_tables(tables)
+
+
+class ColumnarStore:
+
+    def __init__(self, root):
+        require()
+        self.root = os.path.abspath(root)
+        self.date = None
+        self.units = {}  # (branch, pos) -> table, for self.date
+        self.skipped = 0
+        os.makedirs(self.staging_dir, exist_ok=True)
+
+    @property
+    def staging_dir(self):
+        return os.path.join(self.root, ".staging")
+
+    def staging(self, branch, pos, date):
+        return os.path.join(self.staging_dir, "%s_%s_%s.%d.csv" % (branch, pos, str(date)[:10], os.getpid()))
+
+    def path(self, date):
+        return os.path.join(self.root, str(date)[:10] + SUFFIX)
+
+    def add(self, branch, pos, date, path):
+        # add one unit's staged CSV; returns the dates whose file was written meanwhile
+        table, skipped = read_unit(path)
+        self.skipped += skipped
+        return self.add_table(branch, pos, date, table)
+
+    def add_table(self, branch, pos, date, table):
+        written = []
+        date = str(date)[:10]
+        if self.date is not None and date != self.date:
+            written = self.flush()
+        self.date = date
+        self.units[(str(branch), str(pos))] = table
+        return written
+
+    def flush(self):
+        # write the current date's file: rows of (branch, pos) units that were not added
+        # again are kept from the old file, then one record batch per branch
+        if self.date is None:
+            return []
+        target = self.path(self.date)
+        # one lock per date, kept out of the way in .staging
+        with locked(os.path.join(self.staging_dir, self.date)):
+            tables = list(self.units.values())
+            if os.path.exists(target):
+                table = read_file(target)
+                keep = None
+                for branch, pos in self.units:
+                    mask = pc.invert(pc.and_(pc.equal(table.column("BRANCH").cast(pa.string()), branch),
+                                             pc.equal(table.column("POS").cast(pa.string()), pos)))
+                    keep = mask if keep is None else pc.and_(keep, mask)
+                tables.append(table.filter(keep))
+            merged = pa.concat_tables(tables).unify_dictionaries()
+            # hidden, so a reader of the directory never picks up a half-written file
+            tmp = os.path.join(self.root, "." + os.path.basename(target) + ".%d.tmp" % os.getpid())
+            with ipc.new_file(tmp, schema()) as writer:
+                branches = merged.column("BRANCH").cast(pa.string())
+                for branch in sorted(pc.unique(branches).to_pylist()):
+                    group = merged.filter(pc.equal(branches, branch))
+                    group = group.take(pc.sort_indices(group.column("POS").cast(pa.string())))  # stable
+                    writer.write_table(group.combine_chunks())
+            with open(tmp, "rb") as f:
+                os.fsync(f.fileno())
+            os.replace(tmp, target)
+        written = [self.date]
+        self.date = None
+        self.units = {}
+        return written
+
+    def close(self):
+        return self.flush()
+
+
+def convert(csv_file, root):
+    # existing flat record -> columnar directory, one date file per date in it; rows
+    # without a valid date have no file to go to and are counted as skipped
+    store = ColumnarStore(root)
+    table, store.skipped = read_unit(csv_file)
+    dated = pc.is_valid(table.column("DATE"))
+    store.skipped += len(table) - pc.sum(dated.cast(pa.int64())).as_py()
+    table = table.filter(dated)
+    table = table.take(pc.sort_indices(table.column("DATE")))
+    dates = table.column("DATE")
+    for date in pc.unique(dates).to_pylist():
+        day = table.filter(pc.equal(dates, date))
+        branches = day.column("BRANCH").cast(pa.string())
+        pos = day.column("POS").cast(pa.string())
+        units = pa.table({"branch": branches, "pos": pos}).group_by(["branch", "pos"]).aggregate([]).to_pylist()
+        for unit in units:
+            store.add_table(unit["branch"], unit["pos"], date, day.filter(pc.and_(pc.equal(branches, unit["branch"]), pc.equal(pos, unit["pos"]))))
+    store.close()
+    return store.skipped
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('command', choices=["convert"])
+    parser.add_argument('csv_file')
+    parser.add_argument('root')
+    args = parser.parse_args()
+    skipped = convert(args.csv_file, args.root)
+    if skipped:
+        print("%d rows skipped (wrong number of fields or no date)" % skipped)
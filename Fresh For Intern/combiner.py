@@ -1,31 +1,125 @@
 import os
 import shutil
-from pandasbiggs import *
-from tqdm import tqdm
+import hashlib
+import tempfile
+import collections
+from concurrent.futures import ProcessPoolExecutor
 import pprint
 import re
+from listing import parse_listing, newest_snapshots
+from recordwriter import RecordWriter, RecordBuffer
+from filelock import locked
+from recordstore import RecordStore
+from columnar import ColumnarStore
+from shardwriter import ShardedWriter
+from errormonitor import ErrorMonitor
+from quality import UnitQuality, QualityLog
+import quality
+import itertools
+import frame_engine
+import linestream
+import refcache
+from rowplan import RowPlan, split_row
+import typedrecord
+
+# ? reference tables for every rd5000 file: table name, file type and the builder method
+REFERENCE_TABLES = [("item", "rd5500", "build_item_dict"),  # ? products file
+                    ("disc", "discount", "build_code_dict"),  # ? discount file
+                    ("dept", "rd1800", "build_code_dict"),  # ? department file
+                    ("tnsc", "rd5800", "build_tnsc_dict"),  # ? payments transaction file
+                    ("paym", "rd5900", "build_paym_dict"),  # ? payment file
+                    ("blpr", "blpr", "build_blpr_dict")]
+REFERENCE_TYPES = [ftype for name, ftype, builder in REFERENCE_TABLES]
+# ? master files that rarely change between days; their tables go through refcache
+CACHED_TYPES = ["rd5500", "discount", "rd1800", "rd5900"]
+TYPE_DICT = {"D" : "Dine-In",
+            "T" : "Take-Out",
+            "C" : "Delivery"}
+TIME_DICT = ["GY","GY","GY","GY","GY","GY","Breakfast","Breakfast","Breakfast","Breakfast","Breakfast","Lunch","Lunch","Lunch","Lunch","PM Snack","PM Snack","PM Snack","PM Snack","Dinner","Dinner","Dinner","Dinner","GY","GY"]
+BLPR_ORNO = re.compile('\"=\"\"(.+?)\"\"\"')
+# ? "rows" renders each line through a RowPlan (rowplan.py), "frame" the vectorized frame_engine;
+# ? both split quoted fields with the csv reader and write the same lines (tests/test_engines.py)
+ENGINE = os.getenv("COMBINE_ENGINE", "rows")
+# ? > 1 combines (branch, pos, date) units in that many processes (see combine_parallel)
+WORKERS = int(os.getenv("COMBINE_WORKERS", "1"))
+# ? directory of a partitioned RecordStore to write units to instead of record2025.csv
+STORE = os.getenv("RECORD_STORE") or None
+# ? directory for the typed columnar copy of the record (columnar.py, Arrow IPC, needs pyarrow)
+COLUMNAR = os.getenv("RECORD_COLUMNAR") or None
+# ? rd5000 rows per frame_engine.transform() call, which bounds the frame engine's memory
+FRAME_BATCH = int(os.getenv("COMBINE_FRAME_BATCH", "20000"))
+# ? split the flat record into shards of at most this many rows and/or bytes under
+# ? record2025.parts/ with a manifest (shardwriter.py); 1048575 rows is what Excel opens
+SHARD_ROWS = int(os.getenv("RECORD_SHARD_ROWS", "0")) or None
+SHARD_BYTES = int(os.getenv("RECORD_SHARD_BYTES", "0")) or None
+
 class Combiner():
-    def __init__(self, workdir=None, out_file=None):
+    def __init__(self, workdir=None, out_file=None, journal=None, engine=ENGINE, workers=WORKERS, inflight=None, ref_cache=None, store=STORE, columnar=COLUMNAR, shard_rows=SHARD_ROWS, shard_bytes=SHARD_BYTES, root=None, new_branches=None, header=None, monitor=None, quality_log=None):
         # workdir: optional absolute path where "latest" files for this job live
         # out_file: optional full path for the generated record CSV (isolated per job)
-        self.parentDir = os.getcwd()
+        # journal: optional journal.Journal; (branch, pos, date) units already combined are
+        #          skipped and newly combined ones are checkpointed with their row count
+        # engine: "rows" (a RowPlan per rd5000 file, line by line) or "frame" (frame_engine,
+        #         column by column); the same lines either way, quoted fields included
+        # workers: processes for combine_parallel(); inflight: units submitted but not yet
+        #          merged (default 2 per worker), which bounds memory and shard disk use
+        # ref_cache: refcache.RefCache for master tables, by default the process-wide one
+        # store: optional recordstore.RecordStore, or its directory under root; each unit then
+        #        replaces its own partition instead of being appended to the record file
+        #        (default RECORD_STORE; None for no store)
+        # columnar: optional columnar.ColumnarStore for typed output, or its directory under
+        #           root (default RECORD_COLUMNAR; None for none); without a store it takes
+        #           the place of the record file
+        # shard_rows / shard_bytes: bounds for a sharded record (<record>.parts/) in place of
+        #           the single record file; not used with a store or columnar output
+        # root: directory with settings/, aaa_headers.csv, latest/ and the default outputs
+        #       (record2025.csv, masterData_errorMonitoring.csv); the working directory if
+        #       not given. Nothing else is read or written relative to the working directory.
+        # new_branches / header: the settings/newBranches.txt branch list and the
+        #       aaa_headers.csv line, when the caller has them already
+        # monitor: errormonitor.ErrorMonitor for mismatched-date counts (default: the one in root)
+        # quality_log: quality.QualityLog that gets each combined unit's counters (default:
+        #       QUALITY_LOG in root; QUALITY_LOG= turns it off)
+        self.parentDir = os.path.abspath(root or os.getcwd())
         self.parentDir = self.parentDir.replace("\\","/")
         self.directory = 'latest'
         self.filenames = []
         self.filePaths = ['/latest']
         self.workdir = workdir
         self.out_file = out_file
-        self.new_branches = []
+        self.journal = journal
+        self.engine = engine
+        self.workers = workers
+        self.inflight = inflight or 2 * workers
+        self.ref_cache = ref_cache if ref_cache is not None else refcache.shared
+        self.writer = None  # RecordWriter on the record file, open for the whole run
+        self.record_file = None
+        self.header = header
+        self.monitor = monitor or ErrorMonitor(os.path.join(self.parentDir, "masterData_errorMonitoring.csv"))
+        if quality_log is None and quality.LOG:
+            quality_log = QualityLog(os.path.join(self.parentDir, quality.LOG))
+        self.quality_log = quality_log
+        self.unit_quality = None  # counters of the unit being combined
+        if isinstance(store, str):
+            store = RecordStore(os.path.join(self.parentDir, store), self.read_header())
+        self.store = store
+        if isinstance(columnar, str):
+            columnar = ColumnarStore(os.path.join(self.parentDir, columnar))
+        self.columnar = columnar
+        self.shard_rows = shard_rows
+        self.shard_bytes = shard_bytes
+        self.unmarked = []  # units combined into a columnar date file that is not written yet
+        self.new_branches = list(new_branches) if new_branches is not None else self.read_new_branches()
+
+    def read_new_branches(self):
         # read branch list
         fnb_path = os.path.join(self.parentDir, "settings", "newBranches.txt")
         try:
-            self.fNB = open(fnb_path, "r")
-            self.newBranchFile = self.fNB.read()
-            for row in self.newBranchFile.splitlines():
-                self.new_branches.append(row)
+            with open(fnb_path, "r") as fNB:
+                return fNB.read().splitlines()
         except Exception:
             # if settings file missing, continue with empty new_branches
-            self.new_branches = []
+            return []
     # * Clean temp directory
     def clean(self, directory):
         for filename in os.listdir(directory):
@@ -40,26 +134,59 @@ class Combiner():
 
     # ** initial function to operate read the names of files in the latest folder and assign them to proper variables separated by "_"
     def generate(self):
-        posFilenames = {}
-        filetypes = ["rd1800", "blpr", "discount", "rd5000", "rd5500", "rd5800", "rd5900"]
-
         # allow per-job workdir override
         if self.workdir:
             folder_path = os.path.abspath(self.workdir)
         else:
             folder_path = os.path.join(self.parentDir, self.filePaths[0].lstrip('/'))
+        leaves = self.units(folder_path)
+        try:
+            if self.workers > 1 and leaves:
+                self.combine_parallel(folder_path, leaves)
+                return
+            for branch, pos, date, fileTypes in leaves:
+                self.combine_unit(branch, pos, date, fileTypes)
+        finally:
+            self.finish()
+
+    # ? one (branch, pos, date) from the workdir into the record, committed and checkpointed;
+    # ? generate() calls it for every unit, watcher.Watcher as soon as a unit is complete
+    def combine_unit(self, branch, pos, date, fileTypes):
+        self.branch = branch
+        self.pos = pos
+        self.date = date
+        # only call GenAppend if rd5000 exists for that date
+        self.begin_unit()
+        try:
+            self.GenAppend(fileTypes['rd5000'] if 'rd5000' in fileTypes else [], fileTypes)
+        except BaseException:
+            # rows are written while the file is still being read; a unit that
+            # fails halfway (e.g. bad UTF-8 near its end) leaves nothing behind
+            self.abort_unit()
+            raise
+        # the unit's rows are on disk before the journal says it is combined
+        self.end_unit()
+        self.report_quality()
+        self.mark_combined(branch, pos, date, self.rows_written)
+        return self.rows_written
+
+    # ? (branch, pos, date, {file type: file name}) for every unit in folder_path that the
+    # ? journal does not list as combined, in the order they go to the record
+    def units(self, folder_path):
+        posFilenames = {}
 
-        for self.filename in os.listdir(folder_path):
-            name_without_ext = self.filename.rsplit(".", 1)[0]
-            parts = name_without_ext.split("_")
+        # several snapshots of the same branch/pos/filetype/date may be present (e.g. _19-59_ and
+        # _20-00_); keep the newest instead of whichever os.listdir happens to return last
+        entries = newest_snapshots(parse_listing(os.listdir(folder_path)))
 
-            if len(parts) < 5:
-                continue  # skip invalid filenames
+        for entry in entries:
+            self.filename = entry.path
+            name_without_ext = self.filename.rsplit(".", 1)[0]
 
-            pos = parts[2]
-            filetype = parts[3]
-            branch = parts[1]
-            date = parts[4]
+            pos = entry.pos
+            filetype = entry.filetype
+            branch = entry.branch
+            date = entry.date
 
             if branch not in posFilenames:
                 posFilenames[branch] = {}
@@ -77,196 +204,363 @@ class Combiner():
         pprint.pprint(posFilenames)
         # input("Ready to process?")
 
+        leaves = []
         for branch, posDict in posFilenames.items():
-            self.branch = branch
             for pos, dateDict in posDict.items():
-                self.pos = pos
                 for date, fileTypes in dateDict.items():
-                    self.date = date
-                    # only call GenAppend if rd5000 exists for that date
-                    self.GenAppend(fileTypes['rd5000'] if 'rd5000' in fileTypes else [], fileTypes)
+                    if self.journal and self.journal.complete(branch, pos, date):
+                        print("Already combined: ", branch, " pos: ", pos, "Date: ", date)
+                        continue
+                    leaves.append((branch, pos, date, fileTypes))
+
+        # units go out in (branch, pos, date) order whichever way they are combined; columnar
+        # output is written a date at a time, so there it is (date, branch, pos)
+        if self.columnar:
+            leaves.sort(key=lambda leaf: (leaf[2], leaf[0], leaf[1]))
+        else:
+            leaves.sort(key=lambda leaf: leaf[:3])
+        return leaves
+
+    # ? In-process entry points (python-app/jobs.py, combiner_runner.py). `source` is either
+    # ? a workdir of exports, combined unit by unit as generate() does, or the files of one
+    # ? (branch, pos, date) as {file type: bytes}. lines() yields every output row as the
+    # ? record line generate() would append (no header), records() as a typed record
+    # ? (typedrecord.py). Nothing is written to disk and the journal is left alone, the
+    # ? caller decides what counts as done. Rows dated outside their unit are counted in
+    # ? self.monitor.counts as usual.
+    def records(self, source, branch=None, pos=None, date=None):
+        return self.typed(self.lines(source, branch, pos, date))
+
+    def lines(self, source, branch=None, pos=None, date=None):
+        # ? the writer and workdir of this Combiner's own runs are put back afterwards
+        writer, self.writer = self.writer, RecordBuffer()
+        workdir = self.workdir
+        try:
+            if isinstance(source, dict):
+                self.branch = branch
+                self.pos = str(pos)
+                self.date = str(date)[:10]
+                self.GenAppendBytes(source)
+                yield from self.writer.take()
+                return
+            self.workdir = os.path.abspath(source)
+            for branch, pos, date, fileTypes in self.units(self.workdir):
+                self.branch = branch
+                self.pos = pos
+                self.date = date
+                self.GenAppend(fileTypes['rd5000'] if 'rd5000' in fileTypes else [], fileTypes)
+                # ? one unit at a time: its rows are all that is held in memory
+                yield from self.writer.take()
+        finally:
+            self.writer = writer
+            self.workdir = workdir
+
+    def typed(self, lines):
+        for line in lines:
+            record = typedrecord.parse(line)
+            if record is not None:
+                yield record
+
+    # ? Parallel generate(): units go to a process pool and each one is combined into its own
+    # ? shard under <record>.shards/. Shards are appended to the record in (branch, pos, date)
+    # ? order as soon as they are next in line, so the output does not depend on which worker
+    # ? finishes first, and at most `inflight` units are submitted but not yet merged. With a
+    # ? store or columnar output the shards are the units' staging files.
+    def combine_parallel(self, folder_path, leaves):
+        if self.staged():
+            shard_dir = os.path.dirname(self.staging(*leaves[0][:3]))
+            header = self.unit_header()
+        else:
+            self.record_file = self.open_writer()
+            # ? a directory of its own, so runs writing next to each other do not share it
+            shard_dir = tempfile.mkdtemp(prefix=os.path.basename(self.record_file) + ".shards.", dir=os.path.dirname(self.record_file))
+            header = None
+        os.makedirs(shard_dir, exist_ok=True)
+        pending = collections.deque()
+        with ProcessPoolExecutor(self.workers, initializer=init_worker, initargs=(folder_path, self.engine, self.ref_cache.capacity, self.ref_cache.directory, self.parentDir, self.new_branches, self.read_header())) as pool:
+            for branch, pos, date, fileTypes in leaves:
+                if self.staged():
+                    shard = self.staging(branch, pos, date)
+                else:
+                    shard = os.path.join(shard_dir, "%s_%s_%s.csv" % (branch, pos, date))
+                pending.append((branch, pos, date, shard, pool.submit(combine_leaf, branch, pos, date, fileTypes, shard, header)))
+                if len(pending) >= self.inflight:
+                    self.merge_shard(*pending.popleft())
+            while pending:
+                self.merge_shard(*pending.popleft())
+        if not self.staged():
+            shutil.rmtree(shard_dir, ignore_errors=True)
+
+    def merge_shard(self, branch, pos, date, shard, future):
+        rows, mismatched, unit_quality = future.result()
+        if self.staged():
+            self.finish_unit(branch, pos, date, shard, rows)
+        else:
+            self.writer.unit(branch, pos, date)
+            self.writer.append_file(shard)
+            self.writer.commit()
+            os.unlink(shard)
+        for key, count in mismatched.items():
+            self.monitor.add(*key, rows=count)
+        self.report_quality(unit_quality)
+        self.rows_written = rows
+        self.mark_combined(branch, pos, date, rows)
 
     # ? processing the the main transaction files and creating copy of the reference for transactions that will be needed in creating the master data.
     def GenAppend(self, filename, fTypes):
-        # ? variables reference for the different file types
-        filetypes = ["rd1800", "blpr", "discount", "rd5000", "rd5500", "rd5800", "rd5900"]
         self.proc_files = {}
-        item_dict = {}
-        item_dept_dict = {}
-        disc_dict = {}
-        dept_dict = {}
-        tnsc_dict = {}
-        paym_dict = {}
-        blpr_dict = {}
-        type_dict = {"D" : "Dine-In",
-                    "T" : "Take-Out",
-                    "C" : "Delivery"}
-        time_dict = ["GY","GY","GY","GY","GY","GY","Breakfast","Breakfast","Breakfast","Breakfast","Breakfast","Lunch","Lunch","Lunch","Lunch","PM Snack","PM Snack","PM Snack","PM Snack","Dinner","Dinner","Dinner","Dinner","GY","GY"]
-        e=""
-        file=""
-        a=1
-        b=0
-        c=1
-        d=""
-        end=""
+        self.rows_written = 0
+        self.unit_quality = UnitQuality(self.branch, self.pos, self.date)
 
         print("Processing: ", self.branch, " pos: ", self.pos,"Date: ",self.date,)
-        file = self.preProc(filename) if filename else []
-        # ? read the files in the latest folder based on the file types and assign them to variables
-        item_proc = self.preProc(fTypes['rd5500']) if 'rd5500' in fTypes else [] # ? products file
-        disc_proc = self.preProc(fTypes['discount']) if 'discount' in fTypes else [] # ? discount file
-        dept_proc = self.preProc(fTypes['rd1800']) if 'rd1800' in fTypes else [] #? department file
-        tnsc_proc = self.preProc(fTypes['rd5800']) if 'rd5800' in fTypes else [] # ? payments transaction file
-        paym_proc = self.preProc(fTypes['rd5900']) if 'rd5900' in fTypes else [] # ? payment file
-        # pprint.pprint(tnsc_proc)
-        # print(fTypes['rd5800'])
-        # hi = input("hi")
-        
+        if self.writer is None:
+            self.record_file = self.open_writer()
+        # ? every file is read in chunks (linestream.py), never whole: the reference files
+        # ? are hashed and only read line by line if their table is not cached already, and
+        # ? rd5000 is read back to front, which is the order its rows go to the record
+        sources = {}
+        digests = {}
+        for ftype in REFERENCE_TYPES:
+            if ftype in fTypes:
+                path = self.sourcePath(fTypes[ftype])
+                digests[ftype] = linestream.digest(path)
+                sources[ftype] = lambda path=path: linestream.lines(path)
+        tables = self.build_tables(sources, digests)
 
-        blpr_proc = self.preProc(fTypes['blpr']) if 'blpr' in fTypes else []
-        
-        if item_proc:
-            for row in reversed(item_proc.splitlines()):
-                line = row.strip().split(",")
-                # * Category code line 12 for department
-                
-                # branch
-                if len(line) > 12 and self.branch in self.new_branches:  # must have at least 13 columns
-                    item_code = line[0]
-                    item_dict[item_code] = {
-                        "item_name": line[1],
-                        "department_code": line[12]
-                    }
-                elif len(line) > 3 and self.branch in self.new_branches:
-                    item_code = line[0]
-                    item_dict[item_code] = {
-                        "item_name": line[1],
-                        "department_code": line[3]     
-                    }
-                elif len(line) >= 2:  # make sure we have at least 2 columns
-                    item_dict[line[0]] = {
-                        "item_name": line[1]
-                    }
-                    
-                elif len(line) == 1 and line[0]:  
-                    # optional: handle rows with only one value
-                    item_dict[line[0]] = ""
-        else:
-            item_dict = {}
+        # self.clean_csv_edges(self.record_file)
+        if filename:
+            path = self.sourcePath(filename)
+            self.append_unit(filename, linestream.first_line(path), linestream.reversed_lines(path), tables)
 
-        if dept_proc:
-            for row in reversed(dept_proc.splitlines()):
-                line = row.split(",")
-                if len(line) >= 2:  # make sure we have at least 2 columns
-                    dept_dict[line[0]] = line[1]
+        self.finish_quality()
+        # self.clean_csv_edges(self.parentDir + "/record2025.csv")
 
-                elif len(line) == 1 and line[0]:  
-                    # optional: handle rows with only one value
-                    dept_dict[line[0]] = ""
-        else:
-            dept_dict = {}
-
-        if disc_proc:
-            for row in reversed(disc_proc.splitlines()):
-                line = row.split(",")
-                if len(line) >= 2:  # make sure we have at least 2 columns
-                    disc_dict[line[0]] = line[1]
-                elif len(line) == 1 and line[0]:  
-                    # optional: handle rows with only one value
-                    disc_dict[line[0]] = ""
-        else:
-            disc_dict = {}
-
-        if tnsc_proc:
-            for row in reversed(tnsc_proc.splitlines()):
-                line = row.split(",")
-                if(len(line)<11):
-                    print("lack 11")
-                    print(line)
-                elif(len(line)<20):
-                    print("lack 20")
-                    print(line)
+    # ? GenAppend for files held in memory ({file type: bytes}, see lines()); the lines
+    # ? and content hashes are the ones linestream gives for the same files on disk
+    def GenAppendBytes(self, files):
+        self.rows_written = 0
+        self.unit_quality = UnitQuality(self.branch, self.pos, self.date)
+        print("Processing: ", self.branch, " pos: ", self.pos,"Date: ",self.date,)
+        sources = {}
+        digests = {}
+        for ftype in REFERENCE_TYPES:
+            if ftype in files:
+                digests[ftype] = hashlib.sha256(files[ftype]).hexdigest()
+                sources[ftype] = lambda data=files[ftype]: linestream.text_lines(data)
+        tables = self.build_tables(sources, digests)
+        if "rd5000" in files:
+            lines = linestream.text_lines(files["rd5000"])
+            self.append_unit("rd5000", lines[0] if lines else None, reversed(lines), tables)
+        self.finish_quality()
+
+    # ? rd5000 lines of one unit (back to front) through the selected engine
+    def append_unit(self, filename, header, lines, tables):
+        if self.engine == "frame":
+            # ? the frame engine takes FRAME_BATCH rows at a time; NUL bytes trip up
+            # ? pandas, so batches with one take the row-wise path
+            lines = iter(lines)
+            for batch in iter(lambda: list(itertools.islice(lines, FRAME_BATCH)), []):
+                if any("\x00" in line for line in batch):
+                    self.append_rows(filename, batch, tables, header)
                 else:
-                    if len(line) >= 20:  # make sure we have at least 2 columns
-                        tnsc_dict[line[20]] = line[11]
-                    else:  
-                        # optional: handle rows with only one value
-                        tnsc_dict[line[20]] = ""
-        else:
-            tnsc_dict = {}
-
-            # print(line)
-            # print(line[36])
-            # print(line[17])
-            # print(tnsc_dict[line[36]])
-            # print(tnsc_dict)
-            # i = input("huh")
-        if paym_proc:
-            for row in reversed(paym_proc.splitlines()):
-                line = row.split(",")
-                if len(line) >= 2:  # make sure we have at least 2 columns
-                    paym_dict[line[0]] = line[1]
-                else:  
-                    # optional: handle rows with only one value
-                    paym_dict[line[0]] = ""
+                    self.append_frame(batch, tables)
         else:
-            paym_dict = {}
-
-        if blpr_proc:
-            for row in reversed(blpr_proc.splitlines()):
-                line = row.split(",")
-                #print(str(line) + " " + str(len(line)))
-                if(len(line) > 3):
-                    #print(len(line[1]))
-                    if(len(line[1]) == 11):
-                        if(re.search('\"=\"\"(.+?)\"\"\"', line[3])):
-                            blpr_dict[re.search('\"=\"\"(.+?)\"\"\"', line[3]).group(1)] = line[1]
-                        else:
-                            if len(line) >= 4:  # make sure we have at least 2 columns
-                                blpr_dict[line[3]] = line[1]
-                            else:  
-                                # optional: handle rows with only one value
-                                blpr_dict[line[3]] = ""
+            self.append_rows(filename, lines, tables, header)
+
+    # ? Streaming counterpart of GenAppend for Receive.fetch_stream(): `sources` maps each
+    # ? reference file type to an iterable of lines and `lines` yields the rd5000 rows, all
+    # ? consumed while they download. rd5000 rows come out in file order (GenAppend writes
+    # ? them bottom-up). The unit's rows are staged in a side file and appended to the record
+    # ? only once the whole unit went through, so a download that dies halfway leaves the
+    # ? record untouched.
+    def combine_stream(self, branch, pos, date, sources, lines):
+        self.branch = branch
+        self.pos = str(pos)
+        self.date = str(date)[:10]
+        self.rows_written = 0
+        self.unit_quality = UnitQuality(self.branch, self.pos, self.date)
+        print("Streaming: ", self.branch, " pos: ", self.pos,"Date: ",self.date,)
+        tables = self.build_tables(sources)
+
+        # ? the header comes first here; it is put back so the row is handled as in GenAppend
+        lines = iter(lines)
+        header = next(lines, None)
+        lines = itertools.chain([header] if header is not None else [], lines)
+
+        if self.staged():
+            # ? the unit's staging file plays the part of the side file
+            self.begin_unit()
+            try:
+                self.append_rows("rd5000", lines, tables, header)
+            except BaseException:
+                self.abort_unit()
+                raise
+            self.end_unit()
         else:
-            blpr_dict = {}
-
-        
-        substring = str(2000) + "-"
-        self.record_file = self.prepare_csv()
-        # self.clean_csv_edges(self.record_file)
-        # print(tqdm(reversed(file.splitlines())))
-        # td = input("tdqm")
-        if file:
-            for line in tqdm(reversed(file.splitlines())):
-                try:
-                    line = self.stringifyAppend(filename, line, item_dict, disc_dict, dept_dict, type_dict, time_dict, tnsc_dict, paym_dict, blpr_dict)
-                    col = line.split(",")
-                    #  ? col[8] is date
-                    if col[8].strip() != self.date:
-                        self.update_monitor_csv()
-                    else:
-                        if a < 1048575:
-                            if(not line == ""):
-                                self.csvGenAppend(self.record_file, b, line)
-                        else:
-                            b += 1
-                            if(not line == ""):
-                                self.csvGenAppend(self.record_file, b, line)
-                            a = 0
-                    #print("Finished Processing Line " + str(c) + "!")
-                    a += 1
-                    c += 1
-                except Exception as e:
-                    print('Line: %s' % (line))
-                    print('Failed to Append. Reason: %s' % ( e))
-                    # error = input("There is an error")
-                    # hi = input("an error?")
-
-            
-        print("Finished converting rd5000")
-        # self.clean_csv_edges(self.parentDir + "/record2025.csv")
+            self.record_file = self.open_writer()
+            writer, self.writer = self.writer, RecordWriter(self.record_file + ".%d.part" % os.getpid(), mode="w")
+            try:
+                self.append_rows("rd5000", lines, tables, header)
+                self.writer.close()
+                writer.unit(branch, pos, date)
+                writer.append_file(self.writer.path)
+                writer.commit()
+            finally:
+                self.writer.close()
+                os.unlink(self.writer.path)
+                self.writer = writer
+        self.finish_quality()
+        self.report_quality()
+        self.mark_combined(branch, pos, date, self.rows_written)
+        return self.rows_written
+
+    # ? Reference tables for one (branch, pos, date). The builders read their lines front to
+    # ? back and keep the first row seen for a key, which is what the old bottom-up loops with
+    # ? overwrite produced, so they also work on lines that are still being downloaded.
+    # ? sources: file type -> lines, or a function returning them; with the content hash of
+    # ? a master file in `digests` its table is taken from / added to self.ref_cache.
+    def build_tables(self, sources, digests=None):
+        tables = {}
+        for name, ftype, builder in REFERENCE_TABLES:
+            lines = sources.get(ftype, [])
+            digest = digests.get(ftype) if digests else None
+            key = None
+            if digest and ftype in CACHED_TYPES:
+                # the item table also depends on whether this is a new branch
+                key = (ftype, digest, int(ftype == "rd5500" and self.branch in self.new_branches))
+                tables[name] = self.ref_cache.get(key)
+                if tables[name] is not None:
+                    continue
+            tables[name] = getattr(self, builder)(lines() if callable(lines) else lines)
+            if key:
+                self.ref_cache.put(key, tables[name])
+        return tables
+
+    def build_item_dict(self, lines):
+        item_dict = {}
+        new_branch = self.branch in self.new_branches
+        for row in lines:
+            line = row.strip().split(",")
+            if line[0] in item_dict:
+                continue
+            # * Category code line 12 for department
+            if len(line) > 12 and new_branch:  # must have at least 13 columns
+                item_dict[line[0]] = {
+                    "item_name": line[1],
+                    "department_code": line[12]
+                }
+            elif len(line) > 3 and new_branch:
+                item_dict[line[0]] = {
+                    "item_name": line[1],
+                    "department_code": line[3]
+                }
+            elif len(line) >= 2:  # make sure we have at least 2 columns
+                item_dict[line[0]] = {
+                    "item_name": line[1]
+                }
+            elif len(line) == 1 and line[0]:
+                # optional: handle rows with only one value
+                item_dict[line[0]] = ""
+        return item_dict
+
+    def build_code_dict(self, lines):
+        # rd1800 departments and discounts: code -> description
+        code_dict = {}
+        for row in lines:
+            line = row.split(",")
+            if line[0] in code_dict:
+                continue
+            if len(line) >= 2:  # make sure we have at least 2 columns
+                code_dict[line[0]] = line[1]
+            elif len(line) == 1 and line[0]:
+                # optional: handle rows with only one value
+                code_dict[line[0]] = ""
+        return code_dict
+
+    def build_tnsc_dict(self, lines):
+        # rd5800: transaction number -> pay code
+        # rows too short to hold both are counted in the unit's quality record
+        tnsc_dict = {}
+        for row in lines:
+            line = row.split(",")
+            if(len(line)<11):
+                if self.unit_quality:
+                    self.unit_quality.short("rd5800_lack_11", row)
+            elif(len(line)<20):
+                if self.unit_quality:
+                    self.unit_quality.short("rd5800_lack_20", row)
+            elif line[20] not in tnsc_dict:
+                tnsc_dict[line[20]] = line[11]
+        return tnsc_dict
+
+    def build_paym_dict(self, lines):
+        paym_dict = {}
+        for row in lines:
+            line = row.split(",")
+            if line[0] in paym_dict:
+                continue
+            if len(line) >= 2:  # make sure we have at least 2 columns
+                paym_dict[line[0]] = line[1]
+            else:
+                # optional: handle rows with only one value
+                paym_dict[line[0]] = ""
+        return paym_dict
 
-    def preProc (self, filename):
+    def build_blpr_dict(self, lines):
+        # blpr: OR number (unwrapped from its ="..." quoting) -> customer phone
+        blpr_dict = {}
+        for row in lines:
+            line = row.split(",")
+            if(len(line) > 3 and len(line[1]) == 11):
+                match = BLPR_ORNO.search(line[3])
+                key = match.group(1) if match else line[3]
+                if key not in blpr_dict:
+                    blpr_dict[key] = line[1]
+        return blpr_dict
+
+    # ? rd5000 transform: every line is joined with the reference tables and appended to the
+    # ? record; rows dated outside the unit's date go to the error monitor instead.
+    # ? rows go through a RowPlan compiled from the rd5000 header: the same lines as
+    # ? stringifyAppend() for quote-free rows, without re-deciding every column's handling on
+    # ? every row; rows with quotes are split by the csv reader (rowplan.split_row)
+    # ? short rows, rows that fail and lookup misses are counted in self.unit_quality
+    # ? instead of being printed
+    def append_rows(self, filename, lines, tables, header=None):
+        plan = RowPlan(header, tables, self.pos, self.branch, self.branch in self.new_branches, TYPE_DICT, TIME_DICT)
+        unit_quality = self.unit_quality
+        for line in lines:
+            unit_quality.rows_read += 1
+            try:
+                fields = split_row(line)
+                if len(fields) < quality.RD5000_FIELDS:
+                    unit_quality.short("rd5000", line)
+                record, date = plan.render(fields)
+                #  ? date is col[8] of the record line
+                if date.strip() != self.date:
+                    self.update_monitor_csv()
+                    unit_quality.date_mismatches += 1
+                elif(not record == ""):
+                    # ? splitting the record into Excel-sized files is the writer's job
+                    # ? (RECORD_SHARD_ROWS, see shardwriter.py)
+                    self.csvGenAppend(self.record_file, record)
+                    self.rows_written += 1
+                    if plan.missed:
+                        unit_quality.missed(plan.missed, line)
+            except Exception as e:
+                unit_quality.dropped(line, e)
+
+    def append_frame(self, lines, tables):
+        # same as append_rows, one column at a time (see frame_engine.py)
+        rows, mismatched = frame_engine.transform(lines, tables, self.pos, self.branch, self.date,
+                                                  self.branch in self.new_branches, TYPE_DICT, TIME_DICT, self.unit_quality)
+        self.unit_quality.rows_read += len(lines)
+        self.unit_quality.date_mismatches += mismatched
+        if mismatched:
+            self.monitor.add(self.pos, self.branch, self.date, mismatched)
+        self.writer.write_lines(rows)
+        self.rows_written += len(rows)
+
+    def sourcePath(self, filename):
         normalized = os.path.normpath(filename)
 
         # Get only the base filename
@@ -279,7 +573,15 @@ class Combiner():
             candidate = os.path.join(self.workdir, name + ".csv")
         else:
             candidate = os.path.join(self.parentDir, self.filePaths[0].lstrip('/'), name + ".csv")
+        return candidate
 
+    # ? Reference implementation, not called by the pipeline: preProc() + stringifyAppend() are
+    # ? the original per-line transform that RowPlan (rowplan.py) and frame_engine.py reproduce
+    # ? byte for byte on rows without quote characters (stringifyAppend splits a quoted comma
+    # ? like any other). They are kept as the oracle the two are checked against
+    # ? (bench_rowplan.py, tests/test_engines.py); change them only together with those.
+    def preProc (self, filename):
+        candidate = self.sourcePath(filename)
         try:
             with open(candidate, "r", encoding="utf-8") as f1:
                 file = f1.read()
@@ -297,7 +599,8 @@ class Combiner():
         # file = file.replace('\\N', '[NULL]')
         # file = file.replace('~', '\n')
         # file = file.replace('\'\'', '"')
-    # ? Main function for creating the per line of the master data by appending the necessary fields from the reference files.
+    # ? Reference implementation (see preProc above): one master data line, built by appending the
+    # ? necessary fields from the reference files.
     def stringifyAppend(self, filename, line, item, disc, dept, type, time, tnsc, paym, blpr):
         bpcust = False
         x = line.split(",")
@@ -429,57 +732,149 @@ class Combiner():
 
         return string
 
-    def update_monitor_csv(self, filename="masterData_errorMonitoring.csv"):
-        headers = ["pos", "branch", "date"]
-        new_entry = [self.pos, self.branch, self.date]
-
-        existing_rows = []
-
-        # Read existing file if it exists
-        if os.path.exists(filename):
-            with open(filename, "r", newline="") as f:
-                reader = csv.reader(f)
-                existing_rows = list(reader)
+    def finish_quality(self):
+        # the unit went through: one summary line instead of a line per problem row
+        unit_quality = self.unit_quality
+        unit_quality.rows_written = self.rows_written
+        print("Finished converting rd5000: %d rows written, %d dropped, %d dated elsewhere, %d short" % (
+            unit_quality.rows_written, unit_quality.rows_dropped, unit_quality.date_mismatches, sum(unit_quality.short_rows.values())))
 
-            # Remove header for comparison
-            data_rows = existing_rows[1:] if existing_rows else []
+    def report_quality(self, record=None):
+        # one JSON line per combined unit (quality.py); record: a worker's, as a dict
+        if self.quality_log is not None:
+            self.quality_log.write(record or self.unit_quality.record())
 
-            # Check if already logged
-            if new_entry in data_rows:
-                return  # Already exists → do nothing
-        else:
-            # File does not exist → create with headers
-            with open(filename, "w", newline="") as f:
-                writer = csv.writer(f)
-                writer.writerow(headers)
-                writer.writerow(new_entry)
-            return
-
-        # Append new unique entry
-        with open(filename, "a", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow(new_entry)
+    def update_monitor_csv(self):
+        # counted in memory; masterData_errorMonitoring.csv is written once by finish()
+        self.monitor.add(self.pos, self.branch, self.date)
 
     def prepare_csv(self):
         # If an out_file was provided for job isolation, use it. Otherwise use repo record2025.csv
         if self.out_file:
             record_file = os.path.abspath(self.out_file)
-            header_file = os.path.join(self.parentDir, "aaa_headers.csv")
         else:
             record_file = os.path.join(self.parentDir, "record2025.csv")
-            header_file = os.path.join(self.parentDir, "aaa_headers.csv")
 
-        # Ensure file exists and has header if empty
+        if self.sharded():
+            # the shard directory; every shard gets the header when it is opened
+            return os.path.splitext(record_file)[0] + ".parts"
+
+        # Ensure file exists and has header if empty; under the record's lock (see recordwriter.py)
+        # so a process that finds it empty never writes over rows another one just committed
         if (not os.path.exists(record_file)) or (os.path.getsize(record_file) == 0):
-            with open(record_file, "w", encoding="utf-8") as f_out:
-                if os.path.exists(header_file):
-                    with open(header_file, "r", encoding="utf-8") as f_header:
-                        f_out.write(f_header.read().strip() + "\n")
+            with locked(record_file):
+                if (not os.path.exists(record_file)) or (os.path.getsize(record_file) == 0):
+                    with open(record_file, "a", encoding="utf-8") as f_out:
+                        if self.read_header():
+                            f_out.write(self.read_header() + "\n")
+
+        return record_file
+    def read_header(self):
+        if self.header is not None:
+            return self.header.strip()
+        header_file = os.path.join(self.parentDir, "aaa_headers.csv")
+        if not os.path.exists(header_file):
+            return ""
+        with open(header_file, "r", encoding="utf-8") as f_header:
+            self.header = f_header.read().strip()
+        return self.header
+
+    # ? Unit boundaries. Without a store every unit goes to the one record file, committed
+    # ? at the end of the unit and rolled back if it fails; with a RecordStore and/or
+    # ? columnar output each unit is written to a staging file (with the header) that
+    # ? replaces the unit's partition and/or is added to the columnar date file.
+    def staged(self):
+        return self.store is not None or self.columnar is not None
+
+    def sharded(self):
+        return not self.staged() and bool(self.shard_rows or self.shard_bytes)
+
+    def staging(self, branch, pos, date):
+        return (self.store or self.columnar).staging(branch, pos, date)
+
+    def unit_header(self):
+        return self.store.header if self.store else self.read_header()
+
+    def begin_unit(self):
+        if self.staged():
+            self.record_file = self.staging(self.branch, self.pos, self.date)
+            self.writer = RecordWriter(self.record_file, mode="w")
+            self.writer.write(self.unit_header())
+        else:
+            if self.writer is None:
+                self.record_file = self.open_writer()
+            self.writer.unit(self.branch, self.pos, self.date)
+
+    def end_unit(self):
+        if self.staged():
+            self.writer.commit()
+            self.writer.close()
+            path, self.writer = self.writer.path, None
+            self.finish_unit(self.branch, self.pos, self.date, path, self.rows_written)
+        else:
+            self.writer.commit()
+
+    def finish_unit(self, branch, pos, date, path, rows):
+        # a complete staged unit goes to its partition and/or the columnar output
+        if self.store:
+            path = self.record_file = self.store.replace(branch, pos, date, path, rows)
+        if self.columnar:
+            self.mark_dates(self.columnar.add(branch, pos, date, path))
+            if not self.store:
+                os.unlink(path)
+
+    def mark_combined(self, branch, pos, date, rows):
+        # with columnar output a unit only counts as combined once its date file is written
+        if not self.journal:
+            return
+        if self.columnar:
+            self.unmarked.append((branch, pos, date, rows))
+        else:
+            self.journal.mark_combined(branch, pos, date, rows)
+
+    def mark_dates(self, dates):
+        for unit in [unit for unit in self.unmarked if str(unit[2])[:10] in dates]:
+            self.journal.mark_combined(*unit)
+            self.unmarked.remove(unit)
 
+    def abort_unit(self):
+        if self.writer is None:
+            return
+        if self.staged():
+            self.writer.close()
+            os.unlink(self.writer.path)
+            self.writer = None
+        else:
+            self.writer.rollback()
+
+    def open_writer(self):
+        # one buffered handle on the record file for the rest of the run (see recordwriter.py)
+        record_file = self.prepare_csv()
+        if self.writer is None or self.writer.path != record_file:
+            self.close_writer()
+            if self.sharded():
+                self.writer = ShardedWriter(record_file, self.read_header(), self.shard_rows, self.shard_bytes)
+            else:
+                self.writer = RecordWriter(record_file)
         return record_file
-    def csvGenAppend(self, filename, part, line):
-        with open(self.record_file, "a", encoding="utf-8") as f_out:
-            f_out.write(str(line) + "\n")
+
+    def finish(self):
+        # end of a run: close the record and write the error monitor (and store manifest)
+        self.close_writer()
+        self.monitor.flush()
+        if self.store:
+            self.store.flush()
+        if self.columnar:
+            self.mark_dates(self.columnar.close())
+
+    def close_writer(self):
+        if self.writer is not None:
+            self.writer.commit()
+            self.writer.close()
+            self.writer = None
+
+    def csvGenAppend(self, filename, line):
+        self.writer.write(str(line))
     def clean_csv_edges(self, file_path):
         with open(file_path, "r", encoding="utf-8") as f:
             lines = [line.rstrip("\n") for line in f]
@@ -511,4 +906,38 @@ class Combiner():
     #             vertical_concat.to_csv('record_2025_new.csv',index = False)
     #         #os.remove("./append.csv")
     #     else:
-    #         print("No Append")
\ No newline at end of file
+    #         print("No Append")
+
+
+# ? combine_parallel() workers: one Combiner per process, reused for every unit it gets
+_worker = None
+
+
+def init_worker(workdir, engine, cache_size=refcache.CAPACITY, cache_dir=refcache.DIRECTORY, root=None, new_branches=None, header=None):
+    # each worker keeps its own reference cache; a cache directory is shared between them.
+    # Settings come from the parent, so the worker does not depend on its working directory.
+    # The parent writes every output, so the worker never opens a store partition, columnar
+    # date file or shard, whatever RECORD_STORE / RECORD_COLUMNAR / RECORD_SHARD_* say.
+    global _worker
+    _worker = Combiner(workdir=workdir, engine=engine, workers=1, ref_cache=refcache.RefCache(cache_size, cache_dir),
+                       store=None, columnar=None, shard_rows=None, shard_bytes=None,
+                       root=root, new_branches=new_branches, header=header)
+
+
+def combine_leaf(branch, pos, date, fileTypes, shard, header=None):
+    # combine one (branch, pos, date) into `shard` (after `header`, for a store partition);
+    # returns (rows, mismatched-row counts, quality record)
+    _worker.branch = branch
+    _worker.pos = pos
+    _worker.date = date
+    _worker.record_file = shard
+    _worker.writer = RecordWriter(shard, mode="w")
+    if header is not None:
+        _worker.writer.write(header)
+    try:
+        _worker.GenAppend(fileTypes['rd5000'] if 'rd5000' in fileTypes else [], fileTypes)
+    finally:
+        _worker.writer.close()
+        _worker.writer = None
+    mismatched, _worker.monitor.counts = _worker.monitor.counts, {}
+    return _worker.rows_written, mismatched, _worker.unit_quality.record()
@@ -0,0 +1,51 @@
+import os
+import csv
+from filelock import locked
+
+# masterData_errorMonitoring.csv lists every (pos, branch, date) unit whose rd5000 file
+# carried rows dated on another day, with the number of such rows from the last time the
+# unit was combined. Rows are counted in memory while combining and the file is rewritten
+# (atomically) once per run. Files from before the count column existed load with an
+# empty count, which is filled in once the unit is combined again. Several processes may
+# share the file: flush() reads it again under a lock (filelock.py) and merges its counts
+# into what is there, so units another process added meanwhile are kept.
+
+HEADERS = ["pos", "branch", "date", "mismatched_rows"]
+
+
+class ErrorMonitor:
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}  # (pos, branch, date) -> mismatched rows, in file order
+        self.counts = {}  # (pos, branch, date) -> mismatched rows seen in this run
+        self.load()
+
+    def load(self):
+        self.entries = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r", newline="") as f:
+                for row in list(csv.reader(f))[1:]:
+                    if len(row) >= 3:
+                        self.entries[tuple(row[:3])] = row[3] if len(row) > 3 else ""
+
+    def add(self, pos, branch, date, rows=1):
+        key = (str(pos), str(branch), str(date))
+        self.counts[key] = self.counts.get(key, 0) + rows
+
+    def flush(self):
+        # counts from this run replace older counts for the same unit, so re-combining a
+        # unit does not double it
+        if not self.counts:
+            return
+        with locked(self.path):
+            self.load()
+            self.entries.update(self.counts)
+            self.counts = {}
+            tmp = self.path + ".%d.tmp" % os.getpid()
+            with open(tmp, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(HEADERS)
+                for key, count in self.entries.items():
+                    writer.writerow(list(key) + [count])
+            os.replace(tmp, self.path)
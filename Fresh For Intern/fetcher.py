@@ -8,15 +8,47 @@ import pandas
 import datetime
 import unicodedata
 import shutil
+import hashlib
+import codecs
+import asyncio
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from combiner import Combiner
+from watcher import Watcher
+from listing import parse_listing, parse_listing_name, newest_snapshots, ListingCache, SETTLE_DAYS
+from scheduler import FetchScheduler, FetchFailed, CircuitOpen
+from rawstore import RawStore
+from journal import Journal
+import http_client
+import refcache
 
 class Receive():
 
-	def __init__(self, start_time,end_time,datearr=pandas.DataFrame()):		
+	def __init__(self, start_time,end_time,datearr=pandas.DataFrame(),pool_size=http_client.POOL_SIZE,settle_days=SETTLE_DAYS):		
 		self.exitFlag = 0
+		# one pooled keep-alive session for every send()/download_file() of this run
+		self.poolSize = pool_size
+		self.session = http_client.new_session(pool_size)
+		self.baseUrl = http_client.BASE_URL
 
 		self.parentDir = os.getcwd()
 		#parentDir = "/storage/emulated/0"
+		# listings of dates older than settle_days are served from disk
+		self.listingCache = ListingCache(self.parentDir + "/cache/listings", settle_days)
+		# raw exports already downloaded in earlier runs are hardlinked from here instead;
+		# RAW_STORE_COMPRESS=1 gzips new blobs to save disk at the cost of a copy per restore
+		self.rawStore = RawStore(self.parentDir + "/rawstore", os.getenv("RAW_STORE_COMPRESS", "0") == "1")
+		self.storeHits = 0
+		self.filesFetched = 0
+		self.bytesFetched = 0
+		# per-(branch, pos, date) checkpoints; completed units are skipped on re-runs, empty
+		# ones only once they were seen empty after the same settle window
+		self.journal = Journal(self.parentDir + "/journal.log", settle_days)
+		# rate limit, retries with backoff and per-branch circuit breakers for every request
+		self.scheduler = FetchScheduler()
+		self.deferred = []
+		self.lock = threading.Lock()
 
 		if datearr.empty:
 			self.sfull = start_time.split("-")
@@ -44,101 +76,217 @@ class Receive():
 		print(pos)
 		print(date)
 		print("Fetching: " + branch +" POS #" + str(pos) + " for date " + str(filt_date))
-		for i in range(3):
-			try:
-				self.headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.12; rv:55.0) Gecko/20100101 Firefox/55.0',
-				'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-    			'Accept-Language': 'en-US,en;q=0.5',
-    			'Content-Type': 'application/x-www-form-urlencoded',
-    			'Referer': 'https://biggsph.com/',
-    			'Origin': 'https://biggsph.com'}
-				self.url = 'https://biggsph.com/biggsinc_loyalty/controller/fetch_list2.php'
-				self.s = requests.Session()
-				self.data = {'branch' : branch, 'pos': pos, 'date': filt_date}
-				self.r = requests.Request('POST',self.url, data = self.data, headers = self.headers).prepare()
-				self.resp = self.s.send(self.r)
-				# print("Report List:")
-				# print(self.resp.text)
-				if "<!doctype html>" in self.resp.text:
-					return [""]
-				else:
-					return self.resp.text.split(",")
-				break
-			except Exception as e:
-				print(e)
+		cached = self.listingCache.get(branch, pos, filt_date)
+		if cached is not None:
+			print("Listing from cache")
+			return cached
+		# locals only: send() is called from worker threads by fetch_async()
+		headers = {'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+		'Accept-Language': 'en-US,en;q=0.5',
+		'Content-Type': 'application/x-www-form-urlencoded',
+		'Referer': 'https://biggsph.com/',
+		'Origin': 'https://biggsph.com'}
+		url = self.baseUrl + 'fetch_list2.php'
+		data = {'branch' : branch, 'pos': pos, 'date': filt_date}
+
+		def request():
+			resp = self.session.post(url, data = data, headers = headers, timeout = http_client.TIMEOUT)
+			# the "no data" page is a normal answer; only server errors/throttling are retried
+			if resp.status_code >= 500 or resp.status_code == 429:
+				resp.raise_for_status()
+			return resp.text
+
+		try:
+			text = self.scheduler.call(branch, request)
+		except CircuitOpen:
+			raise
+		except Exception as e:
+			print(e)
+			return None
+		# print("Report List:")
+		# print(text)
+		if "<!doctype html>" in text:
+			files = [""]
+		else:
+			files = text.split(",")
+		self.listingCache.put(branch, pos, filt_date, files)
+		return files
 
 	def download_file(self, url, destination):
-		for i in range(3):
+		if(not url == ""):
+			name = url.split('/')[-1]
+			local_filename = self.parentDir + "/" + destination + "/" + name
+			if self.rawStore.has(name):
+				# already archived by an earlier run: skip the download
+				self.storeHits += 1
+				return self.rawStore.materialize(name, local_filename)
+
+			def download():
+				# NOTE the stream=True parameter below; the connection goes back to the pool on exit
+				with self.session.get(self.baseUrl + url, stream=True, timeout = http_client.TIMEOUT) as r:
+					r.raise_for_status()
+					with open(local_filename, 'wb') as f:
+						for chunk in r.iter_content(chunk_size=8192): 
+							# If you have chunk encoded response uncomment if
+							# and set chunk_size parameter to None.
+							#if chunk: 
+							f.write(chunk)
+
+			entry = parse_listing_name(url)
 			try:
-				if(not url == ""):
-					self.headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.12; rv:55.0) Gecko/20100101 Firefox/55.0',}
-					self.local_filename = self.parentDir + "/" + destination + "/" + url.split('/')[-1]
-					# NOTE the stream=True parameter below
-					with requests.get("https://biggsph.com/biggsinc_loyalty/controller/" + url, stream=True, headers = self.headers) as r:
-						r.raise_for_status()
-						with open(self.local_filename, 'wb') as f:
-							for chunk in r.iter_content(chunk_size=8192): 
-								# If you have chunk encoded response uncomment if
-								# and set chunk_size parameter to None.
-								#if chunk: 
-								f.write(chunk)
-					return self.local_filename
-				else:
-					return ""
-				break
+				self.scheduler.call(entry.branch if entry else "", download)
+			except CircuitOpen:
+				raise
 			except Exception as e:
 				print(e)
 				return ""
+			self.rawStore.put(name, local_filename)
+			with self.lock:
+				self.filesFetched += 1
+				self.bytesFetched += os.path.getsize(local_filename)
+			return local_filename
+		else:
+			return ""
+
+	# ? Streaming ingest: yields the lines of `url` while the response is still arriving,
+	# ? decoded and split the same way linestream.lines() reads the file. With a
+	# ? destination the raw bytes are teed to destination/ and archived in the raw store;
+	# ? files the raw store already has are read from there instead of downloaded.
+	def stream_lines(self, url, destination=None):
+		name = url.split('/')[-1]
+		if self.rawStore.has(name):
+			self.storeHits += 1
+			source = self.rawStore.open(name)
+			chunks = iter(lambda: source.read(65536), b"")
+			destination = None
+		else:
+			entry = parse_listing_name(url)
+			source = self.scheduler.call(entry.branch if entry else "", lambda: self.open_stream(url))
+			chunks = source.iter_content(chunk_size=65536)
+		local_filename = self.parentDir + "/" + destination + "/" + name if destination else None
+		tee = open(local_filename, 'wb') if local_filename else None
+		decoder = codecs.getincrementaldecoder("utf-8")()
+		pending = ""
+		size = 0
+		try:
+			for chunk in chunks:
+				size += len(chunk)
+				if tee:
+					tee.write(chunk)
+				text = pending + decoder.decode(chunk)
+				# a \r at the end may be the first half of a \r\n split across chunks
+				keep = 1 if text.endswith("\r") else 0
+				lines = text[:len(text) - keep].splitlines(True)
+				pending = text[len(text) - keep:]
+				if lines and lines[-1].splitlines()[0] == lines[-1]:
+					pending = lines.pop() + pending
+				for line in lines:
+					yield line.splitlines()[0]
+			pending += decoder.decode(b"", final=True)
+			for line in pending.splitlines():
+				yield line
+		finally:
+			source.close()
+			if tee:
+				tee.close()
+		if isinstance(source, requests.Response):
+			if local_filename:
+				self.rawStore.put(name, local_filename)
+			with self.lock:
+				self.filesFetched += 1
+				self.bytesFetched += size
+
+	def open_stream(self, url):
+		r = self.session.get(self.baseUrl + url, stream=True, timeout = http_client.TIMEOUT)
+		try:
+			r.raise_for_status()
+		except Exception:
+			r.close()
+			raise
+		return r
+
+	# ? Only the newest snapshot of each branch/pos/filetype/date is downloaded; older
+	# ? snapshots in the listing would otherwise double the download and combine work.
+	def select_snapshots(self, filearray):
+		entries = parse_listing(filearray)
+		selected = newest_snapshots(entries)
+		if len(selected) < len(entries):
+			print("Skipping %d older snapshot(s)" % (len(entries) - len(selected)))
+		return [entry.path for entry in selected]
+
+	# ? One (branch, pos, date) unit: listing and downloads, checkpointed in the journal.
+	# ? A unit whose branch circuit is open, or whose requests keep failing, is deferred to
+	# ? the retry pass at the end of the run instead of holding up the other branches.
+	def fetch_unit(self, branch, pos, date, destination="latest"):
+		if self.journal.complete(branch, pos, date):
+			print("Skipping %s POS #%s %s: already combined" % (branch, pos, str(date)[:10]))
+			return []
+		try:
+			filearray = self.send(branch, pos, date)
+			if filearray is None:
+				raise FetchFailed("listing failed")
+			files = self.select_snapshots(filearray)
+			if not files:
+				# ? nothing exported for the unit (the "no data" listing): final once the date has
+				# ? settled, retried before that, see journal.py
+				self.journal.mark(branch, pos, date, "empty")
+				return []
+			self.journal.mark(branch, pos, date, "listed", len(files))
+			paths = []
+			for file in files:
+				print("Downloading file: " + file)
+				path = self.download_file(file, destination)
+				if path == "":
+					raise FetchFailed("download failed: " + file)
+				paths.append(path)
+		except FetchFailed as e:
+			self.defer(branch, pos, date, e, destination)
+			return []
+		self.mark_downloaded(branch, pos, date, paths)
+		return paths
+
+	def defer(self, branch, pos, date, reason, destination):
+		print("Deferring %s POS #%s %s: %s" % (branch, pos, str(date)[:10], reason))
+		# drop what was already downloaded so the combiner never sees a partial unit
+		folder = self.parentDir + "/" + destination
+		for name in os.listdir(folder):
+			entry = parse_listing_name(name)
+			if entry and (entry.branch, entry.pos, entry.date) == (branch, str(pos), str(date)[:10]):
+				os.unlink(os.path.join(folder, name))
+		with self.lock:
+			self.deferred.append((branch, pos, date))
+
+	# * End-of-run retry queue: deferred units are fetched once more (waiting out any open
+	# * circuit first) and combined on their own. Units that still fail are listed so
+	# * missing_generate.py can pick them up later.
+	def retry_deferred(self):
+		if not self.deferred:
+			return
+		units, self.deferred = self.deferred, []
+		print("\nRetrying %d deferred unit(s)\n" % len(units))
+		self.clean(self.parentDir + '/latest')
+		for branch, pos, date in units:
+			self.scheduler.wait_for(branch)
+			self.fetch_unit(branch, pos, date)
+		compress = Combiner(journal=self.journal)
+		compress.generate()
+		self.clean(self.parentDir + '/latest')
+		for branch, pos, date in self.deferred:
+			print("Still failing: %s POS #%s %s" % (branch, pos, str(date)[:10]))
+
+	def mark_downloaded(self, branch, pos, date, paths):
+		# the hash covers the raw store digests of every file downloaded for the unit
+		digests = sorted(self.rawStore.digest(os.path.basename(path)) for path in paths)
+		digest = hashlib.sha256(",".join(digests).encode()).hexdigest()[:16]
+		self.journal.mark(branch, pos, date, "downloaded", len(paths), digest)
 
 	def process(self,filearray,pos):
 		try:
-			filetypes = ["rd1800", "blpr", "discount", "rd5000", "rd5500", "rd5800", "rd5900"]
-			self.maxfile = {ftype: {"file": "", "count": 0} for ftype in filetypes}
 			self.tempfile = ""
-			self.maxcount = 0
-			self.tempcount = 0
-			self.local = ""
-			for file in filearray:
-				if file != "":
-					# ? Download the file to temp folder
-					print("Downloading file: " + file)
-					self.tempfile = self.download_file(file,"latest")
-					
-			# 		# f1 = open(self.tempfile,"r")
-			# 		with open(self.tempfile, "r") as f1:
-			# 			self.tempcount = len(f1.readlines())
-			# 		# Check which type this file belongs to
-			# 		for ftype in filetypes:
-			# 			if ftype in file.lower():  # match by keyword in filename
-			# 				if self.tempcount >= self.maxfile[ftype]["count"]:
-			# 					self.maxfile[ftype]["count"] = self.tempcount
-			# 					self.maxfile[ftype]["file"] = file
-			# for ftype, info in self.maxfile.items():
-			# 	print(f"Type: {ftype}, Max Count: {info['count']}, Max File: {info['file']}")
-			# huh = input("huh")
-
-			# Save all latest files
-			# for ftype, info in self.maxfile.items():
-			# 	if info["file"] != "" and info["count"] > 0:
-			# 		print("Saving latest for " + ftype + ": " + info["file"])
-			# 		local = self.download_file(info["file"], "latest")
-
-			# 		if local != "":
-			# 			with open(local, "r") as f2:
-			# 				content = f2.read()
-			# 				newcontent = unicodedata.normalize('NFKD', content).encode('ascii', 'ignore').decode('ascii')
-
-			# 			with open(local, "w") as f3:
-			# 				f3.write(newcontent.replace('="', '').replace('"', ''))
-
-			# 			# Load, adjust, and save back without headers
-			# 			posalign = pandas.read_csv(local, dtype=str, index_col=False, header=0)
-			# 			print("posalign for " + ftype)
-			# 			# print(posalign)
-			# 			posalign.to_csv(local, index=False, header=False)
-			# 		else:
-			# 			print("Process Error: Blank File Name for " + ftype)
-			# huh = input("huh")
+			for file in self.select_snapshots(filearray):
+				# ? Download the file to latest folder
+				print("Downloading file: " + file)
+				self.tempfile = self.download_file(file,"latest")
 
 		except Exception as e:
 			print("Process Error")
@@ -167,27 +315,251 @@ class Receive():
 			print("\nFetching "+ str(date) +" \n")
 			for branch in self.branches:
 				print("\n\tFetching "+ branch +"\n")
-				pos1 = self.send(branch, 1, date)
-				pos2 = self.send(branch, 2, date)
-				self.process(pos1,1)
+				self.fetch_unit(branch, 1, date)
 				# self.clean(self.parentDir + '/temp')
-				self.process(pos2,2)
+				self.fetch_unit(branch, 2, date)
 				# self.clean(self.parentDir + '/temp')
 			# input("Generate Combiner")
-			compress = Combiner()
+			compress = Combiner(journal=self.journal)
 			compress.generate()
 			self.clean(self.parentDir + '/latest')
-			f3 = open(self.parentDir + "/last_record.log","w")
-			f3.write((date + datetime.timedelta(days=1)).strftime("%Y-%m-%d"))
-			# f3.write(date.strftime("%Y-%m-%d"))
-			f3.close()
+			self.write_last_record(date)
 				# print(pos1)
 				# exit()
 
 			# compress.append()
+		self.retry_deferred()
+		print ("Maxfiles that have 0 entries:")
+		for x in range(len(self.empty)):
+			print (self.empty[x])
+		self.report()
+
+	def report(self):
+		print("Listing cache: %d hits, %d listing requests" % (self.listingCache.hits, self.listingCache.misses))
+		print("Downloaded %d files (%.1f MB); raw store: %d files restored without downloading" % (self.filesFetched, self.bytesFetched / 1e6, self.storeHits))
+		print(refcache.shared.report())
+		print("Per-branch requests:")
+		for row in self.scheduler.report():
+			print("\t" + row)
+
+	def write_last_record(self, date):
+		f3 = open(self.parentDir + "/last_record.log","w")
+		f3.write((date + datetime.timedelta(days=1)).strftime("%Y-%m-%d"))
+		# f3.write(date.strftime("%Y-%m-%d"))
+		f3.close()
+
+	# * Async variant of fetch(): the fetch_list2.php listing and the downloads of every
+	# * (branch, pos) for a date run concurrently, at most `concurrency` requests in flight.
+	# * Files land in latest/ under the same names, so Combiner.generate() is unchanged.
+	def fetch_async(self, concurrency=8):
+		self.size_pool(concurrency)
+		self.clean(self.parentDir + '/latest')
+		self.clean(self.parentDir + '/temp')
+		started = time.time()
+		fetched = 0
+		for date in self.dlist:
+			print("\nFetching "+ str(date) +" \n")
+			fetched += len(self.fetch_date(date, concurrency))
+			compress = Combiner(journal=self.journal)
+			compress.generate()
+			self.clean(self.parentDir + '/latest')
+			self.write_last_record(date)
+		elapsed = time.time() - started
+		print("Run fetched %d files in %.1fs (%.2f files/sec, concurrency %d)" % (fetched, elapsed, fetched / elapsed if elapsed else 0.0, concurrency))
+		self.retry_deferred()
+		print ("Maxfiles that have 0 entries:")
+		for x in range(len(self.empty)):
+			print (self.empty[x])
+		self.report()
+
+	# * Pipelined variant of fetch_async(): date N is combined on a background thread while
+	# * date N+1 downloads. Every date gets its own workdir (latest/<date>/) so nothing is
+	# * shared between the stages, and at most `depth` fetched dates wait for the combiner.
+	# * The combiner handles dates in order and last_record.log only advances once a date
+	# * has been fully combined, so a crash resumes at the first date not yet combined.
+	def fetch_pipelined(self, concurrency=8, depth=2):
+		self.size_pool(concurrency)
+		self.clean(self.parentDir + '/latest')
+		self.clean(self.parentDir + '/temp')
+		started = time.time()
+		fetched = 0
+		combine_time = [0.0]
+		failed = []
+		ready = queue.Queue(maxsize=depth)
+
+		def combine_stage():
+			while True:
+				item = ready.get()
+				if item is None:
+					return
+				date, workdir = item
+				if failed:
+					continue  # drain so the fetch stage never blocks on a dead combiner
+				try:
+					combine_started = time.time()
+					compress = Combiner(workdir=workdir, journal=self.journal)
+					compress.generate()
+					shutil.rmtree(workdir, ignore_errors=True)
+					self.write_last_record(date)
+					combine_time[0] += time.time() - combine_started
+				except Exception as e:
+					failed.append(e)
+
+		combiner = threading.Thread(target=combine_stage, name="combine-stage")
+		combiner.start()
+		try:
+			for date in self.dlist:
+				if failed:
+					break
+				print("\nFetching "+ str(date) +" \n")
+				destination = "latest/" + str(date)[:10]
+				os.makedirs(self.parentDir + "/" + destination, exist_ok=True)
+				fetched += len(self.fetch_date(date, concurrency, destination))
+				ready.put((date, self.parentDir + "/" + destination))  # blocks while `depth` dates are queued
+		finally:
+			ready.put(None)
+			combiner.join()
+		if failed:
+			print("Combine stage failed; last_record.log points at the first date not combined")
+			raise failed[0]
+		elapsed = time.time() - started
+		print("Run fetched %d files in %.1fs wall clock (combine %.1fs, %.2f files/sec, concurrency %d, depth %d)" % (fetched, elapsed, combine_time[0], fetched / elapsed if elapsed else 0.0, concurrency, depth))
+		self.retry_deferred()
+		print ("Maxfiles that have 0 entries:")
+		for x in range(len(self.empty)):
+			print (self.empty[x])
+		self.report()
+
+	# * Incremental variant of fetch_async(): a watcher.Watcher combines each (branch, pos, date)
+	# * in latest/ as soon as the journal marks it downloaded, while the rest of the date (and
+	# * the next dates) are still downloading, and deletes its files once it is combined. The
+	# * record, store and columnar outputs are written by one Combiner for the whole run.
+	def fetch_incremental(self, concurrency=8):
+		self.size_pool(concurrency)
+		self.clean(self.parentDir + '/latest')
+		self.clean(self.parentDir + '/temp')
+		started = time.time()
+		fetched = 0
+		watcher = Watcher(Combiner(journal=self.journal), self.parentDir + '/latest', remove=True).start()
+		try:
+			for date in self.dlist:
+				print("\nFetching "+ str(date) +" \n")
+				fetched += len(self.fetch_date(date, concurrency))
+		finally:
+			# whatever is still in latest/ is complete now; combine it and close the outputs
+			watcher.stop()
+		self.clean(self.parentDir + '/latest')
+		if len(self.dlist):
+			self.write_last_record(self.dlist[-1])
+		elapsed = time.time() - started
+		print("Run fetched %d files and combined %d units (%d rows) in %.1fs (%.2f files/sec, concurrency %d)" % (fetched, watcher.combined, watcher.rows, elapsed, fetched / elapsed if elapsed else 0.0, concurrency))
+		self.retry_deferred()
+		print ("Maxfiles that have 0 entries:")
+		for x in range(len(self.empty)):
+			print (self.empty[x])
+		self.report()
+
+	# * Streaming variant of fetch(): every export is decoded and split into lines while it
+	# * downloads and goes straight into Combiner.combine_stream(), instead of being written to
+	# * latest/ and read back by the file path (linestream.py). tee=True still writes the raw files
+	# * to latest/ (and the raw store) for archival. Units that fail are deferred and retried
+	# * through the regular file path by retry_deferred().
+	def fetch_stream(self, tee=False):
+		self.clean(self.parentDir + '/latest')
+		self.clean(self.parentDir + '/temp')
+		for date in self.dlist:
+			print("\nStreaming "+ str(date) +" \n")
+			compress = Combiner(journal=self.journal)
+			for branch in self.branches:
+				print("\n\tFetching "+ branch +"\n")
+				self.stream_unit(compress, branch, 1, date, tee)
+				self.stream_unit(compress, branch, 2, date, tee)
+			compress.finish()
+			self.clean(self.parentDir + '/latest')
+			self.write_last_record(date)
+		self.retry_deferred()
 		print ("Maxfiles that have 0 entries:")
 		for x in range(len(self.empty)):
 			print (self.empty[x])
+		self.report()
+
+	def stream_unit(self, combiner, branch, pos, date, tee=False):
+		if self.journal.complete(branch, pos, date):
+			print("Skipping %s POS #%s %s: already combined" % (branch, pos, str(date)[:10]))
+			return 0
+		destination = "latest" if tee else None
+		try:
+			filearray = self.send(branch, pos, date)
+			if filearray is None:
+				raise FetchFailed("listing failed")
+			files = {}
+			for file in self.select_snapshots(filearray):
+				files[parse_listing_name(file).filetype] = file
+			if "rd5000" not in files:
+				# ? nothing to combine, as generate() would find
+				self.journal.mark(branch, pos, date, "empty")
+				return 0
+			self.journal.mark(branch, pos, date, "listed", len(files))
+			sources = {filetype: self.stream_lines(file, destination) for filetype, file in files.items() if filetype != "rd5000"}
+			return combiner.combine_stream(branch, pos, date, sources, self.stream_lines(files["rd5000"], destination))
+		except (FetchFailed, requests.RequestException, UnicodeDecodeError) as e:
+			self.defer(branch, pos, date, e, "latest")
+			return 0
+
+	def size_pool(self, concurrency):
+		if concurrency > self.poolSize:
+			# keep one pooled connection per worker thread
+			self.poolSize = concurrency
+			self.session = http_client.new_session(concurrency)
+
+	def fetch_date(self, date, concurrency, destination="latest"):
+		# download every branch/pos of one date into `destination`, concurrently
+		date_started = time.time()
+		files = asyncio.run(self.fetch_date_async(date, concurrency, destination))
+		elapsed = time.time() - date_started
+		print("Fetched %d files for %s in %.1fs (%.2f files/sec)" % (len(files), str(date)[:10], elapsed, len(files) / elapsed if elapsed else 0.0))
+		return files
+
+	async def fetch_date_async(self, date, concurrency, destination="latest"):
+		# send()/download_file() are blocking requests calls, so they run on a thread pool
+		# sized to the concurrency limit; the semaphore keeps the request count bounded.
+		asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=concurrency))
+		sem = asyncio.Semaphore(concurrency)
+		units = [self.fetch_unit_async(sem, branch, pos, date, destination) for branch in self.branches for pos in (1, 2)]
+		results = await asyncio.gather(*units)
+		return [path for paths in results for path in paths]
+
+	async def fetch_unit_async(self, sem, branch, pos, date, destination):
+		if self.journal.complete(branch, pos, date):
+			print("Skipping %s POS #%s %s: already combined" % (branch, pos, str(date)[:10]))
+			return []
+		try:
+			async with sem:
+				filearray = await asyncio.to_thread(self.send, branch, pos, date)
+			if filearray is None:
+				raise FetchFailed("listing failed")
+			files = self.select_snapshots(filearray)
+			if not files:
+				self.journal.mark(branch, pos, date, "empty")
+				return []
+			self.journal.mark(branch, pos, date, "listed", len(files))
+			downloads = [self.download_async(sem, file, destination) for file in files]
+			paths = await asyncio.gather(*downloads, return_exceptions=True)
+			for file, path in zip(files, paths):
+				if isinstance(path, FetchFailed):
+					raise path
+				if isinstance(path, BaseException) or path == "":
+					raise FetchFailed("download failed: " + file)
+		except FetchFailed as e:
+			self.defer(branch, pos, date, e, destination)
+			return []
+		self.mark_downloaded(branch, pos, date, paths)
+		return paths
+
+	async def download_async(self, sem, file, destination):
+		async with sem:
+			print("Downloading file: " + file)
+			return await asyncio.to_thread(self.download_file, file, destination)
 
 	# def missing_fetch(self, branches):
 	# 	for date in self.dlist.index:
@@ -239,17 +611,14 @@ class Receive():
 				for date in dates:
 					print(f"\tFetching branch {branch}, pos {pos}, date {date}")
 
-					# Call send to get the data
-					result = self.send(branch, pos, date)
-
-					# Process it
-					self.process(result, pos)
+					# List and download it, unless the journal has it combined already
+					self.fetch_unit(branch, pos, date)
 
 					# Clean temp after each pos fetch
 					# self.clean(self.parentDir + '/temp')
 
 			# After processing a branch, you may want to combine/compress
-			compress = Combiner()
+			compress = Combiner(journal=self.journal)
 			compress.generate()
 			self.clean(self.parentDir + '/latest')
 
@@ -259,27 +628,27 @@ class Receive():
 				# with open(self.parentDir + "/last_record.log", "w") as f3:
 				# 	f3.write((datetime.datetime.strptime(last_date, "%Y-%m-%d") + datetime.timedelta(days=1)).strftime("%Y-%m-%d"))
 
+		self.retry_deferred()
 		print("Maxfiles that have 0 entries:")
 		for x in range(len(self.empty)):
 			print(self.empty[x])
+		self.report()
 	def missing_pos_fetch(self):
+		# ? dlist columns are branch + pos (e.g. "SMNAG1"); a 0 marks a missing unit. Units go
+		# ? through fetch_unit() like every other mode, so an open circuit defers them
+		self.clean(self.parentDir + '/latest')
+		self.clean(self.parentDir + '/temp')
 		for date in self.dlist.index:
 			print("\nFetching "+ str(date) +" \n")
 			for branch in self.dlist.columns.values:
-				#print(branch)
 				if (self.dlist.loc[date,branch] == 0):
-					print(branch)
 					print("\n\tFetching "+ str(branch) +"\n")
-					pos = self.send(branch[:-1], int(branch[-1:]), date)
-					print("POS: ")
-					print(pos)
-					self.process(pos, int(branch[-1:]))
-					self.clean(self.parentDir + '/temp')
-			compress = Combiner()
+					self.fetch_unit(branch[:-1], int(branch[-1:]), date)
+			compress = Combiner(journal=self.journal)
 			compress.generate()
-			print("Initiate Append")
-			compress.append()
 			self.clean(self.parentDir + '/latest')
+		self.retry_deferred()
 		print ("Maxfiles that have 0 entries:")
 		for x in range(len(self.empty)):
-			print (self.empty[x])
\ No newline at end of file
+			print (self.empty[x])
+		self.report()
\ No newline at end of file
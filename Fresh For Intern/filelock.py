@@ -0,0 +1,44 @@
+import os
+import contextlib
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Exclusive lock between processes for a shared file that is read, merged and replaced
+# (the error monitor, a record store manifest, a columnar date file). Several Combiners -
+# RQ workers on one host, or runs with different out_files - can then write to the same
+# file without one replace dropping what another process added since it was read. The
+# lock is held on a "<path>.lock" file next to it, which stays behind; the OS releases it
+# if the process dies.
+#
+#   with locked(path):
+#       entries = load(path)
+#       ...
+#       write(path + ".%d.tmp" % os.getpid()); os.replace(...)
+
+
+@contextlib.contextmanager
+def locked(path):
+    f = open(path + ".lock", "a+b")
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # LK_LOCK gives up after ~10 seconds
+                    pass
+        yield
+    finally:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        f.close()
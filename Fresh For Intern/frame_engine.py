@@ -0,0 +1,214 @@
+import io
+import csv
+import numpy as np
+import pandas as pd
+from rowplan import split_row
+
+# Vectorized rd5000 transform, selected with Combiner(engine="frame") or
+# COMBINE_ENGINE=frame. It produces the same lines as the row engine (RowPlan.render) for
+# the same input, but column by column: rd5000 is parsed once by pandas' C reader, every
+# per-field rule (Excel ="..." quoting, date split, daypart, lookups) is evaluated once per
+# distinct value and spread over the column with Series.map, and the enrichment columns
+# are filled from the reference tables built by Combiner.build_tables(). Rows the row-wise
+# engine drops because RowPlan.render() raises (header line, unparseable TIME, item rows
+# without a name or department code) are dropped here as well. Lines with a quote character
+# are split like the row engine splits them (rowplan.split_row, the csv reader), so a quoted
+# comma stays in its field and is csv-quoted again on the way out. Text containing NUL must
+# not come here: the C reader ends a field at NUL and pandas' string hashing truncates at it.
+
+# rd5000 columns kept, in output order (see stringifyAppend)
+SOURCE_COLUMNS = [0, 2, 4, 5, 6, 7, 8, 11, 12, 13, 18, 21, 31, 32, 34, 35, 36, 37]
+# aaa_headers.csv
+HEADERS = ["POS", "OR", "ITEM CODE", "QUANTITY", "UNIT PRICE", "AMOUNT", "DISCOUNT", "DEPARTMENT CODE",
+           "DATE", "TIME", "DISCOUNT CODE", "TYPE CODE", "VAT FLAG", "VAT DIV", "VAT AMOUNT", "VAT DISCOUNT",
+           "VAT PRICE", "TRANSACTION NUMBER", "PRODUCT NAME", "DEPARTMENT NAME", "DISCOUNT NAME",
+           "TRANSACTION TYPE", "DAYPART", "PAYMENT CODE", "PAYMENT NAME", "PHONE NUMBER", "BRANCH"]
+
+DROP = None  # marks a value stringifyAppend() would raise on
+SHORT_COMMAS = 37  # fewer commas: a short row (quality.RD5000_FIELDS fields in a full one)
+
+
+def excel_quote(value):
+    # stringifyAppend's rule for columns other than 11, 12 and 37: values with a leading
+    # zero are wrapped as ="..." unless they look like 0.xx, a time or a date
+    a = False
+    if len(value) >= 2:
+        if value[0] == '0':
+            a = True
+        if value[1] == '.':
+            a = False
+    if len(value) > 2 and value[2] == ':':
+        a = False
+    if len(value) > 4 and value[4] == '-':
+        a = False
+    return '"=""' + value + '"""' if a else value
+
+
+def distinct(values):
+    # (codes, distinct values) of a column; per-value results are spread back with apply()
+    return pd.factorize(values)
+
+
+def apply(groups, fn):
+    codes, values = groups
+    mapped = np.empty(len(values), dtype=object)
+    mapped[:] = [fn(value) for value in values]
+    return mapped[codes]
+
+
+def by_value(values, fn):
+    # fn evaluated once per distinct value of the column
+    return apply(distinct(values), fn)
+
+
+def join(values, table):
+    # (table[value] for every value, "" where it has none; whether it has one): a hash join
+    # of the column with the table inside pandas, for keys with about one row each
+    # (transaction numbers), where calling a function per distinct value saves nothing
+    joined = pd.Series(values, dtype=object).map(table)
+    found = joined.notna().to_numpy()
+    return np.where(found, joined.to_numpy(dtype=object), ""), found
+
+
+def read_rd5000(lines):
+    # ({column: values} for the kept columns, commas per line, rows of lines with a quote).
+    # Every line is split on "," exactly like str.split (no quote handling) and short rows
+    # are padded with ""; the few lines with a quote are then split again by split_row() and
+    # their fields put in place. The C reader insists on seeing as many fields as there are
+    # names, so an empty full-width line goes first and is dropped again.
+    commas = np.fromiter((line.count(",") for line in lines), dtype=np.int64, count=len(lines))
+    columns = max(38, int(commas.max()) + 1)
+    text = "," * (columns - 1) + "\n" + "\n".join(lines) + "\n"
+    frame = pd.read_csv(io.StringIO(text), header=None, names=range(columns), usecols=SOURCE_COLUMNS, dtype=object,
+                        na_filter=False, quoting=csv.QUOTE_NONE, skip_blank_lines=False, low_memory=False)
+    values = {column: frame[column].to_numpy()[1:] for column in SOURCE_COLUMNS}
+    quoted = [row for row, line in enumerate(lines) if '"' in line]
+    if quoted:
+        values = {column: column_values.copy() for column, column_values in values.items()}
+        for row in quoted:
+            fields = split_row(lines[row])
+            commas[row] = len(fields) - 1
+            for column in SOURCE_COLUMNS:
+                values[column][row] = fields[column] if column < len(fields) else ""
+    return values, commas, quoted
+
+
+def requote(value):
+    # RowPlan.render's rule: only a csv-quoted source field can hold a comma; keep it one column
+    if "," in value and not value.startswith('"'):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+def tally(quality, lines, commas, drop, keep, misses):
+    # counters of one batch, with the first quality.samples lines of every kind
+    short = np.flatnonzero(commas < SHORT_COMMAS)
+    quality.short_rows["rd5000"] += len(short)
+    for row in short[:quality.samples]:
+        quality.sample("short_rd5000", lines[row])
+    dropped = np.flatnonzero(drop)
+    quality.rows_dropped += len(dropped)
+    for row in dropped[:quality.samples]:
+        quality.sample("dropped", "not rendered: " + lines[row])
+    for name, missed in misses.items():
+        rows = np.flatnonzero(missed.astype(bool) & keep)
+        quality.lookup_misses[name] += len(rows)
+        for row in rows[:quality.samples]:
+            quality.sample("miss_" + name, lines[row])
+
+
+def transform(lines, tables, pos, branch, date, new_branch, type_dict, time_dict, quality=None):
+    # lines: rd5000 lines in output order; returns (record lines, rows dated outside `date`).
+    # quality: a quality.UnitQuality that gets the short rows, dropped rows and lookup
+    # misses counted as Combiner.append_rows() counts them
+    if not lines:
+        return [], 0
+    frame, commas, quoted = read_rd5000(lines)
+    item, disc, dept = tables["item"], tables["disc"], tables["dept"]
+    tnsc, paym, blpr = tables["tnsc"], tables["paym"], tables["blpr"]
+
+    out = {}
+    for name, column in zip(HEADERS, SOURCE_COLUMNS):
+        values = frame[column]
+        if column == 0:
+            continue
+        elif column == 12:
+            out[name] = by_value(values, lambda value: value.split(" ")[0])
+        elif column == 11:
+            # always quoted when the field exists, even if it is empty
+            out[name] = by_value(values, lambda value: '"=""' + value + '"""')
+            for row in np.flatnonzero((values == "") & (commas < 11)):
+                out[name][row] = ""
+        elif column == 37:
+            out[name] = values
+        else:
+            out[name] = by_value(values, excel_quote)
+
+    # item rows with a single column store "" instead of a dict, and rows of new branches
+    # need a department code; stringifyAppend raises on both
+    def broken(code):
+        entry = item[code]
+        return not isinstance(entry, dict) or (new_branch and "department_code" not in entry)
+
+    items = distinct(out["ITEM CODE"])
+    drop = apply(items, lambda code: code in item and broken(code)).astype(bool)
+    out["PRODUCT NAME"] = apply(items, lambda code: '"' + item[code]["item_name"] + '"' if code in item and not broken(code) else "")
+    if new_branch:
+        codes = apply(items, lambda code: '"' + item[code]["department_code"] + '"' if code in item and not broken(code) else None)
+        out["DEPARTMENT CODE"] = np.where(codes == None, out["DEPARTMENT CODE"], codes)
+
+    def department_code(raw):
+        return raw.strip().replace('="', '').replace('"', '').strip()
+
+    def department(raw):
+        code = department_code(raw)
+        return '"%s"' % dept[code] if code and code in dept else ""
+
+    def department_missed(raw):
+        code = department_code(raw)
+        return code != "" and code not in dept
+
+    def daypart(value):
+        if not value[0:1]:
+            return "No Time Record"
+        try:
+            return time_dict[int(value[0:2])]
+        except (ValueError, IndexError):
+            return DROP
+
+    out["DEPARTMENT NAME"] = by_value(out["DEPARTMENT CODE"], department)
+    out["DISCOUNT NAME"] = by_value(out["DISCOUNT CODE"], lambda value: '"' + disc[value] + '"' if value in disc else "")
+    out["TRANSACTION TYPE"] = by_value(out["TYPE CODE"], lambda value: '"' + type_dict[value] + '"' if value in type_dict else "")
+    out["DAYPART"] = by_value(out["TIME"], daypart)
+    drop |= out["DAYPART"] == None
+    # transaction number -> pay code -> payment name, and -> phone number; all empty for a
+    # row without a transaction number
+    given = out["TRANSACTION NUMBER"] != ""
+    paycode, paid = join(out["TRANSACTION NUMBER"], tnsc)
+    payname, named = join(paycode, paym)
+    phone, listed = join(out["TRANSACTION NUMBER"], blpr)
+    paid = paid & given
+    out["PAYMENT CODE"] = np.where(given, paycode, "")
+    out["PAYMENT NAME"] = np.where(paid, payname, "")
+    out["PHONE NUMBER"] = np.where(given, phone, "")
+
+    for row in quoted:
+        for name in HEADERS[1:18]:
+            out[name][row] = requote(out[name][row])
+
+    mismatched = by_value(out["DATE"], lambda value: value.strip() != date).astype(bool)
+    keep = ~drop & ~mismatched
+    if quality is not None:
+        misses = {
+            "item": apply(items, lambda code: code != "" and code not in item),
+            "dept": by_value(out["DEPARTMENT CODE"], department_missed),
+            "disc": by_value(out["DISCOUNT CODE"], lambda value: value != "" and value not in disc),
+            "tnsc": given & ~paid,
+            "paym": paid & (paycode != "") & ~named,
+            "blpr": given & ~listed,
+        }
+        tally(quality, lines, commas, drop, keep, misses)
+    columns = [[str(pos)] * int(keep.sum())]
+    columns += [out[name][keep].tolist() for name in HEADERS[1:-1]]
+    columns.append([str(branch)] * len(columns[0]))
+    return list(map(",".join, zip(*columns))), int((~drop & mismatched).sum())
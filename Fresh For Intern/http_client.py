@@ -0,0 +1,39 @@
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+# Shared HTTP plumbing for the fetcher and the RQ worker.
+# One pooled keep-alive session is reused for every listing/download call, so a run
+# pays for the TCP+TLS handshake once per pooled connection instead of once per call.
+
+BASE_URL = os.getenv("BIGGS_BASE_URL", "https://biggsph.com/biggsinc_loyalty/controller/")
+POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+# (connect, read) timeouts in seconds
+TIMEOUT = (float(os.getenv("HTTP_CONNECT_TIMEOUT", "10")), float(os.getenv("HTTP_READ_TIMEOUT", "60")))
+
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.12; rv:55.0) Gecko/20100101 Firefox/55.0'
+
+_shared = None
+_lock = threading.Lock()
+
+
+def new_session(pool_size=POOL_SIZE):
+    # urllib3 connection pools are thread-safe; pool_maxsize should be >= the number of
+    # threads using the session, otherwise extra connections are opened and discarded.
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({'User-Agent': USER_AGENT, 'Connection': 'keep-alive'})
+    return session
+
+
+def get_session():
+    # process-wide session, created on first use
+    global _shared
+    if _shared is None:
+        with _lock:
+            if _shared is None:
+                _shared = new_session()
+    return _shared
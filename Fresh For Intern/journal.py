@@ -0,0 +1,99 @@
+import os
+import time
+import datetime
+import threading
+from listing import SETTLE_DAYS, settled
+
+# Durable checkpoint journal for the fetch/combine pipeline.
+# Every (branch, pos, date) unit moves through listed -> downloaded -> combined, and each
+# transition is appended as one tab-separated line:
+#   branch  pos  date  stage  rows  hash  unix-time
+# rows is the number of files for listed/downloaded and the number of output rows for
+# combined; hash identifies the downloaded raw files (see Receive.mark_downloaded).
+# A unit with nothing in it - an empty listing (a closed branch, a day without sales) or
+# exports that combine to no rows - ends in "empty" instead of "combined". "combined" is
+# final. "empty" is final only if it was written settle_days (LISTING_SETTLE_DAYS, the
+# listing cache's window) or more after its date; until then the POS may still upload, so
+# the unit is fetched again on the next run, as its listing is. JOURNAL_RETRY_EMPTY=1 (or
+# retry_empty=True) retries empty units whatever their age.
+# Lines are flushed and fsynced as they are written, so after a crash the journal says
+# exactly which units still need work. Loading keeps only the latest line per unit; when
+# the file has grown well past the number of units it is compacted on open.
+
+STAGES = ["listed", "downloaded", "combined", "empty"]
+RETRY_EMPTY = os.getenv("JOURNAL_RETRY_EMPTY", "0") == "1"
+
+
+class Journal:
+
+    def __init__(self, path, settle_days=SETTLE_DAYS, retry_empty=RETRY_EMPTY):
+        self.path = path
+        self.settle_days = settle_days
+        self.retry_empty = retry_empty
+        self.state = {}  # (branch, pos, date) -> (stage, rows, hash, unix-time)
+        self.lock = threading.Lock()
+        lines = 0
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for row in f:
+                    parts = row.rstrip("\n").split("\t")
+                    if len(parts) < 6 or parts[3] not in STAGES:
+                        continue  # torn last line from a crash
+                    stage, rows = parts[3], int(parts[4] or 0)
+                    if stage == "combined" and rows == 0:
+                        stage = "empty"  # written before the empty stage existed
+                    marked = int(parts[6]) if len(parts) > 6 and parts[6].isdigit() else 0
+                    self.state[(parts[0], parts[1], parts[2])] = (stage, rows, parts[5], marked)
+                    lines += 1
+        if lines > 4 * len(self.state) + 1000:
+            self.compact()
+        self.f = open(path, "a", encoding="utf-8")
+
+    @staticmethod
+    def key(branch, pos, date):
+        return (str(branch), str(pos), str(date)[:10])
+
+    def stage(self, branch, pos, date):
+        entry = self.state.get(self.key(branch, pos, date))
+        return entry[0] if entry else ""
+
+    def done(self, branch, pos, date, stage="combined"):
+        current = self.stage(branch, pos, date)
+        return current != "" and STAGES.index(current) >= STAGES.index(stage)
+
+    def complete(self, branch, pos, date):
+        # combined, or empty and written after the settle window (see above)
+        key = self.key(branch, pos, date)
+        entry = self.state.get(key)
+        if entry is None or entry[0] not in ("combined", "empty"):
+            return False
+        if entry[0] == "combined":
+            return True
+        return not self.retry_empty and settled(key[2], datetime.date.fromtimestamp(entry[3]).isoformat(), self.settle_days)
+
+    def mark(self, branch, pos, date, stage, rows=0, digest=""):
+        key = self.key(branch, pos, date)
+        with self.lock:
+            self.state[key] = (stage, rows, digest, int(time.time()))
+            self.f.write("%s\t%s\t%s\t%s\t%d\t%s\t%d\n" % (key + self.state[key]))
+            self.f.flush()
+            os.fsync(self.f.fileno())
+
+    def mark_combined(self, branch, pos, date, rows):
+        self.mark(branch, pos, date, "combined" if rows else "empty", rows)
+
+    def compact(self):
+        # rewrite the journal with one line per unit, keeping the time it was written
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for key, entry in sorted(self.state.items()):
+                f.write("%s\t%s\t%s\t%s\t%d\t%s\t%d\n" % (key + entry))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        if getattr(self, "f", None) is not None:
+            self.f.close()
+            self.f = open(self.path, "a", encoding="utf-8")
+
+    def close(self):
+        self.f.close()
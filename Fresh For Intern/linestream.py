@@ -0,0 +1,90 @@
+import os
+import hashlib
+
+# Constant-memory line readers for the exports in latest/. Combiner used to read every
+# file into one string (preProc) and split it, so a unit took several times its file size
+# in memory; these read fixed-size chunks instead. Both give exactly the lines of
+#   open(path, encoding="utf-8").read().splitlines()
+# lines() front to back (reference files, whose tables keep the first row per key) and
+# reversed_lines() back to front (rd5000, which the record lists bottom-up), so output is
+# unchanged. A missing file has no lines, as with preProc.
+#
+# Chunks are cut at their first or last b"\n", which never occurs inside a UTF-8
+# sequence, and the lines in between are decoded in one go; str.splitlines() then splits
+# them wherever it would have split the whole text (\r, \r\n, \x0c, \u2028, ...).
+
+CHUNK_SIZE = int(os.getenv("COMBINE_CHUNK_SIZE", str(1 << 20)))
+
+
+def split_piece(piece, terminated):
+    # lines of a run of b"\n"-separated lines; a terminated run is followed by one more
+    text = piece.decode("utf-8")
+    return (text + "\n").splitlines() if terminated else text.splitlines()
+
+
+def lines(path, chunk_size=CHUNK_SIZE):
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return
+    with f:
+        head = b""
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            block = head + chunk
+            cut = block.rfind(b"\n")
+            if cut < 0:
+                head = block
+                continue
+            head = block[cut + 1:]
+            yield from split_piece(block[:cut], True)
+        yield from split_piece(head, False)
+
+
+def reversed_lines(path, chunk_size=CHUNK_SIZE):
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return
+    with f:
+        end = f.seek(0, os.SEEK_END)
+        tail = b""
+        terminated = False  # only the piece after the last b"\n" has no line break
+        while end > 0:
+            start = max(0, end - chunk_size)
+            f.seek(start)
+            block = f.read(end - start) + tail
+            end = start
+            cut = block.find(b"\n")
+            if cut < 0:
+                tail = block
+                continue
+            tail = block[:cut]  # may continue in the chunk before
+            yield from reversed(split_piece(block[cut + 1:], terminated))
+            terminated = True
+        yield from reversed(split_piece(tail, terminated))
+
+
+def text_lines(data):
+    # the lines of a file held in memory (bytes), as lines() gives them for the file
+    return split_piece(data, False)
+
+
+def first_line(path):
+    for line in lines(path):
+        return line
+    return None
+
+
+def digest(path, chunk_size=CHUNK_SIZE):
+    # sha256 of the file's bytes ("" content if missing)
+    sha = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                sha.update(chunk)
+    except FileNotFoundError:
+        pass
+    return sha.hexdigest()
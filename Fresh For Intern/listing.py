@@ -0,0 +1,102 @@
+import os
+import json
+import datetime
+import threading
+from collections import namedtuple
+
+# Typed view of the fetch_list2.php listing.
+# Remote files are named a_<BRANCH>_<POS>_<filetype>_<YYYY-MM-DD>_<HH-MM>_.csv, where the
+# trailing HH-MM is the time the POS exported that snapshot. The same branch/pos/type/date
+# is often listed several times (e.g. _19-59_ and _20-00_); the newest one is authoritative.
+
+ListingEntry = namedtuple("ListingEntry", ["branch", "pos", "filetype", "date", "time", "path"])
+
+# days after which a date's listing is considered final and served from the cache
+SETTLE_DAYS = int(os.getenv("LISTING_SETTLE_DAYS", "3"))
+
+
+def settled(date, seen_on, settle_days=SETTLE_DAYS):
+    # whether what was seen of `date` on `seen_on` (both YYYY-MM-DD) is final: seen at least
+    # settle_days after the date, when the POS can no longer upload to that day
+    try:
+        day = datetime.date.fromisoformat(date)
+        seen = datetime.date.fromisoformat(seen_on)
+    except ValueError:
+        return False
+    return (seen - day).days >= settle_days
+
+
+def parse_listing_name(path):
+    # returns a ListingEntry, or None for names that don't follow the export convention
+    path = path.strip()
+    name = os.path.basename(path).rsplit(".", 1)[0]
+    parts = name.split("_")
+    if len(parts) < 5:
+        return None
+    time = parts[5] if len(parts) > 5 else ""
+    return ListingEntry(parts[1], parts[2], parts[3], parts[4], time, path)
+
+
+def parse_listing(filearray):
+    entries = []
+    for file in filearray or []:
+        entry = parse_listing_name(file)
+        if entry is not None:
+            entries.append(entry)
+    return entries
+
+
+def newest_snapshots(entries):
+    # keep one entry per (branch, pos, filetype, date): the latest snapshot time
+    newest = {}
+    for entry in entries:
+        key = entry[:4]
+        if key not in newest or entry.time > newest[key].time:
+            newest[key] = entry
+    return list(newest.values())
+
+
+class ListingCache:
+    # On-disk cache of fetch_list2.php responses, one JSON file per (branch, pos, date) under
+    # <directory>/<date>/. An entry is only served once it was fetched at least `settle_days`
+    # after its date, i.e. after the POS can no longer upload to that day; listings of recent
+    # dates are always refreshed. The "no data" response ([""]) is cached the same way.
+
+    def __init__(self, directory, settle_days=SETTLE_DAYS):
+        self.directory = directory
+        self.settle_days = settle_days
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def path(self, branch, pos, date):
+        return os.path.join(self.directory, date, "%s_%s.json" % (branch, pos))
+
+    def settled(self, date, fetched_on):
+        return settled(date, fetched_on, self.settle_days)
+
+    def get(self, branch, pos, date):
+        # returns the cached file list, or None when the listing must be requested
+        entry = None
+        try:
+            with open(self.path(branch, pos, date), "r") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            pass
+        found = entry is not None and self.settled(date, entry.get("fetchedOn", ""))
+        with self.lock:
+            if found:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return entry["files"] if found else None
+
+    def put(self, branch, pos, date, files):
+        path = self.path(branch, pos, date)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {"files": files, "empty": files == [""], "fetchedOn": datetime.date.today().isoformat()}
+        # write-then-rename so a crash never leaves a truncated entry behind
+        tmp = path + ".%d.tmp" % threading.get_ident()
+        with open(tmp, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp, path)
@@ -29,8 +29,24 @@ prev = '2025-12-31'
 # prev = '2026-2-1'
 print(prev)
 
+# last_record.log only moves past fully combined dates; inside the first unfinished date the
+# checkpoint journal (journal.log) skips the (branch, pos) units that were already combined
 rep = Receive(last,prev)
-rep.fetch()
+# FETCH_CONCURRENCY > 1 switches to the concurrent fetcher, FETCH_PIPELINE=1 also
+# overlaps combining date N with downloading date N+1; FETCH_STREAM=1 parses exports while
+# they download (FETCH_STREAM_TEE=1 keeps the raw files too); FETCH_INCREMENTAL=1 combines
+# each unit as soon as it is downloaded
+concurrency = int(os.getenv("FETCH_CONCURRENCY", "1"))
+if os.getenv("FETCH_STREAM") == "1":
+	rep.fetch_stream(os.getenv("FETCH_STREAM_TEE") == "1")
+elif os.getenv("FETCH_INCREMENTAL") == "1":
+	rep.fetch_incremental(concurrency)
+elif os.getenv("FETCH_PIPELINE") == "1":
+	rep.fetch_pipelined(concurrency)
+elif concurrency > 1:
+	rep.fetch_async(concurrency)
+else:
+	rep.fetch()
 # exit()
 f3 = open(parentDir + "/last_record.log","w")
 f3.write(datetime.datetime.now().strftime('%Y-%m-%d'))
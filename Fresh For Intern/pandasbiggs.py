@@ -17,6 +17,7 @@ from bokeh.resources import CDN
 from bokeh.embed import file_html
 import csv
 import calendar
+import os
 
 class Deredundancer:
 
@@ -117,6 +118,18 @@ class Deredundancer:
 
 
 
+# pandas' default na_values: read_csv reads these strings as NaN
+NA_STRINGS = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']
+
+# the amount columns (turn_decimal): Decimal pesos by default. Fixed point is opt-in
+# (CSV_FIXED_POINT=1, or CSVProcessor(file, fixed=True)) because it changes their unit: they are
+# then int64 counts of 1/SCALE of a peso - the precision of the columnar record's decimal128(18, 6),
+# so every amount the POS exports (3 to 4 decimals) is exact and sums stay exact - and pivots sum
+# them in NumPy; a caller reading self.df / getdata() / filter() divides by SCALE for pesos
+MONEY = ['UNIT PRICE', 'AMOUNT', 'DISCOUNT', 'VAT DIV', 'VAT AMOUNT', 'VAT PRICE']
+SCALE = 10 ** 6
+FIXED_POINT = os.getenv("CSV_FIXED_POINT", "0") == "1"
+
 class CSVProcessor:
 
 	def convert_dtype(self, x):
@@ -134,6 +147,36 @@ class CSVProcessor:
 		except:
 			return Decimal(0.0)
 
+	def turn_fixed(self, x):
+		# ? turn_decimal in units of 1/SCALE (a NaN or infinite Decimal is 0)
+		value = self.turn_decimal(x)
+		if not value.is_finite():
+			return 0
+		return int((value * SCALE).to_integral_value(rounding=decimal.ROUND_HALF_EVEN))
+
+	def each_value(self, values, fix, dtype=object):
+		# ? fix() once per distinct value of a column instead of once per row
+		codes, uniques = pd.factorize(values, use_na_sentinel=False)
+		return np.array([fix(value) for value in uniques], dtype=dtype)[codes]
+
+	def each_date(self, fix):
+		# ? fix() on the distinct dates (a year of rows has a few hundred), spread back over the rows
+		codes, uniques = pd.factorize(self.df['DATE'], use_na_sentinel=False)
+		return fix(pd.Series(uniques)).take(codes).set_axis(self.df.index)
+
+	def summed(self, legacy):
+		# ? aggfunc for the pivot sums: pandas' own (NumPy) for a fixed-point frame, legacy (a Python
+		# ? sum per group, over Decimals for the amounts) otherwise
+		return 'sum' if self.fixed else legacy
+
+	def truncate(self, values, places, legacy):
+		# ? amounts cut toward zero to `places` decimals (an int for none): on the whole column in
+		# ? integers for fixed-point amounts, legacy() on every Decimal otherwise
+		if not self.fixed:
+			return values.apply(legacy)
+		cut = np.sign(values) * (np.abs(values) // (SCALE // 10 ** places))
+		return cut if places == 0 else cut / 10 ** places
+
 	def time_set(self,value):
 		if ":" in str(value)[:2]:
 			return "0" + str(value)
@@ -176,7 +219,9 @@ class CSVProcessor:
 			return '25'
 
 
-	def __init__(self, file):
+	def __init__(self, file, fixed=FIXED_POINT):
+
+		self.fixed = fixed
 
 		self.converter = Deredundancer("conversion","conversion_dept","conversion_combined","conversion_category","conversion_branch")
 
@@ -202,19 +247,19 @@ class CSVProcessor:
 			'BRANCH':'str'
 		}
 
-		self.df = pd.read_csv(file,sep=",",header=0,dtype=self.columns,converters={'QUANTITY':self.convert_dtype,'UNIT PRICE': self.turn_decimal,'AMOUNT': self.turn_decimal,'DISCOUNT': self.turn_decimal,'VAT DIV': self.turn_decimal,'VAT AMOUNT': self.turn_decimal,'VAT_DISCOUNT': self.turn_decimal,'VAT PRICE': self.turn_decimal,'TIME': self.time_set},parse_dates=['DATE'], index_col=False)
+		self.df = self.read_record(file)
 
-		self.df['PRODUCT NAME CLEAN'] = self.df['PRODUCT NAME'].apply(lambda x: self.converter.convert(str(x).upper()))
+		self.df['PRODUCT NAME CLEAN'] = self.each_value(self.df['PRODUCT NAME'], lambda x: self.converter.convert(str(x).upper()))
 
-		self.df['DEPARTMENT NAME CLEAN'] = self.df['DEPARTMENT NAME'].apply(lambda x: self.converter.convert_dept(str(x).upper()))
+		self.df['DEPARTMENT NAME CLEAN'] = self.each_value(self.df['DEPARTMENT NAME'], lambda x: self.converter.convert_dept(str(x).upper()))
 
-		self.df['PRODUCT NAME COMBINED'] = self.df['PRODUCT NAME CLEAN'].apply(lambda x: self.converter.convert_comb(str(x).upper()))
+		self.df['PRODUCT NAME COMBINED'] = self.each_value(self.df['PRODUCT NAME CLEAN'], lambda x: self.converter.convert_comb(str(x).upper()))
 
-		self.df['CATEGORY'] = self.df['PRODUCT NAME CLEAN'].apply(lambda x: self.converter.convert_cate(str(x).upper()))
+		self.df['CATEGORY'] = self.each_value(self.df['PRODUCT NAME CLEAN'], lambda x: self.converter.convert_cate(str(x).upper()))
 
-		self.df['BRANCH CLEAN'] = self.df['BRANCH'].apply(lambda x: self.converter.convert_bran(str(x).upper()))
+		self.df['BRANCH CLEAN'] = self.each_value(self.df['BRANCH'], lambda x: self.converter.convert_bran(str(x).upper()))
 
-		self.df['POS'] = self.df['POS'].apply(lambda x: self.converter.convert_pos(str(x)))
+		self.df['POS'] = self.each_value(self.df['POS'], lambda x: self.converter.convert_pos(str(x)))
 
 		#self.df = self.df.apply(lambda row : self.pandafy(row), axis = 1)
 
@@ -226,31 +271,123 @@ class CSVProcessor:
 		self.df['DATE'] = pd.to_datetime(self.df['DATE'],errors='coerce')
 		# print("Parsed DATE column values:")
 		# print(self.df['DATE'].head(10))
-		self.df['DATE_STR'] = self.df['DATE'].dt.strftime('%Y-%m-%d')
-		self.df['WEEK'] = self.df['DATE'].dt.strftime('%U')
+		self.df['DATE_STR'] = self.each_date(lambda dates: dates.dt.strftime('%Y-%m-%d'))
+		self.df['WEEK'] = self.each_date(lambda dates: dates.dt.strftime('%U'))
 		self.df['WEEKDAY'] = self.df['DATE'].dt.day_name()
-		self.df['TIME'].apply(lambda x: '00:00' if x == '' else x)
 		self.df['HOUR'] = self.df['TIME']
-		self.df['HOUR']= self.df['HOUR'].apply(lambda x: self.troubleshoot(x))
+		self.df['HOUR']= self.each_value(self.df['HOUR'], lambda x: self.troubleshoot(x))
 		self.df['MONTH'] = pd.DatetimeIndex(self.df['DATE']).month
 		self.df['YEAR'] = pd.DatetimeIndex(self.df['DATE']).year
 		self.df['DAY'] = pd.DatetimeIndex(self.df['DATE']).day
 		self.df['GID'] = self.df['OR']+self.df['BRANCH']+self.df['TIME'] #ID for the Unique Transaction
 		self.df['GUID'] = self.df['OR']+self.df['BRANCH']+self.df['POS']
 		self.df['RGID'] = self.df['GID'] + self.df['ITEM CODE'] + self.df['DISCOUNT CODE']
-		self.df['DATE STRING'] = self.df['DATE'].astype(str)
+		self.df['DATE STRING'] = self.each_date(lambda dates: dates.astype(str))
 		print(self.df['TRANSACTION TYPE'])
 		#self.df['TYPE CLEAN'] = self.df['TRANSACTION TYPE'].apply(lambda x: self.converter.typecast(str(x).upper()))
 		#self.df['TYPE CLEAN'] = self.df.apply(lambda x: self.converter.typeconvert(x))
 		#self.df['TYPE CLEAN'].mask(self.df['DEPARTMENT NAME CLEAN'] == 'FOOD PANDA', "DELIVERY", inplace=True)
 		self.df.loc[self.df['DEPARTMENT NAME CLEAN'] == "FOOD PANDA", 'TRANSACTION TYPE'] = "Food Panda"
-		self.df['WEEK OF MONTH'] = self.df['DATE'].apply(lambda x: (x.day-1) // 7 + 1)
-		self.df['WEEK OF MONTH'] = self.df['WEEK OF MONTH'].apply(lambda x: x if x < 5 else 4)
+		# ? weeks past the 4th count as the 4th, and so does a date that did not parse (which makes
+		# ? the column float, as it was with a lambda per row)
+		week = (self.df['DATE'].dt.day - 1) // 7 + 1
+		self.df['WEEK OF MONTH'] = week.where(week < 5, 4).astype(np.float64 if self.df['DATE'].isna().any() else np.int64)
 		#self.df['WEEKPART'] = self.df['WEEKDAY'].apply(lambda x: self.weekpartly(x), axis=1)
 		#self.df['QUARTER'] = self.df['QUARTER'].apply(lambda x: self.quarterly(x), axis=1)
 		#self.df['SEMI'] = self.df['SEMI'].apply(lambda x: self.semiannually(x), axis=1)
 
 
+	def read_record(self, file):
+		# ? a columnar record (a directory written with RECORD_COLUMNAR, or one .arrow
+		# ? date file) is already typed; anything else is the CSV record
+		if os.path.isdir(str(file)) and os.path.exists(os.path.join(str(file), "manifest.csv")):
+			# ? a sharded record (RECORD_SHARD_ROWS, see shardwriter.py): its shards one after another
+			from shardwriter import shards
+			return pd.concat([self.read_record(shard) for shard in shards(str(file))], ignore_index=True)
+		if os.path.isdir(str(file)) or str(file).endswith(".arrow"):
+			return self.read_columnar(file)
+		if self.fixed:
+			return self.read_fixed(file)
+		return pd.read_csv(file,sep=",",header=0,dtype=self.columns,converters={'QUANTITY':self.convert_dtype,'UNIT PRICE': self.turn_decimal,'AMOUNT': self.turn_decimal,'DISCOUNT': self.turn_decimal,'VAT DIV': self.turn_decimal,'VAT AMOUNT': self.turn_decimal,'VAT_DISCOUNT': self.turn_decimal,'VAT PRICE': self.turn_decimal,'TIME': self.time_set},parse_dates=['DATE'], index_col=False)
+
+	# ? the frame read_csv above produces with fixed-point amounts, without per-cell converters: the
+	# ? converted columns are read as text (the converters see the raw text, NA strings included)
+	# ? and each converter runs once per distinct value; QUANTITY stays int64 and TIME text
+	def read_fixed(self, file):
+		converted = ['QUANTITY', 'TIME'] + MONEY
+		with open(file, 'r', encoding='utf-8', newline='') as f:
+			header = next(csv.reader(f), [])
+		df = pd.read_csv(file,sep=",",header=0,dtype=dict(self.columns, **{name: 'str' for name in converted}),keep_default_na=False,na_values={name: NA_STRINGS for name in header if name not in converted},parse_dates=['DATE'], index_col=False)
+		df['QUANTITY'] = self.each_value(df['QUANTITY'], self.convert_dtype, np.int64)
+		df['TIME'] = self.each_value(df['TIME'], self.time_set)
+		for name in MONEY:
+			df[name] = self.each_value(df[name], self.turn_fixed, np.int64)
+		return df
+
+	# ? the frame read_csv above produces, built from the columnar types (see columnar.py) with
+	# ? whole-column Arrow operations; string fixes and an amount's Decimal are worked out once
+	# ? per distinct value (the column's dictionary) instead of once per cell
+	def read_columnar(self, file):
+		from columnar import pa, pc, read_table
+		table = read_table(str(file))
+		null = pa.scalar(None, pa.string())
+		na = pa.array(NA_STRINGS)
+
+		def each(values, fix):
+			# ? fix() on the column, or only on its distinct values if it is dictionary-encoded
+			values = values.combine_chunks()
+			if pa.types.is_dictionary(values.type):
+				return pc.take(fix(values.dictionary), values.indices)
+			return fix(values)
+
+		columns = {}
+		decimals = {}
+		for name in table.column_names:
+			values = table.column(name)
+			if name in self.columns:
+				# ? read_csv turns these strings into NaN in the str columns
+				values = each(values, lambda v: pc.if_else(pc.is_in(v, value_set=na), null, v))
+			elif name == 'TIME':
+				# ? time_set: a one-digit hour gets its leading zero
+				values = each(values, lambda v: pc.if_else(pc.match_substring(pc.utf8_slice_codeunits(v, 0, 2), ":"), pc.binary_join_element_wise("0", v, ""), v))
+			elif name in MONEY:
+				# ? turn_decimal: Decimal, 0 where the value was not a number (turn_fixed for fixed point)
+				values = values.combine_chunks()
+				if not pa.types.is_dictionary(values.type):
+					values = pc.dictionary_encode(values)
+				if self.fixed:
+					lookup = np.array([self.turn_fixed(value) for value in values.dictionary.to_pylist()] + [0], dtype=np.int64)
+				else:
+					lookup = np.array(values.dictionary.to_pylist() + [Decimal(0)], dtype=object)
+				decimals[name] = lookup[values.indices.fill_null(len(lookup) - 1).to_numpy()]
+				values = pa.nulls(len(values), pa.int8())
+			elif name in ['QUANTITY', 'VAT DISCOUNT']:
+				# ? no converter applies to VAT DISCOUNT (it is keyed 'VAT_DISCOUNT'), so read_csv makes it float
+				# ? through the decimal's text, so the float is the one read_csv parses (a direct
+				# ? decimal -> float cast can be off in the last digit)
+				values = each(values, lambda v: pc.cast(pc.cast(v, pa.string()), pa.float64()))
+			elif name == 'DATE':
+				# ? in the unit read_csv's date parsing gives (us from pandas 3 on, ns before)
+				unit = np.datetime_data(pd.to_datetime(pd.Series(['2025-01-01'])).dtype)[0]
+				values = pc.cast(values, pa.timestamp(unit))
+			columns[name] = values
+		df = pa.table(columns).to_pandas()
+		for name, values in decimals.items():
+			df[name] = values
+		# ? 'str' is pandas' string dtype from pandas 3 on, plain object before
+		text = pd.api.types.pandas_dtype('str')
+		if not isinstance(text, pd.StringDtype):
+			for name in list(self.columns) + ['TIME']:
+				df[name] = df[name].where(df[name].notna(), np.nan)
+		# ? convert_dtype: fractions below 1 are scaled up by 10 until they are not, then truncated
+		quantity = df['QUANTITY'].fillna(0).to_numpy()
+		fraction = (quantity < 1.00) & (quantity > 0.00)
+		while fraction.any():
+			quantity = np.where(fraction, quantity * 10.0, quantity)
+			fraction = (quantity < 1.00) & (quantity > 0.00)
+		df['QUANTITY'] = quantity.astype(np.int64)
+		return df
+
 	def getdata(self):
 		return self.df
 
@@ -369,11 +506,11 @@ class CSVProcessor:
 			index_unit = 'PRODUCT NAME CLEAN'
 		elif (index == 'Hour'):
 			index_unit = 'HOUR'
-		result = source.pivot_table(index = [index_unit],values = [value_unit],aggfunc=lambda x: sum(x),fill_value=0, dropna=False)
+		result = source.pivot_table(index = [index_unit],values = [value_unit],aggfunc=self.summed(lambda x: sum(x)),fill_value=0, dropna=False)
 
 
 		if (value_unit == 'AMOUNT'):
-			result['AMOUNT'] = result['AMOUNT'].apply(lambda x: int(int(x* 100)/100))
+			result['AMOUNT'] = self.truncate(result['AMOUNT'], 0, lambda x: int(int(x* 100)/100))
 		result = result.reset_index()
 		result['HOUR'] = result['HOUR'].astype(int)
 
@@ -462,12 +599,12 @@ class CSVProcessor:
 
 		index_unit = 'DATE'
 
-		result = source.pivot_table(index = [index_unit],values = [value_unit],aggfunc=lambda x: sum(x),fill_value=0, dropna=False)
+		result = source.pivot_table(index = [index_unit],values = [value_unit],aggfunc=self.summed(lambda x: sum(x)),fill_value=0, dropna=False)
 
 		hovertool_line = HoverTool(tooltips=[("Date","@DATE{%F}"),("Value"," @"+value_unit+"{0,0 a}")],formatters={'@DATE': 'datetime'})
 
 		if (value_unit == 'AMOUNT'):
-			result['AMOUNT'] = result['AMOUNT'].apply(lambda x: (int(x* 10))/10)
+			result['AMOUNT'] = self.truncate(result['AMOUNT'], 1, lambda x: (int(x* 10))/10)
 		result = result.reset_index()
 		if (index_unit == 'HOUR'):
 			fig = figure(height = height, width = width,title=title,tools="pan,wheel_zoom,box_zoom,reset",y_axis_label=value,x_axis_label=index_unit)
@@ -488,8 +625,12 @@ class CSVProcessor:
 		return {'figure':fig, 'dataframe':result}
 
 	def get_tc_ac(self, source):
-		result = source.query("`QUANTITY` > 0").query("`AMOUNT` >= 0.00").pivot_table(index = ['GID'], values = ['QUANTITY','AMOUNT'],aggfunc={'QUANTITY':np.sum, 'AMOUNT':lambda x: sum(x)},fill_value=0, dropna=False)
-		result['AMOUNT']=(result['AMOUNT']/result['QUANTITY']).apply(lambda x: float(x.quantize(Decimal('1.00'),rounding=decimal.ROUND_CEILING)))
+		result = source.query("`QUANTITY` > 0").query("`AMOUNT` >= 0.00").pivot_table(index = ['GID'], values = ['QUANTITY','AMOUNT'],aggfunc={'QUANTITY':self.summed(np.sum), 'AMOUNT':self.summed(lambda x: sum(x))},fill_value=0, dropna=False)
+		if self.fixed:
+			# ? the same ceiling to the centavo in integers: -(-a // b) is a / b rounded up
+			result['AMOUNT'] = (-(-result['AMOUNT'] // (result['QUANTITY'] * (SCALE // 100)))) / 100
+		else:
+			result['AMOUNT']=(result['AMOUNT']/result['QUANTITY']).apply(lambda x: float(x.quantize(Decimal('1.00'),rounding=decimal.ROUND_CEILING)))
 		result = result.rename(columns={'QUANTITY': 'TC', 'AMOUNT': 'AC'})
 
 		arr_hist, edges = np.histogram(result['AC'],bins=[0, 100, 200, 300, 400, np.inf], range = [0, np.inf])
@@ -654,9 +795,9 @@ class CSVProcessor:
 			value_unit = 'QUANTITY'
 		else:
 			value_unit = 'AMOUNT'
-			source['AMOUNT'] = source['AMOUNT'].apply(lambda x: int((int(x* 10))/int(10)))
+			source['AMOUNT'] = self.truncate(source['AMOUNT'], 0, lambda x: int((int(x* 10))/int(10)))
 			source = source.query('`AMOUNT` > 0.0')
-		result = source.query("`PRODUCT NAME CLEAN`!= 'NA'").pivot_table(index = ['PRODUCT NAME CLEAN'], values = [value_unit], aggfunc = lambda x: sum(x), fill_value = 0, dropna = False).sort_values(by = value_unit, ascending=False).head(30)
+		result = source.query("`PRODUCT NAME CLEAN`!= 'NA'").pivot_table(index = ['PRODUCT NAME CLEAN'], values = [value_unit], aggfunc = self.summed(lambda x: sum(x)), fill_value = 0, dropna = False).sort_values(by = value_unit, ascending=False).head(30)
 		result = result.reset_index()
 		return result
 
@@ -666,8 +807,12 @@ class CSVProcessor:
 		else:
 			value_unit = 'AMOUNT'
 			source = source.query("`AMOUNT` > 0.00")
-			source['AMOUNT'] = source['AMOUNT'].apply(lambda x: int((int(x* 10))/int(10)))
-		result = source.query("`PRODUCT NAME CLEAN`!= 'NA'").pivot_table(index = ['PRODUCT NAME CLEAN'], values = [value_unit], aggfunc = lambda x: int(sum(x) * 10)/10 , fill_value = 0, dropna = False).sort_values(by = value_unit, ascending=True).head(30)
+			source['AMOUNT'] = self.truncate(source['AMOUNT'], 0, lambda x: int((int(x* 10))/int(10)))
+		result = source.query("`PRODUCT NAME CLEAN`!= 'NA'").pivot_table(index = ['PRODUCT NAME CLEAN'], values = [value_unit], aggfunc = self.summed(lambda x: int(sum(x) * 10)/10) , fill_value = 0, dropna = False)
+		if self.fixed:
+			# ? int(sum(x) * 10)/10 of whole numbers is their sum as a float
+			result[value_unit] = result[value_unit].astype(float)
+		result = result.sort_values(by = value_unit, ascending=True).head(30)
 		result = result.reset_index()
 		return result
 
@@ -677,8 +822,8 @@ class CSVProcessor:
 		else:
 			value_unit = 'AMOUNT'
 			source = source.query("`AMOUNT` > 0.00")
-			source['AMOUNT'] = source['AMOUNT'].apply(lambda x: int((int(x* 10))/int(10)))
-		result = source.query("`DEPARTMENT NAME CLEAN`!= 'NA'").pivot_table(index = ['DEPARTMENT NAME CLEAN'], values = [value_unit], aggfunc = lambda x: sum(x) , fill_value = 0, dropna = False).sort_values(by = value_unit, ascending=False)
+			source['AMOUNT'] = self.truncate(source['AMOUNT'], 0, lambda x: int((int(x* 10))/int(10)))
+		result = source.query("`DEPARTMENT NAME CLEAN`!= 'NA'").pivot_table(index = ['DEPARTMENT NAME CLEAN'], values = [value_unit], aggfunc = self.summed(lambda x: sum(x)) , fill_value = 0, dropna = False).sort_values(by = value_unit, ascending=False)
 		result = result.reset_index()
 		total = sum(result[value_unit])
 		if total == 0:
@@ -695,8 +840,8 @@ class CSVProcessor:
 		else:
 			value_unit = 'AMOUNT'
 			source = source.query("`AMOUNT` > 0.00")
-			source['AMOUNT'] = source['AMOUNT'].apply(lambda x: int((int(x* 10))/int(10)))
-		result = source.query("`BRANCH`!= 'NA'").pivot_table(index = ['BRANCH'], values = [value_unit], aggfunc = lambda x: sum(x) , fill_value = 0, dropna = False).sort_values(by = value_unit, ascending=False)
+			source['AMOUNT'] = self.truncate(source['AMOUNT'], 0, lambda x: int((int(x* 10))/int(10)))
+		result = source.query("`BRANCH`!= 'NA'").pivot_table(index = ['BRANCH'], values = [value_unit], aggfunc = self.summed(lambda x: sum(x)) , fill_value = 0, dropna = False).sort_values(by = value_unit, ascending=False)
 		result = result.reset_index()
 		total = sum(result[value_unit])
 		if total == 0:
@@ -713,8 +858,8 @@ class CSVProcessor:
 		else:
 			value_unit = 'AMOUNT'
 			source = source.query("`AMOUNT` > 0.00")
-			source['AMOUNT'] = source['AMOUNT'].apply(lambda x: int((int(x* 10))/int(10)))
-		result = source.query("`PRODUCT NAME CLEAN`!= 'NA'").pivot_table(index = ['PRODUCT NAME CLEAN'], values = [value_unit], aggfunc = lambda x: sum(x) , fill_value = 0, dropna = False).sort_values(by = value_unit, ascending=False)
+			source['AMOUNT'] = self.truncate(source['AMOUNT'], 0, lambda x: int((int(x* 10))/int(10)))
+		result = source.query("`PRODUCT NAME CLEAN`!= 'NA'").pivot_table(index = ['PRODUCT NAME CLEAN'], values = [value_unit], aggfunc = self.summed(lambda x: sum(x)) , fill_value = 0, dropna = False).sort_values(by = value_unit, ascending=False)
 		result = result.reset_index()
 		total = sum(result[value_unit])
 		if total == 0:
@@ -728,6 +873,9 @@ class CSVProcessor:
 	def data_gen(self, source):
 		keep = ['OR','ITEM CODE','QUANTITY','UNIT PRICE','AMOUNT','DATE','TIME','PRODUCT NAME CLEAN','DEPARTMENT NAME CLEAN','DISCOUNT NAME','TRANSACTION TYPE','DAYPART','PAYMENT NAME','BRANCH']
 		result = source[keep]
+		if self.fixed:
+			# ? the table shows pesos
+			result = result.assign(**{name: result[name] / SCALE for name in ['UNIT PRICE', 'AMOUNT']})
 		return result
 
 	def getBranch(self):
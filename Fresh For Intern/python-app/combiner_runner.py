@@ -1,36 +1,27 @@
 import argparse
 import os
-import shutil
-import csv
 from combiner import Combiner
 
+# Command-line wrapper over Combiner.lines(): combines the exports in --workdir where they
+# are and writes --out in the record2025.csv format, the aaa_headers.csv header and then
+# the record lines exactly as Combiner.generate() appends them (="..." wrappers and all).
+# Nothing is copied into latest/. The RQ worker (jobs.py) calls Combiner.lines() in-process
+# and does not need this.
+#
+#   python combiner_runner.py --workdir /app/temp_job_X/latest --out parsed.csv
+
 parser = argparse.ArgumentParser()
 parser.add_argument('--workdir', required=True)
 parser.add_argument('--out', default='parsed.csv')
+parser.add_argument('--root', default=None, help='directory with settings/ and aaa_headers.csv (default: the working directory)')
 args = parser.parse_args()
 
-orig_cwd = os.getcwd()
 workdir = os.path.abspath(args.workdir)
 out_path = os.path.abspath(args.out)
 
-# Combiner expects files in latest/ under repo root; we'll copy files into repo ./latest then run Combiner.generate()
-repo_latest = os.path.join(orig_cwd, 'latest')
-# ensure clean repo latest
-if os.path.exists(repo_latest):
-    shutil.rmtree(repo_latest)
-shutil.copytree(workdir, repo_latest)
-
-try:
-    # instantiate Combiner to operate on this workdir and produce isolated out_file
-    comb = Combiner(workdir=repo_latest, out_file=out_path)
-    comb.generate()
-    # Combiner.prepare_csv will have created the out_path; verify and exit accordingly
-    if not os.path.exists(out_path):
-        # nothing produced
-        exit(1)
-    exit(0)
-finally:
-    # cleanup repo latest to avoid cross-job contamination
-    if os.path.exists(repo_latest):
-        shutil.rmtree(repo_latest)
-    os.chdir(orig_cwd)
+comb = Combiner(workers=1, root=args.root)
+with open(out_path, 'w', encoding='utf-8') as f:
+    if comb.read_header():
+        f.write(comb.read_header() + "\n")
+    for line in comb.lines(workdir):
+        f.write(line + "\n")
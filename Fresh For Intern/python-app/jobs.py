@@ -1,12 +1,20 @@
 import os
 import shutil
+import tempfile
 import datetime
 import logging
 import boto3
-import requests
 from pymongo import MongoClient
-from subprocess import run
 from urllib.parse import urljoin
+try:
+    # the pipeline modules live in the project directory, not in python-app/; the worker
+    # service mounts it and puts it on PYTHONPATH (docker-compose.yml)
+    from http_client import BASE_URL, TIMEOUT, get_session
+    from listing import parse_listing, newest_snapshots
+    from combiner import Combiner
+except ImportError as e:
+    raise ImportError("jobs.py needs the pipeline modules (combiner.py, http_client.py, listing.py, ...) "
+                      "on PYTHONPATH, e.g. the project directory mounted at /pipeline: %s" % e) from e
 
 logging.basicConfig(level=logging.INFO)
 
@@ -14,7 +22,11 @@ MONGO_URI = os.getenv('MONGO_URI', 'mongodb://mongo:27017/biggs')
 RAW_STORAGE_PATH = os.getenv('RAW_STORAGE_PATH', './latest')
 S3_BUCKET = os.getenv('AWS_S3_BUCKET')
 S3_PREFIX = os.getenv('RAW_STORAGE_S3_PREFIX', '')
-PYTHON_CMD = os.getenv('PYTHON_CMD', 'python')
+# where the jobs' download directories go, and the directory with settings/ and
+# aaa_headers.csv for the Combiner (by default the one above python-app); neither depends
+# on the worker's working directory, so several workers can run side by side
+JOB_TMP_ROOT = os.getenv('JOB_TMP_ROOT', '/app')
+COMBINE_ROOT = os.getenv('COMBINE_ROOT', os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 mongo = MongoClient(MONGO_URI)
 db = mongo.get_default_database()
@@ -25,10 +37,10 @@ if S3_BUCKET:
 
 # Helper: streaming download
 def stream_download(remote_path, dest_path):
-    url = urljoin('https://biggsph.com/biggsinc_loyalty/controller/', remote_path)
-    headers = {'User-Agent': 'fetcher/1.0'}
+    url = urljoin(BASE_URL, remote_path)
     logging.info(f"Downloading {url} -> {dest_path}")
-    with requests.get(url, stream=True, headers=headers, timeout=60) as r:
+    # pooled keep-alive session shared with fetcher.Receive (see http_client.py)
+    with get_session().get(url, stream=True, timeout=TIMEOUT) as r:
         r.raise_for_status()
         with open(dest_path, 'wb') as f:
             for chunk in r.iter_content(chunk_size=8192):
@@ -45,6 +57,8 @@ def upload_to_s3(local_path, s3_key):
 def map_parsed_row_to_doc(fields):
     # Assuming combiner output ordering; adapt as needed
     # Minimal example: date,time,productName,quantity,amount,branch,pos,paymentName
+    # The fields and types are those of the documents already in db.transactions; a change
+    # here is a schema change for every reader of the collection.
     return {
         'date': fields[8] if len(fields) > 8 else None,
         'time': fields[9] if len(fields) > 9 else None,
@@ -60,18 +74,20 @@ def map_parsed_row_to_doc(fields):
 
 # Main job function invoked by RQ
 def fetch_branch_pos_date(branch, pos, date):
-    job_tmp = f"/app/temp_job_{branch}_{pos}_{date}".replace(':','_')
+    # a directory of its own, also when the same (branch, pos, date) runs twice at once
+    job_tmp = tempfile.mkdtemp(prefix=f"temp_job_{branch}_{pos}_{date}_".replace(':','_'), dir=JOB_TMP_ROOT)
     latest_dir = os.path.join(job_tmp, 'latest')
     os.makedirs(latest_dir, exist_ok=True)
 
     try:
         # 1) request list
-        list_resp = requests.post('https://biggsph.com/biggsinc_loyalty/controller/fetch_list2.php', data={'branch':branch,'pos':pos,'date':date}, timeout=30)
+        list_resp = get_session().post(urljoin(BASE_URL, 'fetch_list2.php'), data={'branch':branch,'pos':pos,'date':date}, timeout=TIMEOUT)
         if '<!doctype' in list_resp.text:
             logging.error('Remote returned HTML, aborting')
             db.monitor.insert_one({'branch':branch,'pos':pos,'date':date,'note':'html_response','createdAt':datetime.datetime.utcnow()})
             return
-        files = [f for f in list_resp.text.split(',') if f]
+        # only the newest snapshot per filetype is downloaded and combined
+        files = [entry.path for entry in newest_snapshots(parse_listing(list_resp.text.split(',')))]
 
         # 2) download files streaming
         for f in files:
@@ -94,44 +110,37 @@ def fetch_branch_pos_date(branch, pos, date):
                     s3_key = s3_key.lstrip('/')
                     s3uri = upload_to_s3(dest, s3_key)
                     filerec['storage'] = {'provider':'s3','uri':s3uri}
-                    # optionally remove local file
-                    os.remove(dest)
+                    # the local copy is combined below and removed with job_tmp
                 db.filerecords.insert_one(filerec)
             except Exception as e:
                 logging.exception('Download failed for %s', f)
                 db.monitor.insert_one({'branch':branch,'pos':pos,'date':date,'note':f'download_failed:{f}','error':str(e),'createdAt':datetime.datetime.utcnow()})
 
-        # 3) run combiner_runner.py which will run Combiner over latest_dir
-        parsed_out = os.path.join(job_tmp, 'parsed.csv')
-        cmd = [PYTHON_CMD, 'combiner_runner.py', '--workdir', latest_dir, '--out', parsed_out]
-        logging.info('Running combiner: %s', ' '.join(cmd))
-        result = run(cmd)
-        if result.returncode != 0:
-            logging.error('Combiner failed')
-            db.monitor.insert_one({'branch':branch,'pos':pos,'date':date,'note':'combiner_failed','createdAt':datetime.datetime.utcnow()})
-            return
-
-        # 4) stream parsed CSV into Mongo in batches
-        if os.path.exists(parsed_out):
-            batch = []
-            with open(parsed_out, 'r', encoding='utf-8') as fh:
-                for line in fh:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    # skip header if present
-                    if line.lower().startswith('pos') or line.lower().startswith('or'):
-                        continue
-                    fields = line.split(',')
-                    doc = map_parsed_row_to_doc(fields)
-                    batch.append(doc)
-                    if len(batch) >= 1000:
-                        db.transactions.insert_many(batch, ordered=False)
-                        batch = []
-                if batch:
+        # 3) combine in-process where the files were downloaded, and 4) stream the record
+        #    lines into Mongo in batches (no subprocess, copy or intermediate CSV); the lines
+        #    are the ones combiner_runner.py writes to parsed.csv
+        combiner = Combiner(workers=1, root=COMBINE_ROOT)
+        batch = []
+        try:
+            for line in combiner.lines(latest_dir):
+                line = line.strip()
+                if not line:
+                    continue
+                fields = line.split(',')
+                batch.append(map_parsed_row_to_doc(fields))
+                if len(batch) >= 1000:
                     db.transactions.insert_many(batch, ordered=False)
+                    batch = []
+            if batch:
+                db.transactions.insert_many(batch, ordered=False)
+        except Exception as e:
+            logging.exception('Combiner failed')
+            db.monitor.insert_one({'branch':branch,'pos':pos,'date':date,'note':'combiner_failed','error':str(e),'createdAt':datetime.datetime.utcnow()})
+            return
+        for (m_pos, m_branch, m_date), rows in combiner.monitor.counts.items():
+            db.monitor.insert_one({'branch':m_branch,'pos':m_pos,'date':m_date,'note':'mismatched_rows','rows':rows,'createdAt':datetime.datetime.utcnow()})
 
-            db.filerecords.update_many({'branch':branch,'pos':pos,'date':date},{'$set':{'status':'parsed'}})
+        db.filerecords.update_many({'branch':branch,'pos':pos,'date':date},{'$set':{'status':'parsed'}})
 
     finally:
         shutil.rmtree(job_tmp, ignore_errors=True)
@@ -0,0 +1,137 @@
+import os
+import json
+import time
+import collections
+from filelock import locked
+
+# Per-unit data quality counters. Combining a (branch, pos, date) used to print every
+# malformed rd5800 row ("lack 11" / "lack 20") and every rd5000 row that failed, which on
+# a dirty day took longer than the combining. The rows are now counted instead, and one
+# JSON line per unit goes to quality.jsonl (QUALITY_LOG; empty disables it):
+#   rows_read        rd5000 lines, header line included
+#   rows_written     rows that went to the record
+#   rows_dropped     lines that could not be rendered (the header line is one of them)
+#   date_mismatches  rows dated on another day (masterData_errorMonitoring.csv)
+#   short_rows       {"rd5000": rows with fewer than 38 fields,
+#                     "rd5800_lack_11" / "rd5800_lack_20": rd5800 rows left out of the
+#                     payment table, fewer than 11 / 20 fields}
+#   lookup_misses    written rows whose code is set but not in the reference table, per
+#                    table: item, dept, disc, tnsc, paym, blpr
+# QUALITY_SAMPLES=N also keeps the first N lines of every kind under "examples".
+#
+#   {"branch": "AYALA-FRN", "pos": "1", "date": "2025-07-01", "rows_read": 412, ...}
+#
+#   python quality.py quality.jsonl --start 2025-07-01 --end 2025-07-31
+
+LOG = os.getenv("QUALITY_LOG", "quality.jsonl")
+SAMPLES = int(os.getenv("QUALITY_SAMPLES", "0"))
+LOOKUPS = ["item", "dept", "disc", "tnsc", "paym", "blpr"]
+SHORT_KINDS = ["rd5000", "rd5800_lack_11", "rd5800_lack_20"]
+RD5000_FIELDS = 38  # a full rd5000 row; the transform reads up to field 37
+
+
+class UnitQuality:
+
+    def __init__(self, branch, pos, date, samples=SAMPLES):
+        self.branch = str(branch)
+        self.pos = str(pos)
+        self.date = str(date)[:10]
+        self.samples = samples
+        self.rows_read = 0
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.date_mismatches = 0
+        self.short_rows = collections.Counter()
+        self.lookup_misses = collections.Counter()
+        self.examples = {}
+
+    def sample(self, kind, line):
+        if self.samples:
+            kept = self.examples.setdefault(kind, [])
+            if len(kept) < self.samples:
+                kept.append(line)
+
+    def short(self, kind, line):
+        self.short_rows[kind] += 1
+        self.sample("short_" + kind, line)
+
+    def dropped(self, line, reason):
+        self.rows_dropped += 1
+        self.sample("dropped", "%s: %s" % (reason, line))
+
+    def missed(self, names, line):
+        # called for most rows (blpr only knows delivery transactions), so kept lean
+        for name in names:
+            self.lookup_misses[name] += 1
+        if self.samples:
+            for name in names:
+                self.sample("miss_" + name, line)
+
+    def record(self):
+        record = {"branch": self.branch, "pos": self.pos, "date": self.date,
+                  "rows_read": self.rows_read, "rows_written": self.rows_written,
+                  "rows_dropped": self.rows_dropped, "date_mismatches": self.date_mismatches,
+                  "short_rows": {kind: self.short_rows[kind] for kind in SHORT_KINDS},
+                  "lookup_misses": {name: self.lookup_misses[name] for name in LOOKUPS}}
+        if self.examples:
+            record["examples"] = self.examples
+        return record
+
+
+class QualityLog:
+    # quality.jsonl, appended once per unit; several processes may share it
+
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, record):
+        record = dict(record, logged=int(time.time()))
+        with locked(self.path):
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def load(path, start=None, end=None, branch=None):
+    # the records of `path`, optionally for dates in [start, end] and one branch; a unit
+    # combined more than once keeps its last record
+    units = {}
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by a crash
+            if start and record["date"] < start or end and record["date"] > end:
+                continue
+            if branch and record["branch"] != branch:
+                continue
+            units[(record["branch"], record["pos"], record["date"])] = record
+    return list(units.values())
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('path', nargs='?', default=LOG)
+    parser.add_argument('--start', default=None)
+    parser.add_argument('--end', default=None)
+    parser.add_argument('--branch', default=None)
+    args = parser.parse_args()
+
+    # totals per branch, worst (most dropped and short rows) first
+    totals = {}
+    for record in load(args.path, args.start, args.end, args.branch):
+        total = totals.setdefault(record["branch"], collections.Counter())
+        total["units"] += 1
+        for name in ["rows_read", "rows_written", "rows_dropped", "date_mismatches"]:
+            total[name] += record[name]
+        total["short_rows"] += sum(record["short_rows"].values())
+        for name, count in record["lookup_misses"].items():
+            total["miss_" + name] += count
+    columns = ["units", "rows_read", "rows_written", "rows_dropped", "date_mismatches", "short_rows"] + ["miss_" + name for name in LOOKUPS]
+    print("\t".join(["branch"] + columns))
+    for branch, total in sorted(totals.items(), key=lambda item: -(item[1]["rows_dropped"] + item[1]["short_rows"])):
+        print("\t".join([branch] + [str(total[name]) for name in columns]))
@@ -0,0 +1,98 @@
+import os
+import gzip
+import shutil
+import hashlib
+import threading
+
+# Content-addressed archive of the raw POS exports.
+#   <root>/blobs/<sha[:2]>/<sha>[.gz]   file content, stored once per distinct hash
+#   <root>/manifest.tsv                  append-only "filename<TAB>sha256<TAB>size" lines
+# Export names carry the snapshot time (a_BMC_1_rd5000_2026-02-09_20-00_.csv), so a name
+# that is already in the manifest never needs to be downloaded again. Master files that
+# don't change between days (rd5500, rd1800, ...) share a single blob.
+#
+# By default (compress=False) blobs are kept as-is and materialize() hardlinks them
+# (copying only when the workdir is on another filesystem); nothing in the pipeline writes
+# to latest/ in place, so the shared inode is never modified. compress=True is opt-in: blobs
+# are gzipped and materialize() decompresses into the workdir. Either kind of blob is read
+# back whatever the setting, so switching it does not orphan an existing store.
+
+
+class RawStore:
+
+    def __init__(self, root, compress=False):
+        self.root = root
+        self.compress = compress
+        self.manifest = {}  # filename -> (sha256, size)
+        self.lock = threading.Lock()
+        os.makedirs(os.path.join(root, "blobs"), exist_ok=True)
+        self.manifest_path = os.path.join(root, "manifest.tsv")
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                for row in f:
+                    parts = row.rstrip("\n").split("\t")
+                    if len(parts) == 3:
+                        self.manifest[parts[0]] = (parts[1], int(parts[2]))
+
+    def blob_path(self, digest, compressed=None):
+        if compressed is None:
+            compressed = self.compress
+        return os.path.join(self.root, "blobs", digest[:2], digest + (".gz" if compressed else ""))
+
+    def has(self, name):
+        if name not in self.manifest:
+            return False
+        digest = self.manifest[name][0]
+        return os.path.exists(self.blob_path(digest, True)) or os.path.exists(self.blob_path(digest, False))
+
+    def put(self, name, path):
+        # archive a freshly downloaded file and record it under `name`
+        sha = hashlib.sha256()
+        size = 0
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                sha.update(chunk)
+                size += len(chunk)
+        digest = sha.hexdigest()
+        blob = self.blob_path(digest)
+        if not os.path.exists(blob):
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            tmp = blob + ".%d.tmp" % threading.get_ident()
+            if self.compress:
+                with open(path, "rb") as src, gzip.open(tmp, "wb", compresslevel=6) as dst:
+                    shutil.copyfileobj(src, dst, 1 << 20)
+            else:
+                shutil.copyfile(path, tmp)
+            os.replace(tmp, blob)
+        with self.lock:
+            self.manifest[name] = (digest, size)
+            with open(self.manifest_path, "a", encoding="utf-8") as f:
+                f.write("%s\t%s\t%d\n" % (name, digest, size))
+        return digest
+
+    def materialize(self, name, dest):
+        # place the stored content of `name` at `dest`
+        digest = self.manifest[name][0]
+        if os.path.exists(dest):
+            os.unlink(dest)
+        blob = self.blob_path(digest, False)
+        if os.path.exists(blob):
+            try:
+                os.link(blob, dest)
+            except OSError:
+                shutil.copyfile(blob, dest)
+            return dest
+        with gzip.open(self.blob_path(digest, True), "rb") as src, open(dest, "wb") as dst:
+            shutil.copyfileobj(src, dst, 1 << 20)
+        return dest
+
+    def open(self, name):
+        # binary file object over the stored content of `name`
+        digest = self.manifest[name][0]
+        blob = self.blob_path(digest, False)
+        if os.path.exists(blob):
+            return open(blob, "rb")
+        return gzip.open(self.blob_path(digest, True), "rb")
+
+    def digest(self, name):
+        return self.manifest[name][0] if name in self.manifest else ""
@@ -0,0 +1,192 @@
+import os
+import csv
+import time
+import shutil
+import argparse
+import threading
+from collections import namedtuple
+from filelock import locked
+
+# Partitioned record store, the alternative to appending everything to record2025.csv.
+# Every (branch, pos, date) unit is one partition file
+#   <root>/<branch>/<YYYY-MM>/<YYYY-MM-DD>/pos<pos>.csv
+# holding the aaa_headers.csv header and the unit's rows. Combining a unit again
+# (missing_fetch() does this routinely) replaces its partition atomically instead of adding
+# the rows a second time. manifest.csv lists every partition with its row count and size;
+# like the error monitor it is kept in memory and rewritten once per run (merged, under a
+# lock, with what other processes wrote to it meanwhile), and rebuild() recreates it from
+# the tree after a crash. Readers use partitions() to pick the units they
+# need and open() to read one; export() still writes the flat record2025.csv on demand.
+#
+#   python recordstore.py list records --branch BMC --start 2026-02-01
+#   python recordstore.py export records record2025.csv
+
+MANIFEST = "manifest.csv"
+MANIFEST_HEADERS = ["branch", "pos", "date", "rows", "bytes", "path", "updated"]
+
+Partition = namedtuple("Partition", MANIFEST_HEADERS)
+
+
+class RecordStore:
+
+    def __init__(self, root, header=""):
+        # header: the record's header line (aaa_headers.csv), written at the top of every
+        # partition and of the flat export
+        self.root = os.path.abspath(root)
+        self.header = header.strip()
+        self.manifest = os.path.join(self.root, MANIFEST)
+        self.updated = {}  # partitions replaced by this process since the last flush()
+        self.changed = False
+        self.rebuilt = False
+        self.lock = threading.Lock()
+        os.makedirs(self.staging_dir, exist_ok=True)
+        self.entries = self.load()  # (branch, pos, date) -> Partition
+
+    def load(self):
+        entries = {}
+        if os.path.exists(self.manifest):
+            with open(self.manifest, "r", newline="", encoding="utf-8") as f:
+                for row in list(csv.reader(f))[1:]:
+                    if len(row) == len(MANIFEST_HEADERS):
+                        entry = Partition(row[0], row[1], row[2], int(row[3]), int(row[4]), row[5], row[6])
+                        entries[entry[:3]] = entry
+        return entries
+
+    @staticmethod
+    def key(branch, pos, date):
+        return (str(branch), str(pos), str(date)[:10])
+
+    @property
+    def staging_dir(self):
+        return os.path.join(self.root, ".staging")
+
+    def relative_path(self, branch, pos, date):
+        branch, pos, date = self.key(branch, pos, date)
+        return os.path.join(branch, date[:7], date, "pos%s.csv" % pos)
+
+    def staging(self, branch, pos, date):
+        # where a unit is written before replace() moves it into place (one name per
+        # process, so two processes combining the same unit do not share a file)
+        return os.path.join(self.staging_dir, "%s_%s_%s.%d.csv" % (self.key(branch, pos, date) + (os.getpid(),)))
+
+    def replace(self, branch, pos, date, path, rows):
+        # make the finished file at `path` the unit's partition, atomically
+        key = self.key(branch, pos, date)
+        relative = self.relative_path(*key)
+        target = os.path.join(self.root, relative)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(path, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(path, target)
+        with self.lock:
+            self.entries[key] = self.updated[key] = Partition(key[0], key[1], key[2], rows, os.path.getsize(target),
+                                                              relative.replace(os.sep, "/"), time.strftime("%Y-%m-%d %H:%M:%S"))
+            self.changed = True
+        return target
+
+    def partitions(self, branch=None, pos=None, start=None, end=None):
+        # manifest entries in (branch, pos, date) order; start/end are inclusive dates
+        branches = [branch] if isinstance(branch, str) else branch
+        chosen = []
+        for key, entry in sorted(self.entries.items()):
+            if branches is not None and entry.branch not in branches:
+                continue
+            if pos is not None and entry.pos != str(pos):
+                continue
+            if (start and entry.date < str(start)[:10]) or (end and entry.date > str(end)[:10]):
+                continue
+            chosen.append(entry)
+        return chosen
+
+    def path(self, partition):
+        return os.path.join(self.root, partition.path)
+
+    def open(self, partition):
+        return open(self.path(partition), "r", encoding="utf-8")
+
+    def export(self, out_file, **filters):
+        # flat record (header + rows of every chosen partition in (branch, pos, date)
+        # order), written next to out_file and moved into place; returns the row count
+        rows = 0
+        tmp = out_file + ".%d.tmp" % os.getpid()
+        with open(tmp, "wb") as out:
+            out.write((self.header + "\n").encode("utf-8"))
+            for partition in self.partitions(**filters):
+                with open(self.path(partition), "rb") as f:
+                    f.readline()
+                    shutil.copyfileobj(f, out, 1 << 20)
+                rows += partition.rows
+        os.replace(tmp, out_file)
+        return rows
+
+    def rebuild(self):
+        # recreate the manifest from the partition files, e.g. after a run died before
+        # flush(); row counts are the files' line counts minus the header
+        entries = {}
+        for folder, dirs, files in os.walk(self.root):
+            dirs[:] = [d for d in dirs if d != ".staging"]
+            for name in files:
+                if not (name.startswith("pos") and name.endswith(".csv")):
+                    continue
+                target = os.path.join(folder, name)
+                parts = os.path.relpath(target, self.root).split(os.sep)
+                if len(parts) != 4:
+                    continue
+                with open(target, "rb") as f:
+                    rows = max(0, sum(1 for _ in f) - 1)
+                key = self.key(parts[0], name[3:-4], parts[2])
+                entries[key] = Partition(key[0], key[1], key[2], rows, os.path.getsize(target), "/".join(parts),
+                                         time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(os.path.getmtime(target))))
+        with self.lock:
+            self.entries = entries
+            self.updated = dict(entries)
+            self.changed = self.rebuilt = True
+        self.flush()
+
+    def flush(self):
+        # this process's partitions over the manifest as it is on disk now; after rebuild()
+        # the scanned tree replaces it
+        with self.lock:
+            if not self.changed:
+                return
+            with locked(self.manifest):
+                entries = {} if self.rebuilt else self.load()
+                entries.update(self.updated)
+                tmp = self.manifest + ".%d.tmp" % os.getpid()
+                with open(tmp, "w", newline="", encoding="utf-8") as f:
+                    writer = csv.writer(f)
+                    writer.writerow(MANIFEST_HEADERS)
+                    for key in sorted(entries):
+                        writer.writerow(list(entries[key]))
+                os.replace(tmp, self.manifest)
+            self.entries = entries
+            self.updated = {}
+            self.changed = self.rebuilt = False
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('command', choices=["list", "export", "rebuild"])
+    parser.add_argument('root', help='record store directory')
+    parser.add_argument('out_file', nargs='?', default="record2025.csv", help='export: flat record to write')
+    parser.add_argument('--branch', nargs='+', default=None)
+    parser.add_argument('--pos', default=None)
+    parser.add_argument('--start', default=None, help='first date (YYYY-MM-DD)')
+    parser.add_argument('--end', default=None, help='last date (YYYY-MM-DD)')
+    parser.add_argument('--headers', default="aaa_headers.csv")
+    args = parser.parse_args()
+
+    header = ""
+    if os.path.exists(args.headers):
+        with open(args.headers, "r", encoding="utf-8") as f:
+            header = f.read()
+    store = RecordStore(args.root, header)
+    filters = dict(branch=args.branch, pos=args.pos, start=args.start, end=args.end)
+    if args.command == "list":
+        for partition in store.partitions(**filters):
+            print("%-12s pos %s  %s  %7d rows  %s" % (partition.branch, partition.pos, partition.date, partition.rows, partition.path))
+    elif args.command == "export":
+        print("Exported %d rows to %s" % (store.export(args.out_file, **filters), args.out_file))
+    else:
+        store.rebuild()
+        print("Manifest rebuilt: %d partitions" % len(store.entries))
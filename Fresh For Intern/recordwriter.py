@@ -0,0 +1,143 @@
+import os
+import shutil
+import itertools
+from filelock import locked
+
+# Buffered append handle for the combined record (record2025.csv or a job's out_file).
+# Combiner keeps one RecordWriter open for a whole generate() run instead of opening and
+# closing the file for every row. commit() is called at every (branch, pos, date) boundary
+# before the unit is checkpointed in the journal, and rollback() drops whatever was written
+# since the last commit, for a unit that failed partway.
+#
+# The record may be shared: several Combiners (RQ workers, runs with the same out_file) can
+# append to it at once. So in append mode rows never go to the record directly: they are
+# buffered into a private staging file next to it (<record>.<pid>.<n>.part), and commit()
+# appends the staged unit to the record in one piece under the record's lock (filelock.py),
+# fsyncs it and empties the staging file. Units of different processes therefore never
+# interleave, and rollback() only empties the staging file; the record itself is never
+# truncated. After a crash the record holds every unit the journal lists as combined; a
+# .part file left behind holds rows that were never committed and can be deleted.
+# Mode "w" is for a file of this process's own (a unit's staging file, a worker's shard),
+# which is written and rolled back in place.
+
+BUFFER_SIZE = int(os.getenv("RECORD_BUFFER_SIZE", str(1 << 20)))
+COPY_SIZE = 1 << 20
+_serial = itertools.count()
+
+
+class RecordWriter:
+
+    def __init__(self, path, buffer_size=BUFFER_SIZE, mode="a"):
+        self.path = path
+        self.shared = mode == "a"
+        if self.shared:
+            self.staging = "%s.%d.%d.part" % (path, os.getpid(), next(_serial))
+            self.f = open(self.staging, "w", encoding="utf-8", buffering=buffer_size)
+        else:
+            self.staging = None
+            self.f = open(path, mode, encoding="utf-8", buffering=buffer_size)
+        self.rows = 0
+        self.commits = 0
+        self.committed = self.f.tell()  # size of the file written to at the last commit
+
+    def write(self, line):
+        self.f.write(line + "\n")
+        self.rows += 1
+
+    def write_lines(self, lines):
+        if lines:
+            self.f.write("\n".join(lines) + "\n")
+            self.rows += len(lines)
+
+    def append_file(self, path):
+        # copy an already written file (e.g. a staged unit) after the rows written so far
+        self.f.flush()
+        with open(path, "rb") as src:
+            shutil.copyfileobj(src, self.f.buffer, COPY_SIZE)
+
+    def unit(self, branch, pos, date):
+        # the unit the rows that follow belong to; only a ShardedWriter keeps track of it
+        pass
+
+    def commit(self):
+        self.f.flush()
+        if self.shared:
+            if self.f.tell() > 0:
+                with locked(self.path), open(self.staging, "rb") as src, open(self.path, "ab") as dst:
+                    shutil.copyfileobj(src, dst, COPY_SIZE)
+                    dst.flush()
+                    os.fsync(dst.fileno())
+                self.f.seek(0)
+                self.f.truncate()
+        else:
+            os.fsync(self.f.fileno())
+        self.commits += 1
+        self.committed = self.f.tell()
+
+    def rollback(self):
+        # only ever the file this writer owns: the staging file, or a mode "w" file
+        self.f.flush()
+        self.f.seek(self.committed)
+        self.f.truncate()
+
+    def close(self):
+        # rows not committed are dropped with the staging file
+        if not self.f.closed:
+            self.f.close()
+            if self.shared and os.path.exists(self.staging):
+                os.unlink(self.staging)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RecordBuffer:
+    # RecordWriter interface on a list of lines, for Combiner.lines(): a unit's rows are
+    # kept in memory and handed to the caller with take() instead of going to a file
+
+    def __init__(self):
+        self.path = None
+        self.lines = []
+        self.rows = 0
+        self.commits = 0
+        self.committed = 0  # lines at the last commit
+
+    def write(self, line):
+        self.lines.append(line)
+        self.rows += 1
+
+    def write_lines(self, lines):
+        self.lines.extend(lines)
+        self.rows += len(lines)
+
+    def append_file(self, path):
+        with open(path, "r", encoding="utf-8", newline="") as src:
+            self.write_lines([line.rstrip("\r\n") for line in src])
+
+    def unit(self, branch, pos, date):
+        pass
+
+    def commit(self):
+        self.commits += 1
+        self.committed = len(self.lines)
+
+    def rollback(self):
+        del self.lines[self.committed:]
+
+    def take(self):
+        # the lines written so far, which are then dropped from the buffer
+        lines, self.lines = self.lines, []
+        self.committed = 0
+        return lines
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
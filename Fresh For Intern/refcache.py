@@ -0,0 +1,87 @@
+import os
+import pickle
+import threading
+import collections
+
+# Reference tables built from the master exports (rd5500 items, rd1800 departments,
+# discounts, rd5900 payments), keyed by the SHA-256 of the file they were built from. The
+# master files of a branch barely change from day to day, so a backfill over many dates
+# parses each distinct file once. The most recently used `capacity` tables stay in memory;
+# with a directory they are also pickled there, so later runs and the worker processes of
+# Combiner.combine_parallel() can load them instead of parsing again.
+#
+# Keys are (file type, sha256, variant); the variant separates tables whose content also
+# depends on the branch (rd5500 is read differently for settings/newBranches.txt).
+
+VERSION = 1  # bump when a Combiner.build_* method changes what it builds
+
+CAPACITY = int(os.getenv("REF_CACHE_SIZE", "128"))
+DIRECTORY = os.getenv("REF_CACHE_DIR") or None
+
+
+class RefCache:
+
+    def __init__(self, capacity=CAPACITY, directory=None):
+        self.capacity = capacity
+        self.directory = directory
+        self.tables = collections.OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        ftype, digest, variant = key
+        return os.path.join(self.directory, "v%d_%s_%s_%s.pickle" % (VERSION, ftype, digest, variant))
+
+    def get(self, key):
+        # the cached table for key, or None
+        with self.lock:
+            if key in self.tables:
+                self.tables.move_to_end(key)
+                self.hits += 1
+                return self.tables[key]
+        if self.directory and os.path.exists(self.path(key)):
+            try:
+                with open(self.path(key), "rb") as f:
+                    table = pickle.load(f)
+            except (OSError, EOFError, pickle.UnpicklingError):
+                table = None
+            if table is not None:
+                self.remember(key, table)
+                with self.lock:
+                    self.disk_hits += 1
+                return table
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, table):
+        self.remember(key, table)
+        if self.directory:
+            tmp = self.path(key) + ".%d.tmp" % os.getpid()
+            with open(tmp, "wb") as f:
+                pickle.dump(table, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.path(key))
+
+    def remember(self, key, table):
+        with self.lock:
+            self.tables[key] = table
+            self.tables.move_to_end(key)
+            while len(self.tables) > self.capacity:
+                self.tables.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.tables.clear()
+            self.hits = self.disk_hits = self.misses = 0
+
+    def report(self):
+        return "Reference cache: %d hits (%d from disk), %d misses, %d tables in memory" % (
+            self.hits + self.disk_hits, self.disk_hits, self.misses, len(self.tables))
+
+
+# process-wide cache shared by every Combiner (fetch() makes a new one per date)
+shared = RefCache(CAPACITY, DIRECTORY)
@@ -0,0 +1,172 @@
+import csv
+
+# Compiled form of Combiner.stringifyAppend() for one rd5000 file. stringifyAppend decides
+# for every field of every row whether the column is kept (a list scan) and how it is
+# quoted; a RowPlan makes those decisions once per file schema: the source index of each
+# kept column (by header name, so a reordered export still lines up), the quoting rule of
+# each column and the reference tables of the unit. For rows without quote characters the
+# rendered line is byte-identical to stringifyAppend, and rows stringifyAppend raises on
+# raise here as well.
+#
+# Rows are split by split_row(): str.split(",") for the usual quote-free row (what the csv
+# reader returns for those, only faster) and the csv reader for rows with quotes, so a
+# quoted comma stays inside its field. Each row is read on its own, so an unbalanced quote
+# cannot swallow the rows after it.
+
+# kept rd5000 columns in output order: (header name, index in the standard export, rule)
+#   date:  the date part of "YYYY-MM-DD hh:mm:ss"
+#   quote: always wrapped as ="..." (department codes)
+#   raw:   copied as is (transaction number)
+#   excel: wrapped as ="..." when it has a leading zero, unless it looks like 0.xx, a time
+#          or a date
+COLUMNS = [("STORE_NUM", 0, "excel"), ("INVOICE", 2, "excel"), ("ITE_CODE", 4, "excel"), ("QUANTITY", 5, "excel"),
+           ("UNT_PRIC", 6, "excel"), ("AMOUNT", 7, "excel"), ("DISCOUNT", 8, "excel"), ("DEP_CODE", 11, "quote"),
+           ("DATE", 12, "date"), ("TIME", 13, "excel"), ("DISC_CODE", 18, "excel"), ("TYPE", 21, "excel"),
+           ("VAT_FLAG", 31, "excel"), ("VATDIV", 32, "excel"), ("VAT_AMNT", 34, "excel"), ("VAT_DISC", 35, "excel"),
+           ("VAT_PRIC", 36, "excel"), ("TRANSNO", 37, "raw")]
+
+
+def excel(value):
+    a = False
+    if len(value) >= 2:
+        if value[0] == '0':
+            a = True
+        if value[1] == '.':
+            a = False
+    if len(value) > 2 and value[2] == ':':
+        a = False
+    if len(value) > 4 and value[4] == '-':
+        a = False
+    return '"=""' + value + '"""' if a else value
+
+
+def quote(value):
+    return '"=""' + value + '"""'
+
+
+def date(value):
+    return value.split(" ")[0]
+
+
+def raw(value):
+    return value
+
+
+RULES = {"excel": excel, "quote": quote, "date": date, "raw": raw}
+MEMO_SIZE = 65536  # distinct values remembered per column
+
+
+def split_row(line):
+    if '"' in line:
+        for fields in csv.reader([line]):
+            return fields
+        return []
+    return line.split(",")
+
+
+def schema(header):
+    # source index of every kept column; the standard positions when the header does not
+    # name them all (no header, or an export this was not written for)
+    names = split_row(header) if header else []
+    if all(name in names for name, index, rule in COLUMNS):
+        return [names.index(name) for name, index, rule in COLUMNS]
+    return [index for name, index, rule in COLUMNS]
+
+
+class RowPlan:
+
+    def __init__(self, header, tables, pos, branch, new_branch, type_dict, time_dict):
+        self.indices = schema(header)
+        self.steps = [(index, RULES[rule]) for index, (name, standard, rule) in zip(self.indices, COLUMNS)]
+        # excel-quoting only depends on the value, and a column repeats few distinct values
+        self.memo = [{} if rule == "excel" else None for name, standard, rule in COLUMNS]
+        self.pos = pos
+        self.branch = str(branch)
+        self.new_branch = new_branch
+        self.item, self.disc, self.dept = tables["item"], tables["disc"], tables["dept"]
+        self.tnsc, self.paym, self.blpr = tables["tnsc"], tables["paym"], tables["blpr"]
+        self.type_dict = type_dict
+        self.time_dict = time_dict
+        # tables whose lookup missed for the last rendered row (a code that is set but not
+        # in the table), for the unit's quality counters
+        self.missed = []
+
+    def select(self, fields):
+        # the 18 kept columns of one row, quoted; columns past the end of the row are ""
+        n = len(fields)
+        y = []
+        for (index, rule), memo in zip(self.steps, self.memo):
+            if index >= n:
+                y.append("")
+            elif memo is None:
+                y.append(rule(fields[index]))
+            else:
+                value = fields[index]
+                if value not in memo:
+                    if len(memo) > MEMO_SIZE:
+                        memo.clear()
+                    memo[value] = rule(value)
+                y.append(memo[value])
+        return y
+
+    def render(self, fields):
+        # (record line, its date) for one split rd5000 row; raises where stringifyAppend does
+        y = self.select(fields)
+        y[0] = self.pos
+        missed = []
+        item = self.item
+        if y[2] in item:
+            entry = item[y[2]]
+            y.append('"' + entry['item_name'] + '"')
+            if self.new_branch:
+                y[7] = '"' + entry['department_code'] + '"'
+        else:
+            y.append("")
+            if y[2]:
+                missed.append("item")
+        code = y[7].strip().replace('="', '').replace('"', '').strip()
+        if code and code in self.dept:
+            y.append('"%s"' % self.dept[code])
+        else:
+            y.append("")
+            if code:
+                missed.append("dept")
+        if y[10] in self.disc:
+            y.append('"' + self.disc[y[10]] + '"')
+        else:
+            y.append("")
+            if y[10]:
+                missed.append("disc")
+        y.append('"' + self.type_dict[y[11]] + '"' if y[11] in self.type_dict else "")
+        y.append(self.time_dict[int(y[9][0:2])] if y[9][0:1] else "No Time Record")
+        transno = y[17]
+        if transno:
+            if transno in self.tnsc:
+                paycode = self.tnsc[transno]
+                y.append(paycode)
+                if paycode in self.paym:
+                    y.append(self.paym[paycode])
+                else:
+                    y.append("")
+                    if paycode:
+                        missed.append("paym")
+            else:
+                y.append("")
+                y.append("")
+                missed.append("tnsc")
+            if transno in self.blpr:
+                y.append(self.blpr[transno])
+            else:
+                y.append("")
+                missed.append("blpr")
+        else:
+            y.append("")
+            y.append("")
+            y.append("")
+        y.append(self.branch)
+        for i in range(1, 18):
+            if "," in y[i] and not y[i].startswith('"'):
+                # only a csv-quoted source field can hold a comma; keep it one column
+                y[i] = '"' + y[i].replace('"', '""') + '"'
+        self.missed = missed
+        return ",".join(y), y[8]
@@ -0,0 +1,182 @@
+import os
+import time
+import random
+import threading
+
+# Request scheduling for the fetcher: a shared adaptive token bucket caps the request rate
+# to biggsph.com, failed calls are retried with exponential backoff and full jitter, and a
+# per-branch circuit breaker stops hammering a branch whose server keeps failing. Calls on
+# an open circuit raise CircuitOpen immediately so the caller can defer that unit instead
+# of blocking every other branch behind it.
+
+RATE = float(os.getenv("FETCH_RATE", "20"))  # requests/sec ceiling
+ATTEMPTS = int(os.getenv("FETCH_ATTEMPTS", "3"))
+FAILURE_THRESHOLD = int(os.getenv("FETCH_BREAKER_FAILURES", "5"))
+COOLDOWN = float(os.getenv("FETCH_BREAKER_COOLDOWN", "60"))
+
+
+class FetchFailed(Exception):
+    pass
+
+
+class CircuitOpen(FetchFailed):
+    pass
+
+
+class TokenBucket:
+    # AIMD: the rate halves on every failure and creeps back up on success, never above
+    # the configured ceiling
+
+    def __init__(self, rate, burst=None):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.tokens = self.burst
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def slow_down(self):
+        with self.lock:
+            self.rate = max(0.5, self.rate / 2)
+
+    def speed_up(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+class CircuitBreaker:
+    # closed -> open after `threshold` consecutive failures; after `cooldown` seconds one
+    # probe call is let through (half-open) and its outcome closes or re-opens the circuit
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.trips = 0
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if not self.probing and time.monotonic() - self.opened_at >= self.cooldown:
+                self.probing = True
+                return True
+            return False
+
+    def retry_in(self):
+        with self.lock:
+            if self.opened_at is None:
+                return 0.0
+            return max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.probing or (self.opened_at is None and self.failures >= self.threshold):
+                self.trips += 1
+                self.opened_at = time.monotonic()
+                self.probing = False
+
+
+class BranchStats:
+
+    def __init__(self):
+        self.latencies = []
+        self.requests = 0
+        self.failures = 0
+
+    def percentile(self, p):
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))]
+
+
+class FetchScheduler:
+
+    def __init__(self, rate=RATE, attempts=ATTEMPTS, failure_threshold=FAILURE_THRESHOLD, cooldown=COOLDOWN, base_delay=0.5, max_delay=30.0):
+        self.bucket = TokenBucket(rate)
+        self.attempts = attempts
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breakers = {}
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def breaker(self, branch):
+        with self.lock:
+            if branch not in self.breakers:
+                self.breakers[branch] = CircuitBreaker(self.failure_threshold, self.cooldown)
+                self.stats[branch] = BranchStats()
+            return self.breakers[branch]
+
+    def backoff(self, attempt):
+        # full jitter: uniform in [0, min(max_delay, base * 2^attempt)]
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def call(self, branch, fn):
+        # run fn() for `branch` under the rate limit, retrying with backoff; raises
+        # CircuitOpen when the branch's circuit is open, else the last error
+        breaker = self.breaker(branch)
+        stats = self.stats[branch]
+        for attempt in range(self.attempts):
+            if not breaker.allow():
+                raise CircuitOpen("circuit open for branch %s" % branch)
+            self.bucket.acquire()
+            started = time.monotonic()
+            try:
+                result = fn()
+            except Exception:
+                with self.lock:
+                    stats.requests += 1
+                    stats.failures += 1
+                breaker.failure()
+                self.bucket.slow_down()
+                if attempt == self.attempts - 1:
+                    raise
+                time.sleep(self.backoff(attempt))
+                continue
+            with self.lock:
+                stats.requests += 1
+                stats.latencies.append(time.monotonic() - started)
+            breaker.success()
+            self.bucket.speed_up()
+            return result
+
+    def wait_for(self, branch):
+        # sleep until an open circuit lets a probe through again
+        delay = self.breaker(branch).retry_in()
+        if delay > 0:
+            time.sleep(delay)
+
+    def report(self):
+        rows = []
+        for branch in sorted(self.stats):
+            stats = self.stats[branch]
+            rows.append("%-12s %6d req %4d failed %3d trips  p50 %.3fs  p95 %.3fs  p99 %.3fs" % (
+                branch, stats.requests, stats.failures, self.breakers[branch].trips,
+                stats.percentile(50), stats.percentile(95), stats.percentile(99)))
+        return rows
@@ -0,0 +1,277 @@
+import os
+import csv
+import time
+import argparse
+from collections import namedtuple
+
+# Sharded output for the flat record, selected with RECORD_SHARD_ROWS / RECORD_SHARD_BYTES
+# (or Combiner(shard_rows=..., shard_bytes=...)). Instead of one record2025.csv the record
+# is written to
+#   record2025.parts/part-00001.csv, part-00002.csv, ...
+# each with the aaa_headers.csv header and at most `max_rows` rows and/or `max_bytes`
+# bytes; the default row bound, 1048575, is what Excel opens with the header (the old
+# `a < 1048575` counter in GenAppend meant to do this but never switched files).
+# manifest.csv lists every shard with its rows, bytes and the date and branch range of
+# the units written to it, so a reader can open shards on its own and skip the ones
+# outside a date filter (shards(), or "python shardwriter.py list").
+#
+# ShardedWriter has the RecordWriter interface: rows go to the last shard until it is
+# full, commit() flushes and fsyncs at unit boundaries and rollback() drops every row
+# since the last commit, including shards opened since. A unit can span two shards. Like
+# the error monitor the manifest is kept in memory and rewritten on close(); a manifest
+# that does not match the shard files (a run that died) is rebuilt from them on open.
+#
+#   python shardwriter.py list record2025.parts --start 2026-02-01 --end 2026-02-28
+#   python shardwriter.py rebuild record2025.parts
+
+EXCEL_ROWS = 1048575
+BUFFER_SIZE = int(os.getenv("RECORD_BUFFER_SIZE", str(1 << 20)))
+MANIFEST = "manifest.csv"
+MANIFEST_HEADERS = ["shard", "rows", "bytes", "first_date", "last_date", "first_branch", "last_branch", "updated"]
+
+Shard = namedtuple("Shard", MANIFEST_HEADERS)
+
+
+def shard_name(index):
+    return "part-%05d.csv" % index
+
+
+def merge_range(first, last, value):
+    value = str(value)
+    return (value if not first or value < first else first), (value if not last or value > last else last)
+
+
+def read_manifest(root):
+    entries = []
+    path = os.path.join(root, MANIFEST)
+    if os.path.exists(path):
+        with open(path, "r", newline="", encoding="utf-8") as f:
+            for row in list(csv.reader(f))[1:]:
+                if len(row) == len(MANIFEST_HEADERS):
+                    entries.append(Shard(row[0], int(row[1]), int(row[2]), *row[3:]))
+    return entries
+
+
+def scan(root):
+    # manifest entries recreated from the shard files: the DATE and BRANCH columns are
+    # found by name in each shard's header
+    entries = []
+    for name in sorted(os.listdir(root)):
+        if not (name.startswith("part-") and name.endswith(".csv")):
+            continue
+        path = os.path.join(root, name)
+        rows = 0
+        first_date = last_date = first_branch = last_branch = ""
+        with open(path, "r", newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            date_col = header.index("DATE") if "DATE" in header else None
+            branch_col = header.index("BRANCH") if "BRANCH" in header else None
+            for row in reader:
+                rows += 1
+                if date_col is not None and date_col < len(row):
+                    first_date, last_date = merge_range(first_date, last_date, row[date_col])
+                if branch_col is not None and branch_col < len(row):
+                    first_branch, last_branch = merge_range(first_branch, last_branch, row[branch_col])
+        entries.append(Shard(name, rows, os.path.getsize(path), first_date, last_date, first_branch, last_branch,
+                             time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(os.path.getmtime(path)))))
+    return entries
+
+
+def write_manifest(root, entries):
+    path = os.path.join(root, MANIFEST)
+    tmp = path + ".tmp"
+    with open(tmp, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(MANIFEST_HEADERS)
+        for entry in entries:
+            writer.writerow(list(entry))
+    os.replace(tmp, path)
+
+
+def load(root):
+    # the manifest, or the shard files scanned again if it is missing or out of date
+    entries = read_manifest(root)
+    names = sorted(name for name in os.listdir(root) if name.startswith("part-") and name.endswith(".csv"))
+    if [entry.shard for entry in entries] != names or any(
+            entry.bytes != os.path.getsize(os.path.join(root, entry.shard)) for entry in entries):
+        entries = scan(root)
+        write_manifest(root, entries)
+    return entries
+
+
+def shards(root, start=None, end=None, branch=None):
+    # paths of the shards that may hold rows for the filter; start/end are inclusive dates
+    chosen = []
+    for entry in load(root):
+        if not entry.rows:
+            continue
+        # a shard without ranges (rows written outside a unit) is always read
+        if entry.first_date and ((start and entry.last_date < str(start)[:10]) or (end and entry.first_date > str(end)[:10])):
+            continue
+        if branch and entry.first_branch and not (entry.first_branch <= branch <= entry.last_branch):
+            continue
+        chosen.append(os.path.join(root, entry.shard))
+    return chosen
+
+
+class ShardedWriter:
+
+    def __init__(self, path, header="", max_rows=EXCEL_ROWS, max_bytes=None, buffer_size=BUFFER_SIZE):
+        # path: the shard directory; header: the line every shard starts with
+        self.path = path
+        self.header = header.strip()
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.buffer_size = buffer_size
+        os.makedirs(path, exist_ok=True)
+        self.entries = load(path)
+        self.branch = self.date = None
+        self.rows = 0
+        self.commits = 0
+        self.f = None
+        if self.entries and not self.full(self.entries[-1].rows, self.entries[-1].bytes):
+            self.open(len(self.entries), "a")
+        else:
+            self.open(len(self.entries) + 1, "w")
+        self.checkpoint()
+
+    def open(self, index, mode):
+        # make shard `index` the current one; a new shard starts with the header
+        self.index = index
+        path = os.path.join(self.path, shard_name(index))
+        self.f = open(path, mode, encoding="utf-8", buffering=self.buffer_size)
+        if index > len(self.entries):
+            self.entries.append(Shard(shard_name(index), 0, 0, "", "", "", "", ""))
+            if self.header:
+                self.f.write(self.header + "\n")
+        self.f.flush()
+        self.shard_rows = self.entries[index - 1].rows
+        self.shard_bytes = os.path.getsize(path)
+        self.noted = False
+
+    def full(self, rows, size, line_bytes=0):
+        if self.max_rows and rows >= self.max_rows:
+            return True
+        return bool(self.max_bytes and rows and size + line_bytes > self.max_bytes)
+
+    def unit(self, branch, pos, date):
+        # the rows that follow belong to this (branch, pos, date) unit; its branch and date
+        # go into the ranges of every shard they are written to
+        self.branch, self.date = str(branch), str(date)[:10]
+        self.noted = False
+
+    def note(self):
+        entry = self.entries[self.index - 1]
+        first_date, last_date = merge_range(entry.first_date, entry.last_date, self.date)
+        first_branch, last_branch = merge_range(entry.first_branch, entry.last_branch, self.branch)
+        self.entries[self.index - 1] = entry._replace(first_date=first_date, last_date=last_date,
+                                                      first_branch=first_branch, last_branch=last_branch)
+        self.noted = True
+
+    def rotate(self):
+        self.update()
+        self.f.close()
+        self.open(self.index + 1, "w")
+
+    def write(self, line):
+        size = len(line.encode("utf-8")) + 1 if self.max_bytes else 0
+        if self.full(self.shard_rows, self.shard_bytes, size):
+            self.rotate()
+        if not self.noted and self.date is not None:
+            self.note()
+        self.f.write(line + "\n")
+        self.rows += 1
+        self.shard_rows += 1
+        self.shard_bytes += size
+
+    def write_lines(self, lines):
+        if self.max_bytes:
+            for line in lines:
+                self.write(line)
+            return
+        while lines:
+            if self.full(self.shard_rows, self.shard_bytes):
+                self.rotate()
+            if not self.noted and self.date is not None:
+                self.note()
+            room = self.max_rows - self.shard_rows if self.max_rows else len(lines)
+            batch, lines = lines[:room], lines[room:]
+            self.f.write("\n".join(batch) + "\n")
+            self.rows += len(batch)
+            self.shard_rows += len(batch)
+
+    def append_file(self, path):
+        # copy an already written file (e.g. a staged unit) line by line, so it is split
+        # where a shard fills up
+        with open(path, "r", encoding="utf-8", newline="") as src:
+            batch = []
+            for line in src:
+                batch.append(line.rstrip("\r\n"))
+                if len(batch) >= 10000:
+                    self.write_lines(batch)
+                    batch = []
+            self.write_lines(batch)
+
+    def update(self):
+        # the current shard's size and row count into its manifest entry
+        self.f.flush()
+        self.entries[self.index - 1] = self.entries[self.index - 1]._replace(
+            rows=self.shard_rows, bytes=os.fstat(self.f.fileno()).st_size, updated=time.strftime("%Y-%m-%d %H:%M:%S"))
+
+    def checkpoint(self):
+        self.update()
+        self.committed = (self.index, self.entries[self.index - 1].bytes, list(self.entries))
+
+    def commit(self):
+        self.update()
+        os.fsync(self.f.fileno())
+        self.commits += 1
+        self.checkpoint()
+
+    def rollback(self):
+        # back to the last commit: shards opened since are deleted, the one that was
+        # current then is truncated
+        index, size, entries = self.committed
+        self.f.close()
+        for entry in self.entries[index:]:
+            path = os.path.join(self.path, entry.shard)
+            if os.path.exists(path):
+                os.unlink(path)
+        with open(os.path.join(self.path, shard_name(index)), "r+b") as f:
+            f.truncate(size)
+        self.entries = list(entries)
+        self.open(index, "a")
+
+    def close(self):
+        if self.f is not None and not self.f.closed:
+            self.update()
+            self.f.close()
+            write_manifest(self.path, self.entries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('command', choices=["list", "rebuild"])
+    parser.add_argument('root', help='shard directory, e.g. record2025.parts')
+    parser.add_argument('--start', default=None, help='first date (YYYY-MM-DD)')
+    parser.add_argument('--end', default=None, help='last date (YYYY-MM-DD)')
+    parser.add_argument('--branch', default=None)
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        entries = scan(args.root)
+        write_manifest(args.root, entries)
+        print("Manifest rebuilt: %d shards" % len(entries))
+    else:
+        chosen = set(shards(args.root, args.start, args.end, args.branch))
+        for entry in read_manifest(args.root):
+            if os.path.join(args.root, entry.shard) in chosen:
+                print("%s  %8d rows  %10d bytes  %s..%s  %s..%s" % (entry.shard, entry.rows, entry.bytes, entry.first_date,
+                                                                     entry.last_date, entry.first_branch, entry.last_branch))
@@ -0,0 +1,205 @@
+import os
+import time
+import random
+import shutil
+import socket
+import tempfile
+import argparse
+import threading
+import functools
+from urllib.parse import parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Local stand-in for biggsph.com's fetch_list2.php and file download endpoints, so the
+# fetch path can be measured offline (see bench_fetch.py and bench_http.py).
+#
+#   python standin_server.py --port 8099 --latency 0.05 --error-rate 0.02 --rows 2000
+#   BIGGS_BASE_URL=http://127.0.0.1:8099/ python manual_fetch.py
+#
+# Files are either synthetic exports generated per (branch, pos, date) with the same
+# headers and cross-references as the real ones (`rows` rd5000 lines per unit), or, with
+# --recorded DIR, real exports served by name from a directory such as the repo's latest/.
+
+FILETYPES = ["rd1800", "blpr", "discount", "rd5000", "rd5500", "rd5800", "rd5900"]
+
+HEADERS = {
+    "rd1800": "DEP_CODE,DEP_DESC,POS,BRANCH",
+    "discount": "CODE,DESC,TYPE,VALUE,POS,BRANCH",
+    "rd5500": "INCODE,ITE_DESC,ECR_DESC,DEP_CODE,UNT_PRIC,UNIT,TAXPRCNT1,TAXAMOUNT1,TAX1DIV,POS,BRANCH",
+    "rd5800": "STORE_NUM,TRANSDATE,INVOICE,CAS_CODE,AMT_TENDER,CHANGE,NAME,REF_NO,DATE,TIME,TAG,PAYCODE,TRN_CODE,REF_CODE,ORDERSLIP,REC_NO,CUSINFO1,CUSINFO2,CUSINFO3,TIN_TAG,TRANSNO,POS,BRANCH",
+    "rd5900": "PAY_CODE,PAY_DESC,METHOD,MAX_AMOUNT,POS,BRANCH",
+    "blpr": "STORE,PHONE,TRANSNO,ORNO,POS,BRANCH",
+    "rd5000": "STORE_NUM,TRANSDATE,INVOICE,CAS_CODE,ITE_CODE,QUANTITY,UNT_PRIC,AMOUNT,DISCOUNT,SCHARGE,DT,DEP_CODE,DATE,TIME,CUS_CODE,TRN_CODE,ORNUM,TAG,DISC_CODE,SRNO,SRNAME,TYPE,BACKJOB,DELIVERY,PHONE,RIDER,FREE,INV_FLAG,REC_NO,LPAY_DISC,GC_EXCESS,VAT_FLAG,VATDIV,BDL_CODE,VAT_AMNT,VAT_DISC,VAT_PRIC,TRANSNO,POS,BRANCH",
+}
+
+PAYMENTS = ["CASH", "CREDIT CARD", "GCASH", "MAYA", "GIFT CHECK"]
+DISCOUNTS = ["PWD", "SNR CTZN 20%", "EMPLOYEE", "PROMO 10%", "BIRTHDAY"]
+
+
+@functools.lru_cache(maxsize=64)
+def synth_unit(branch, pos, date, rows):
+    # every export of one (branch, pos, date) as {filetype: bytes}; seeded so repeated
+    # requests for the same unit return identical files. The master files (rd5500, rd1800,
+    # discount, rd5900) only depend on (branch, pos), like the real ones from day to day.
+    rng = random.Random("%s|%s|%s" % (branch, pos, date))
+    master = random.Random("%s|%s" % (branch, pos))
+    tail = "%s,%s" % (pos, branch)
+    stamp = date + " 00:00:00"
+    depts = ["%02d" % i for i in range(1, 21)]
+    items = [("IT%03d" % i, master.choice(depts), 50 + master.randrange(400)) for i in range(200)]
+    files = {ftype: [HEADERS[ftype]] for ftype in FILETYPES}
+    for code in depts:
+        files["rd1800"].append("%s,DEPARTMENT %s,%s" % (code, code, tail))
+    for i, name in enumerate(DISCOUNTS, 1):
+        files["discount"].append("%d,%s,SUBTOTAL PERCENT,20.000,%s" % (i, name, tail))
+    for code, dept, price in items:
+        files["rd5500"].append("%s,ITEM %s,ITEM %s,%s,%d.000,PC,12.000,%.3f,9.330000,%s" % (code, code, code, dept, price, price * 0.12 / 1.12, tail))
+    for i, name in enumerate(PAYMENTS, 1):
+        files["rd5900"].append("%05d,%s,0,0.000,%s" % (i, name, tail))
+    line = 0
+    transno = 1000 * (int(pos) if str(pos).isdigit() else 1)
+    while line < rows:
+        transno += 1
+        clock = "%02d:%02d" % (rng.randrange(24), rng.randrange(60))
+        invoice = "%08d" % (transno + 250000)
+        kind = rng.choice("DDDTTC")
+        disc = str(rng.randrange(1, len(DISCOUNTS) + 1)) if rng.random() < 0.1 else ""
+        total = 0.0
+        for n in range(min(rows - line, rng.randrange(1, 5))):
+            code, dept, price = rng.choice(items)
+            qty = rng.randrange(1, 4)
+            amount = qty * price
+            total += amount
+            files["rd5000"].append(",".join([
+                "1", stamp, invoice, "19122", code, "%d.000" % qty, "%d.000" % price, "%.3f" % amount,
+                "0.000", "0.000", "SP", dept, stamp, clock, "", "S", "", "S", disc, "cashier", "",
+                kind, "1", "0", "", "", "0", "1", str(n + 1), "0", "0.000", "0", "9.330", code,
+                "%.3f" % (amount * 0.12 / 1.12), "0.000", "%d.000" % price, "%08d" % transno, tail]))
+            line += 1
+        files["rd5800"].append("1,%s,%s,19122,%.3f,0.000,,,%s,%s,S,%05d,S,,%d,1,,,,1,%08d,%s" % (
+            stamp, invoice, total, stamp, clock, rng.randrange(1, len(PAYMENTS) + 1), transno % 100, transno, tail))
+        if rng.random() < 0.3:
+            files["blpr"].append('TEMP,0917%07d,"=""%08d""","=""%s""",%s' % (rng.randrange(10 ** 7), transno, invoice, tail))
+    return {ftype: ("\n".join(lines) + "\n").encode("utf-8") for ftype, lines in files.items()}
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real server
+
+    def setup(self):
+        super().setup()
+        # headers and body go out as separate writes; avoid Nagle/delayed-ACK stalls
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+        if self.delay_or_fail():
+            return
+        form = {key: values[0] for key, values in parse_qs(body).items()}
+        names = self.server.listing(form.get("branch", ""), form.get("pos", ""), form.get("date", ""))
+        if names:
+            self.reply(",".join("uploads/" + name for name in names).encode("utf-8"))
+        else:
+            self.reply(b"<!doctype html><html><body>No data</body></html>", "text/html")
+
+    def do_GET(self):
+        if self.delay_or_fail():
+            return
+        content = self.server.content(os.path.basename(self.path))
+        if content is None:
+            self.reply(b"not found", status=404)
+        else:
+            self.reply(content)
+
+    def delay_or_fail(self):
+        with self.server.lock:
+            self.server.requests += 1
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if self.server.error_rate and random.random() < self.server.error_rate:
+            self.reply(b"server error", status=500)
+            return True
+        return False
+
+    def reply(self, body, content_type="text/plain", status=200):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), latency=0.0, error_rate=0.0, rows=500, snapshots=1, recorded=None):
+        super().__init__(address, StandInHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rows = rows
+        self.snapshots = snapshots  # >1 also lists older _19-59_ style snapshots
+        self.recorded = recorded
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+
+    @property
+    def base_url(self):
+        return "http://%s:%d/" % self.server_address[:2]
+
+    def listing(self, branch, pos, date):
+        if self.recorded:
+            prefix = "a_%s_%s_" % (branch, pos)
+            return sorted(name for name in os.listdir(self.recorded) if name.startswith(prefix) and "_%s_" % date in name)
+        times = ["20-00", "19-59", "19-58", "19-57"][:max(1, self.snapshots)]
+        return ["a_%s_%s_%s_%s_%s_.csv" % (branch, pos, ftype, date, clock) for ftype in FILETYPES for clock in times]
+
+    def content(self, name):
+        if self.recorded:
+            path = os.path.join(self.recorded, name)
+            if not os.path.isfile(path):
+                return None
+            with open(path, "rb") as f:
+                return f.read()
+        parts = name.rsplit(".", 1)[0].split("_")
+        if len(parts) < 5 or parts[3] not in FILETYPES:
+            return None
+        return synth_unit(parts[1], parts[2], parts[4], self.rows)[parts[3]]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def make_workspace(branches, root=None):
+    # throwaway project directory for Receive/Combiner (both work relative to the cwd):
+    # settings, headers and empty latest/ and temp/, with fresh caches and journal
+    here = os.path.dirname(os.path.abspath(__file__))
+    root = root or tempfile.mkdtemp(prefix="standin_")
+    for folder in ("settings", "latest", "temp"):
+        os.makedirs(os.path.join(root, folder), exist_ok=True)
+    with open(os.path.join(root, "settings", "branches.txt"), "w") as f:
+        f.write("\n".join(branches))
+    for name in ("settings/newBranches.txt", "aaa_headers.csv"):
+        if os.path.exists(os.path.join(here, name)):
+            shutil.copyfile(os.path.join(here, name), os.path.join(root, name))
+    return root
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every request')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with HTTP 500')
+    parser.add_argument('--rows', type=int, default=500, help='rd5000 lines per (branch, pos, date)')
+    parser.add_argument('--snapshots', type=int, default=1, help='snapshots listed per file type')
+    parser.add_argument('--recorded', default=None, help='serve real exports from this directory')
+    args = parser.parse_args()
+    server = StandInServer(("127.0.0.1", args.port), args.latency, args.error_rate, args.rows, args.snapshots, args.recorded)
+    print("Stand-in listening on " + server.base_url)
+    server.serve_forever()
@@ -0,0 +1,62 @@
+import os
+import sys
+import pytest
+
+# Shared fixtures for the pipeline tests. The modules live one directory up and import each
+# other by plain name, as the scripts there do, so that directory goes on sys.path.
+#
+#   cd "Fresh For Intern" && python -m pytest -q tests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PIPELINE = os.path.dirname(HERE)
+sys.path.insert(0, PIPELINE)
+# real exports recorded from biggsph.com, in the repository's latest/
+RECORDED = os.path.join(os.path.dirname(PIPELINE), "latest")
+
+from standin_server import FILETYPES, synth_unit, make_workspace
+import refcache
+from combiner import Combiner
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    # throwaway project root: settings/, aaa_headers.csv and an empty latest/
+    return make_workspace(["BR01", "BR02"], str(tmp_path))
+
+
+def write_unit(folder, branch, pos, date, files):
+    # {file type: bytes} of one unit as exports in `folder`
+    for ftype, data in files.items():
+        with open(os.path.join(folder, "a_%s_%s_%s_%s_20-00_.csv" % (branch, pos, ftype, date)), "wb") as f:
+            f.write(data)
+
+
+def synth_files(branch, pos, date, rows):
+    return {ftype: synth_unit(branch, pos, date, rows)[ftype] for ftype in FILETYPES}
+
+
+def combine(root, name, **kwargs):
+    # generate() over root/latest into root/<name>; the record's lines, header included
+    out_file = os.path.join(root, name)
+    kwargs.setdefault("ref_cache", refcache.RefCache())
+    kwargs.setdefault("store", None)
+    kwargs.setdefault("columnar", None)
+    kwargs.setdefault("shard_rows", None)
+    kwargs.setdefault("shard_bytes", None)
+    Combiner(workdir=os.path.join(root, "latest"), out_file=out_file, root=root, **kwargs).generate()
+    with open(out_file, "r", encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+def recorded_unit(name):
+    # {file type: bytes} of the recorded unit whose rd5000 export is `name`
+    path = os.path.join(RECORDED, name)
+    if not os.path.exists(path):
+        pytest.skip("recorded exports not available")
+    files = {}
+    for ftype in FILETYPES:
+        other = path.replace("_rd5000_", "_%s_" % ftype)
+        if os.path.exists(other):
+            with open(other, "rb") as f:
+                files[ftype] = f.read()
+    return files
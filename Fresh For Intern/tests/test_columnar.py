@@ -0,0 +1,86 @@
+import os
+import shutil
+import pytest
+import refcache
+from conftest import PIPELINE, RECORDED, write_unit, synth_files, combine
+from combiner import Combiner
+
+pytest.importorskip("pyarrow")
+from columnar import ColumnarStore, read_table, convert
+from pandasbiggs import CSVProcessor
+
+# The CSV record and the columnar record of the same units load into the same CSVProcessor
+# frame, rows the record forces to text (="05") included.
+
+DATE = "2026-02-09"
+ORDER = ["DATE", "BRANCH", "POS", "TRANSACTION NUMBER", "OR", "ITEM CODE", "TIME", "AMOUNT"]
+
+
+def forced_lines(files):
+    # copies of the unit's first data row whose item code and amounts have a leading zero,
+    # which the record wraps as ="..." so Excel keeps the zero
+    fields = files["rd5000"].decode("utf-8").splitlines()[1].split(",")
+    lines = []
+    for i, value in enumerate(["05.000", "0512", "00.500"]):
+        row = list(fields)
+        row[4] = "0%d12" % i  # ITE_CODE
+        row[5] = row[6] = row[7] = row[34] = value  # QUANTITY, UNT_PRIC, AMOUNT, VAT_AMNT
+        row[37] = "Z%07d" % i
+        lines.append(",".join(row))
+    return lines
+
+
+@pytest.fixture
+def root(workspace, monkeypatch):
+    folder = os.path.join(workspace, "latest")
+    if os.path.isdir(RECORDED):
+        for name in os.listdir(RECORDED):
+            if name.endswith(".csv"):
+                shutil.copyfile(os.path.join(RECORDED, name), os.path.join(folder, name))
+    files = synth_files("BR01", "1", DATE, 200)
+    files["rd5000"] = files["rd5000"].rstrip(b"\n") + b"\n" + "\n".join(forced_lines(files)).encode("utf-8") + b"\n"
+    write_unit(folder, "BR01", "1", DATE, files)
+    # Deredundancer reads conversion*.csv from the working directory and rewrites *_new.csv there
+    for name in os.listdir(PIPELINE):
+        if name.startswith("conversion") and not name.endswith("_new.csv"):
+            shutil.copyfile(os.path.join(PIPELINE, name), os.path.join(workspace, name))
+    monkeypatch.chdir(workspace)
+    return workspace
+
+
+def frame(path, fixed):
+    return CSVProcessor(path, fixed=fixed).getdata().sort_values(ORDER, kind="stable").reset_index(drop=True)
+
+
+def assert_same_frame(expected, actual):
+    assert list(actual.columns) == list(expected.columns)
+    assert len(actual) == len(expected)
+    for name in expected.columns:
+        assert actual[name].dtype == expected[name].dtype, name
+        same = (expected[name] == actual[name]) | (expected[name].isna() & actual[name].isna())
+        assert same.all(), (name, expected[name][~same].head(3).tolist(), actual[name][~same].head(3).tolist())
+
+
+@pytest.mark.parametrize("fixed", [False, True])
+def test_columnar_record_loads_like_the_csv(root, fixed):
+    lines = combine(root, "record2025.csv")
+    assert any('"=""05.000"""' in line for line in lines)
+    Combiner(workdir=os.path.join(root, "latest"), out_file=os.path.join(root, "unused.csv"), root=root,
+             ref_cache=refcache.RefCache(), store=None, columnar=ColumnarStore(os.path.join(root, "columnar")),
+             shard_rows=None, shard_bytes=None).generate()
+    assert not os.path.exists(os.path.join(root, "unused.csv"))  # the columnar record replaces the flat one
+    expected = frame(os.path.join(root, "record2025.csv"), fixed)
+    actual = frame(os.path.join(root, "columnar"), fixed)
+    assert_same_frame(expected, actual)
+    forced = expected[expected["TRANSACTION NUMBER"].str.startswith("Z")]
+    assert len(forced) == 3 and (forced["AMOUNT"] == 0).all()  # not a number to turn_decimal
+    assert forced["ITEM CODE"].tolist() == ['="0012"', '="0112"', '="0212"']
+
+
+def test_convert_keeps_text_forcing(root):
+    lines = combine(root, "record2025.csv")
+    assert convert(os.path.join(root, "record2025.csv"), os.path.join(root, "converted")) == 0
+    table = read_table(os.path.join(root, "converted"))
+    assert table.num_rows == len(lines) - 1
+    assert '="0012"' in table.column("ITEM CODE").cast("string").to_pylist()
+    assert_same_frame(frame(os.path.join(root, "record2025.csv"), False), frame(os.path.join(root, "converted"), False))
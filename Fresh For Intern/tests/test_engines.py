@@ -0,0 +1,58 @@
+import os
+import csv
+from conftest import write_unit, synth_files, combine
+
+DATE = "2026-02-09"
+
+
+def with_lines(files, extra):
+    # the unit's files with `extra` rd5000 lines added after the synthetic ones
+    files = dict(files)
+    files["rd5000"] = files["rd5000"].rstrip(b"\n") + b"\n" + "\n".join(extra).encode("utf-8") + b"\n"
+    return files
+
+
+def quoted_lines(files):
+    # copies of the unit's first data row with a quoted comma in a dropped column (SRNAME,
+    # 20), in a kept one (ITE_CODE, 4) and a quoted field without a comma
+    fields = files["rd5000"].decode("utf-8").splitlines()[1].split(",")
+    lines = []
+    for index, value in [(20, '"DELA CRUZ, JUAN"'), (4, '"IT,001"'), (4, '"%s"' % fields[4])]:
+        row = list(fields)
+        row[index] = value
+        row[37] = "Q%07d" % len(lines)
+        lines.append(",".join(row))
+    return lines
+
+
+def test_engines_agree_on_quoted_rows(workspace):
+    files = synth_files("BR01", "1", DATE, 300)
+    write_unit(os.path.join(workspace, "latest"), "BR01", "1", DATE, with_lines(files, quoted_lines(files)))
+    rows = combine(workspace, "rows.csv", engine="rows")
+    frame = combine(workspace, "frame.csv", engine="frame")
+    assert frame == rows
+    quoted = {}
+    for fields in csv.reader(rows):
+        if fields[17].startswith("Q"):
+            quoted[fields[17]] = fields
+    # the quoted comma stays in its field: every row keeps the record's 27 columns
+    assert sorted(quoted) == ["Q0000000", "Q0000001", "Q0000002"]
+    assert all(len(fields) == 27 and fields[-1] == "BR01" for fields in quoted.values())
+    assert quoted["Q0000001"][2] == "IT,001"
+    assert quoted["Q0000002"][18].startswith("ITEM ")  # the unquoted code found its product
+
+
+def test_engines_agree_on_nul_rows(workspace):
+    files = synth_files("BR01", "1", DATE, 300)
+    fields = files["rd5000"].decode("utf-8").splitlines()[1].split(",")
+    fields[20] = "CASH\x00IER"
+    write_unit(os.path.join(workspace, "latest"), "BR01", "1", DATE, with_lines(files, [",".join(fields)]))
+    assert combine(workspace, "frame.csv", engine="frame") == combine(workspace, "rows.csv", engine="rows")
+
+
+def test_parallel_frame_matches_serial_rows(workspace):
+    for branch in ("BR01", "BR02"):
+        files = synth_files(branch, "1", DATE, 200)
+        write_unit(os.path.join(workspace, "latest"), branch, "1", DATE, with_lines(files, quoted_lines(files)))
+    rows = combine(workspace, "rows.csv", engine="rows")
+    assert combine(workspace, "frame.csv", engine="frame", workers=2) == rows
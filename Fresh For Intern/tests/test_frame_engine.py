@@ -0,0 +1,116 @@
+import os
+import csv
+import shutil
+import pytest
+import combiner
+from conftest import RECORDED, combine
+from combiner import Combiner, REFERENCE_TYPES, TYPE_DICT, TIME_DICT
+
+# engine="frame" against the original per-line transform, Combiner.stringifyAppend(), on
+# the recorded exports in latest/, with quoted and NUL rows added to some of the units.
+
+HIDDEN = "\x1f"  # stands in for a quoted comma while stringifyAppend splits the line
+
+
+def baseline(oracle, line, tables):
+    # stringifyAppend's record line, or None where it raises. A quoted comma is hidden
+    # from its str.split and the field csv-quoted afterwards: the one rule the engines add.
+    if '"' in line:
+        line = ",".join(field.replace(",", HIDDEN) for field in next(csv.reader([line])))
+    try:
+        record = oracle.stringifyAppend("rd5000", line, tables["item"], tables["disc"], tables["dept"], TYPE_DICT, TIME_DICT,
+                                        tables["tnsc"], tables["paym"], tables["blpr"])
+    except Exception:
+        return None
+    fields = record.split(",")
+    for i in range(1, 18):
+        if HIDDEN in fields[i]:
+            fields[i] = '"' + fields[i].replace(HIDDEN, ",").replace('"', '""') + '"'
+    return ",".join(fields), fields[8]
+
+
+def expected_record(root):
+    # what GenAppend with stringifyAppend writes for every unit in root/latest: rd5000
+    # bottom-up, rows dated on another day and rows it raises on left out
+    folder = os.path.join(root, "latest")
+    oracle = Combiner(workdir=folder, root=root, store=None, columnar=None)
+    lines = []
+    for branch, pos, date, fileTypes in oracle.units(folder):
+        oracle.branch, oracle.pos, oracle.date = branch, pos, date
+        sources = {ftype: read_lines(folder, fileTypes[ftype]) for ftype in REFERENCE_TYPES if ftype in fileTypes}
+        tables = oracle.build_tables(sources)
+        for line in reversed(read_lines(folder, fileTypes["rd5000"]) if "rd5000" in fileTypes else []):
+            rendered = baseline(oracle, line, tables)
+            if rendered is not None and rendered[1].strip() == date:
+                lines.append(rendered[0])
+    return lines
+
+
+def read_lines(folder, name):
+    with open(os.path.join(folder, name + ".csv"), "r", encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+def add_rows(path, every, change):
+    # a changed copy of every `every`-th data row, inserted after it
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        lines = f.read().splitlines()
+    out = lines[:1]
+    for i, line in enumerate(lines[1:], 1):
+        out.append(line)
+        if i % every == 0:
+            fields = line.split(",")
+            if len(fields) > 37:
+                out.append(change(fields, i))
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write("\n".join(out) + "\n")
+
+
+def quoted(fields, i):
+    fields = list(fields)
+    fields[20] = '"CASHIER, %d"' % i  # dropped column: only the split changes
+    fields[4] = '"%s"' % fields[4]  # quotes without a comma: the code is still found
+    fields[37] = '"T,%d"' % i  # kept column: csv-quoted again in the record
+    return ",".join(fields)
+
+
+def nul(fields, i):
+    fields = list(fields)
+    fields[20] = "CASH\x00IER"
+    fields[35] += "\x00"  # kept column: the NUL reaches the record
+    return ",".join(fields)
+
+
+@pytest.fixture
+def recorded(workspace):
+    if not os.path.isdir(RECORDED):
+        pytest.skip("recorded exports not available")
+    folder = os.path.join(workspace, "latest")
+    for name in os.listdir(RECORDED):
+        if name.endswith(".csv"):
+            shutil.copyfile(os.path.join(RECORDED, name), os.path.join(folder, name))
+    rd5000 = sorted(name for name in os.listdir(folder) if "_rd5000_" in name)
+    for name in rd5000[0::3]:
+        add_rows(os.path.join(folder, name), 7, quoted)
+    for name in rd5000[1::3]:
+        add_rows(os.path.join(folder, name), 50, nul)
+    for name in rd5000[2::6]:
+        add_rows(os.path.join(folder, name), 9, quoted)
+        add_rows(os.path.join(folder, name), 40, nul)
+    return workspace
+
+
+@pytest.mark.parametrize("batch", [combiner.FRAME_BATCH, 64])
+def test_frame_matches_stringifyappend(recorded, monkeypatch, batch):
+    # small batches mix frame and row-wise batches within a unit
+    monkeypatch.setattr(combiner, "FRAME_BATCH", batch)
+    expected = expected_record(recorded)
+    assert any(',"T,' in line for line in expected) and any("\x00" in line for line in expected)
+    actual = combine(recorded, "frame.csv", engine="frame")[1:]
+    assert len(actual) == len(expected)
+    for row, (line, reference) in enumerate(zip(actual, expected)):
+        assert line == reference, "row %d" % row
+
+
+def test_rows_match_stringifyappend(recorded):
+    assert combine(recorded, "rows.csv", engine="rows")[1:] == expected_record(recorded)
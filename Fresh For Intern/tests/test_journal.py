@@ -0,0 +1,72 @@
+import os
+import time
+import datetime
+from journal import Journal
+from fetcher import Receive
+
+
+def days_ago(days):
+    return (datetime.date.today() - datetime.timedelta(days=days)).isoformat()
+
+
+def test_stages_reload_from_disk(tmp_path):
+    path = str(tmp_path / "journal.log")
+    journal = Journal(path)
+    date = days_ago(10)
+    journal.mark("BR01", 1, date, "listed", 7)
+    assert journal.stage("BR01", "1", date) == "listed" and not journal.complete("BR01", 1, date)
+    journal.mark("BR01", 1, date, "downloaded", 7, "abc")
+    assert journal.done("BR01", 1, date, "downloaded") and not journal.done("BR01", 1, date)
+    journal.mark_combined("BR01", 1, date, 412)
+    journal.close()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("BR02\t1\t%s\tcomb" % date)  # torn last line from a crash
+    journal = Journal(path)
+    assert journal.stage("BR01", 1, date) == "combined" and journal.complete("BR01", 1, date)
+    assert journal.stage("BR02", 1, date) == ""
+
+
+def test_empty_is_final_only_after_the_settle_window(tmp_path):
+    journal = Journal(str(tmp_path / "journal.log"), settle_days=3)
+    for days in (0, 1, 2, 3, 10):
+        journal.mark_combined("BR01", 1, days_ago(days), 0)
+        assert journal.stage("BR01", 1, days_ago(days)) == "empty"
+    # seen empty today: settled for dates 3 or more days back, retried for the others
+    assert [journal.complete("BR01", 1, days_ago(days)) for days in (0, 1, 2, 3, 10)] == [False, False, False, True, True]
+    assert not Journal(str(tmp_path / "journal.log"), settle_days=3, retry_empty=True).complete("BR01", 1, days_ago(10))
+
+
+def test_empty_seen_early_is_retried_later(tmp_path):
+    # an old date that was only seen empty on its own day, before the POS uploaded
+    path = str(tmp_path / "journal.log")
+    date = days_ago(10)
+    seen = int(time.mktime(datetime.date.fromisoformat(date).timetuple())) + 3600
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("BR01\t1\t%s\tempty\t0\t\t%d\n" % (date, seen))
+        f.write("BR01\t2\t%s\tcombined\t0\t\t%d\n" % (date, seen))  # zero-row line of an older journal
+    journal = Journal(path, settle_days=3)
+    assert journal.stage("BR01", 2, date) == "empty"
+    assert not journal.complete("BR01", 1, date) and not journal.complete("BR01", 2, date)
+    journal.compact()
+    assert not Journal(path, settle_days=3).complete("BR01", 1, date)  # compacting keeps the time
+
+
+def test_late_upload_is_fetched_on_the_next_run(workspace, monkeypatch):
+    monkeypatch.chdir(workspace)
+    date = days_ago(1)
+    name = "a_BR01_1_rd5000_%s_20-00_.csv" % date
+    receiver = Receive(date, date)
+    listings = [[""], [name]]  # "no data" today, the export on the next run
+
+    def download_file(url, destination):
+        path = os.path.join(workspace, destination, url.split("/")[-1])
+        with open(path, "w") as f:
+            f.write("STORE_NUM\n")
+        return path
+
+    monkeypatch.setattr(receiver, "send", lambda branch, pos, date: listings.pop(0))
+    monkeypatch.setattr(receiver, "download_file", download_file)
+    assert receiver.fetch_unit("BR01", 1, date) == []
+    assert receiver.journal.stage("BR01", 1, date) == "empty"
+    assert receiver.fetch_unit("BR01", 1, date) == [os.path.join(workspace, "latest", name)]
+    assert receiver.journal.stage("BR01", 1, date) == "downloaded"
@@ -0,0 +1,55 @@
+import json
+import datetime
+from listing import ListingCache, parse_listing, newest_snapshots, settled
+
+
+def days_ago(days):
+    return (datetime.date.today() - datetime.timedelta(days=days)).isoformat()
+
+
+def test_settled():
+    assert settled("2026-02-09", "2026-02-12", 3)
+    assert not settled("2026-02-09", "2026-02-11", 3)
+    assert not settled("2026-02-09", "", 3)
+
+
+def test_recent_listings_are_refreshed(tmp_path):
+    cache = ListingCache(str(tmp_path), settle_days=3)
+    files = ["a_BR01_1_rd5000_%s_20-00_.csv" % days_ago(1)]
+    cache.put("BR01", 1, days_ago(1), files)
+    cache.put("BR01", 2, days_ago(1), [""])
+    assert cache.get("BR01", 1, days_ago(1)) is None
+    assert cache.get("BR01", 2, days_ago(1)) is None
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_settled_listings_are_served(tmp_path):
+    cache = ListingCache(str(tmp_path), settle_days=3)
+    files = ["a_BR01_1_rd5000_%s_20-00_.csv" % days_ago(5)]
+    cache.put("BR01", 1, days_ago(5), files)
+    cache.put("BR01", 2, days_ago(5), [""])
+    assert cache.get("BR01", 1, days_ago(5)) == files
+    assert cache.get("BR01", 2, days_ago(5)) == [""]
+    assert cache.get("BR01", 1, days_ago(6)) is None
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_listing_fetched_inside_the_window_is_not_served(tmp_path):
+    # an old date whose listing was cached the day after it: the POS could still upload then
+    cache = ListingCache(str(tmp_path), settle_days=3)
+    date = days_ago(10)
+    cache.put("BR01", 1, date, [""])
+    path = cache.path("BR01", 1, date)
+    with open(path) as f:
+        entry = json.load(f)
+    entry["fetchedOn"] = days_ago(9)
+    with open(path, "w") as f:
+        json.dump(entry, f)
+    assert cache.get("BR01", 1, date) is None
+
+
+def test_newest_snapshot_wins():
+    entries = parse_listing(["a_BR01_1_rd5000_2026-02-09_19-59_.csv", "a_BR01_1_rd5000_2026-02-09_20-00_.csv",
+                             "a_BR01_1_rd5500_2026-02-09_19-59_.csv", "fetch_list2.php"])
+    assert sorted(entry.path for entry in newest_snapshots(entries)) == [
+        "a_BR01_1_rd5000_2026-02-09_20-00_.csv", "a_BR01_1_rd5500_2026-02-09_19-59_.csv"]
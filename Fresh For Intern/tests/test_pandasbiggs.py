@@ -0,0 +1,61 @@
+import os
+import shutil
+from decimal import Decimal
+import pytest
+from pandasbiggs import CSVProcessor, MONEY, SCALE
+from conftest import PIPELINE, RECORDED, combine
+
+# CSVProcessor on a record combined from the recorded exports: fixed-point amounts
+# (fixed=True) against the Decimal frame and plain float sums.
+
+
+@pytest.fixture
+def record(workspace, monkeypatch):
+    if not os.path.isdir(RECORDED):
+        pytest.skip("recorded exports not available")
+    for name in os.listdir(RECORDED):
+        if name.endswith(".csv"):
+            shutil.copyfile(os.path.join(RECORDED, name), os.path.join(workspace, "latest", name))
+    combine(workspace, "record2025.csv")
+    # Deredundancer reads conversion*.csv from the working directory and rewrites *_new.csv there
+    for name in os.listdir(PIPELINE):
+        if name.startswith("conversion") and not name.endswith("_new.csv"):
+            shutil.copyfile(os.path.join(PIPELINE, name), os.path.join(workspace, name))
+    monkeypatch.chdir(workspace)
+    return os.path.join(workspace, "record2025.csv")
+
+
+@pytest.mark.skipif(os.getenv("CSV_FIXED_POINT") == "1", reason="fixed point asked for")
+def test_amounts_are_decimal_pesos_by_default(record):
+    amounts = CSVProcessor(record).getdata()["AMOUNT"]
+    assert all(isinstance(value, Decimal) for value in amounts)
+
+
+def test_fixed_point_sums_match_decimal_and_float(record):
+    fixed = CSVProcessor(record, fixed=True).getdata()
+    decimals = CSVProcessor(record, fixed=False).getdata()
+    assert len(fixed) == len(decimals) > 1000
+    for name in MONEY:
+        assert fixed[name].dtype == "int64"
+        total = sum(decimals[name])
+        assert Decimal(int(fixed[name].sum())) / SCALE == total, name
+        assert fixed[name].sum() / SCALE == pytest.approx(sum(float(value) for value in decimals[name]), abs=1e-6), name
+
+
+def test_fixed_point_pivots_match_decimal(record):
+    fixed = CSVProcessor(record, fixed=True)
+    decimals = CSVProcessor(record, fixed=False)
+    dates = decimals.getdata()["DATE"].dropna()
+    start, end = dates.min().strftime("%Y-%m-%d"), dates.max().strftime("%Y-%m-%d")
+
+    def source(processor):
+        return processor.filter("", "", "", start, end).copy()
+
+    for pivot in ("deptmix_gen", "branchmix_gen", "top_prod"):
+        for value in ("Net Sales", "Unit Sales"):
+            expected = getattr(decimals, pivot)(source(decimals), value)
+            actual = getattr(fixed, pivot)(source(fixed), value)
+            column = "QUANTITY" if value == "Unit Sales" else "AMOUNT"
+            assert list(actual.iloc[:, 0]) == list(expected.iloc[:, 0]), (pivot, value)
+            assert [float(x) for x in actual[column]] == [float(x) for x in expected[column]], (pivot, value)
+    assert fixed.get_tc_ac(source(fixed)).data["ac_hist"] == decimals.get_tc_ac(source(decimals)).data["ac_hist"]
@@ -0,0 +1,37 @@
+import os
+from rawstore import RawStore
+
+
+def export(tmp_path, name, content):
+    path = str(tmp_path / name)
+    with open(path, "wb") as f:
+        f.write(content)
+    return path
+
+
+def test_blobs_are_plain_and_hardlinked_by_default(tmp_path):
+    store = RawStore(str(tmp_path / "rawstore"))
+    content = b"STORE_NUM,ITEM\r\n1,05\r\n"
+    digest = store.put("a_BR01_1_rd5500_2026-02-09_20-00_.csv", export(tmp_path, "first.csv", content))
+    store.put("a_BR01_1_rd5500_2026-02-10_20-00_.csv", export(tmp_path, "second.csv", content))
+    blob = store.blob_path(digest)
+    assert not blob.endswith(".gz") and os.listdir(os.path.dirname(blob)) == [digest]  # one blob for both days
+    dest = store.materialize("a_BR01_1_rd5500_2026-02-10_20-00_.csv", str(tmp_path / "restored.csv"))
+    assert os.path.samefile(dest, blob)
+    with store.open("a_BR01_1_rd5500_2026-02-09_20-00_.csv") as f:
+        assert f.read() == content
+
+
+def test_gzip_is_opt_in_and_both_kinds_are_read(tmp_path):
+    root = str(tmp_path / "rawstore")
+    plain, packed = b"plain\n", b"packed\n" * 100
+    RawStore(root).put("plain.csv", export(tmp_path, "plain.csv", plain))
+    store = RawStore(root, compress=True)
+    digest = store.put("packed.csv", export(tmp_path, "packed.csv", packed))
+    assert os.path.exists(store.blob_path(digest, True)) and not os.path.exists(store.blob_path(digest, False))
+    for reader in (store, RawStore(root)):
+        assert reader.has("plain.csv") and reader.has("packed.csv")
+        with open(reader.materialize("packed.csv", str(tmp_path / "out.csv")), "rb") as f:
+            assert f.read() == packed
+        with reader.open("plain.csv") as f:
+            assert f.read() == plain
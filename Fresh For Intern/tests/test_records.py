@@ -0,0 +1,48 @@
+import os
+import sys
+import subprocess
+import refcache
+import typedrecord
+from conftest import PIPELINE, write_unit, synth_files, combine
+from combiner import Combiner
+
+DATE = "2026-02-09"
+
+
+def test_lines_are_the_record_and_records_type_them(workspace):
+    write_unit(os.path.join(workspace, "latest"), "BR01", "1", DATE, synth_files("BR01", "1", DATE, 200))
+    record = combine(workspace, "record2025.csv")
+    comb = Combiner(root=workspace, ref_cache=refcache.RefCache(), store=None, columnar=None)
+    lines = list(comb.lines(os.path.join(workspace, "latest")))
+    assert lines == record[1:]
+    records = list(comb.records(os.path.join(workspace, "latest")))
+    assert records == [typedrecord.parse(line) for line in lines]
+    assert records[0]["OR"] == record[1].split(",")[1][4:-3]  # "=""00000001""" -> 00000001
+
+
+def test_generate_after_records_uses_its_own_workdir(workspace):
+    other = os.path.join(workspace, "other")
+    os.makedirs(other)
+    write_unit(os.path.join(workspace, "latest"), "BR01", "1", DATE, synth_files("BR01", "1", DATE, 100))
+    write_unit(other, "BR02", "2", DATE, synth_files("BR02", "2", DATE, 100))
+    expected = combine(workspace, "expected.csv")
+    out_file = os.path.join(workspace, "record.csv")
+    comb = Combiner(workdir=os.path.join(workspace, "latest"), out_file=out_file, root=workspace,
+                    ref_cache=refcache.RefCache(), store=None, columnar=None, shard_rows=None, shard_bytes=None)
+    assert {record["BRANCH"] for record in comb.records(other)} == {"BR02"}
+    comb.generate()
+    with open(out_file, "r", encoding="utf-8") as f:
+        assert f.read().splitlines() == expected
+
+
+def test_runner_writes_the_record_format(workspace):
+    write_unit(os.path.join(workspace, "latest"), "BR01", "1", DATE, synth_files("BR01", "1", DATE, 100))
+    write_unit(os.path.join(workspace, "latest"), "BR02", "2", DATE, synth_files("BR02", "2", DATE, 100))
+    expected = combine(workspace, "record2025.csv")
+    out = os.path.join(workspace, "parsed.csv")
+    env = dict(os.environ, PYTHONPATH=PIPELINE, RECORD_STORE="", RECORD_COLUMNAR="", QUALITY_LOG="")
+    subprocess.run([sys.executable, os.path.join(PIPELINE, "python-app", "combiner_runner.py"),
+                    "--workdir", os.path.join(workspace, "latest"), "--out", out, "--root", workspace],
+                   check=True, cwd=workspace, env=env, capture_output=True)
+    with open(out, "r", encoding="utf-8") as f:
+        assert f.read().splitlines() == expected
@@ -0,0 +1,108 @@
+import os
+import multiprocessing
+from recordwriter import RecordWriter, RecordBuffer
+
+
+def read(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+def test_commit_and_rollback(tmp_path):
+    path = str(tmp_path / "record.csv")
+    with open(path, "w") as f:
+        f.write("HEADER\n")
+    with RecordWriter(path) as writer:
+        writer.write("a1")
+        writer.write_lines(["a2", "a3"])
+        assert read(path) == ["HEADER"]  # nothing reaches the record before commit()
+        writer.commit()
+        writer.write("b1")
+        writer.rollback()
+        writer.write("c1")
+        writer.commit()
+        writer.write("d1")  # never committed: dropped on close
+    assert read(path) == ["HEADER", "a1", "a2", "a3", "c1"]
+    assert not [name for name in os.listdir(str(tmp_path)) if name.endswith(".part")]  # staging file removed
+
+
+def test_rollback_keeps_rows_other_writers_committed(tmp_path):
+    path = str(tmp_path / "record.csv")
+    first, second = RecordWriter(path), RecordWriter(path)
+    first.write("first-1")
+    first.commit()
+    first.write("first-2")
+    second.write("second-1")
+    second.commit()
+    first.rollback()
+    first.write("first-3")
+    first.commit()
+    first.close()
+    second.close()
+    assert read(path) == ["first-1", "second-1", "first-3"]
+
+
+def test_append_file(tmp_path):
+    path = str(tmp_path / "record.csv")
+    shard = str(tmp_path / "shard.csv")
+    with open(shard, "w") as f:
+        f.write("s1\ns2\n")
+    with RecordWriter(path) as writer:
+        writer.write("a1")
+        writer.append_file(shard)
+        writer.write("a2")
+        writer.commit()
+        writer.append_file(shard)
+        writer.rollback()
+    assert read(path) == ["a1", "s1", "s2", "a2"]
+
+
+def test_private_file_rollback(tmp_path):
+    path = str(tmp_path / "unit.csv")
+    with RecordWriter(path, mode="w") as writer:
+        writer.write("HEADER")
+        writer.commit()
+        writer.write("x1")
+        writer.rollback()
+        writer.write("y1")
+        writer.commit()
+    with open(path, "rb") as f:
+        assert f.read() == b"HEADER\ny1\n"
+
+
+def write_units(path, name, units, rows):
+    # units of `rows` lines each; a small buffer makes the writer flush inside a unit
+    with RecordWriter(path, buffer_size=256) as writer:
+        for unit in range(units):
+            writer.write_lines(["%s,%d,%d" % (name, unit, row) for row in range(rows)])
+            if unit % 5 == 4:
+                writer.write("%s,%d,failed" % (name, unit))
+                writer.rollback()
+            writer.commit()
+
+
+def test_processes_share_one_record(tmp_path):
+    path = str(tmp_path / "record.csv")
+    processes = [multiprocessing.Process(target=write_units, args=(path, "p%d" % i, 20, 300)) for i in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+    lines = read(path)
+    assert len(lines) == 4 * 16 * 300  # every fifth unit was rolled back
+    # every unit is one contiguous block in its own row order
+    for start in range(0, len(lines), 300):
+        name, unit = lines[start].split(",")[:2]
+        assert lines[start:start + 300] == ["%s,%s,%d" % (name, unit, row) for row in range(300)]
+
+
+def test_buffer_commit_and_rollback():
+    buffer = RecordBuffer()
+    buffer.write("a1")
+    buffer.commit()
+    buffer.write_lines(["b1", "b2"])
+    buffer.rollback()
+    buffer.write("c1")
+    assert buffer.take() == ["a1", "c1"]
+    assert buffer.take() == []
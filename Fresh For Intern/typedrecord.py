@@ -0,0 +1,72 @@
+import datetime
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+from columnar import HEADERS, AMOUNTS
+from rowplan import split_row
+
+# Typed form of a record line, for callers that take the Combiner's output in-process
+# (Combiner.records()) instead of reading record2025.csv back and splitting it again.
+# A record is a dict keyed by the aaa_headers.csv column names:
+#   amounts          Decimal (exact; None if the field is not a number)
+#   DATE             datetime.date (None if it is not YYYY-MM-DD)
+#   everything else  str, "" when empty
+# The ="..." wrappers the record uses to keep leading zeros in Excel are dropped, so OR is
+# "00013662" rather than '="00013662"'. Amounts and dates repeat a few thousand values at
+# most and are converted once per distinct value.
+#
+#   for record in Combiner().records("latest"):
+#       record["BRANCH"], record["DATE"], record["AMOUNT"]
+
+AMOUNT_COLUMNS = [HEADERS.index(name) for name in AMOUNTS]
+DATE_COLUMN = HEADERS.index("DATE")
+MEMO_SIZE = 65536
+
+
+def unwrap(value):
+    # ="0001" -> 0001
+    if value.startswith('="') and value.endswith('"') and len(value) >= 3:
+        return value[2:-1]
+    return value
+
+
+@lru_cache(MEMO_SIZE)
+def amount(value):
+    try:
+        number = Decimal(unwrap(value))
+    except InvalidOperation:
+        return None
+    return number if number.is_finite() else None
+
+
+@lru_cache(MEMO_SIZE)
+def date(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+def parse(line):
+    # one record line as a typed record; None for a line with the wrong number of fields
+    fields = split_row(line)
+    if len(fields) != len(HEADERS):
+        return None
+    values = [unwrap(value) for value in fields]
+    for i in AMOUNT_COLUMNS:
+        values[i] = amount(fields[i])
+    values[DATE_COLUMN] = date(fields[DATE_COLUMN])
+    return dict(zip(HEADERS, values))
+
+
+def text(record):
+    # the record's values as strings, in HEADERS order (e.g. for csv.writer)
+    values = []
+    for name in HEADERS:
+        value = record[name]
+        if value is None:
+            values.append("")
+        elif isinstance(value, datetime.date):
+            values.append(value.isoformat())
+        else:
+            values.append(str(value))
+    return values
@@ -0,0 +1,178 @@
+import os
+import time
+import argparse
+import threading
+from listing import parse_listing_name, newest_snapshots
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError:  # optional; without it the folder is polled
+    INotify = flags = None
+
+# Incremental combine. Instead of one Combiner.generate() over latest/ once the fetch loop
+# has finished a date, a Watcher follows the folder and combines every (branch, pos, date)
+# as soon as its files are complete, while the other units are still downloading.
+# Changes are picked up with inotify when inotify_simple is installed (Linux) and by
+# polling every `interval` seconds otherwise. A unit is complete when
+#   - the journal says it was downloaded (Receive marks a unit downloaded once all of its
+#     files are in, so a unit that is only listed is still being fetched), or
+#   - it is not in the journal and none of its files changed for `settle` seconds
+# and it has an rd5000 file; units without one are combined (to nothing) by stop(), as
+# generate() would. A combined unit is checkpointed in the journal like any other and
+# also remembered here, so it is never combined again, not even when a newer snapshot
+# turns up. With remove=True its files are deleted once combined (the raw store keeps
+# them), so latest/ only holds what is still pending.
+#
+#   python watcher.py latest --journal journal.log
+#
+# Receive.fetch_incremental() runs one next to the downloads.
+
+SETTLE = float(os.getenv("WATCH_SETTLE", "30"))
+INTERVAL = float(os.getenv("WATCH_INTERVAL", "1"))
+
+
+class Watcher:
+
+    def __init__(self, combiner, folder, settle=SETTLE, interval=INTERVAL, remove=False):
+        # combiner: the Combiner units go through (its store, journal and outputs)
+        self.combiner = combiner
+        self.folder = os.path.abspath(folder)
+        self.combiner.workdir = self.folder
+        self.journal = combiner.journal
+        self.settle = settle
+        self.interval = interval
+        self.remove = remove
+        self.done = set()  # (branch, pos, date) combined, or found combined in the journal
+        self.combined = 0
+        self.rows = 0
+        self.error = None
+        self.thread = None
+        self.stopping = threading.Event()
+        self.inotify = None
+        if INotify is not None:
+            try:
+                self.inotify = INotify()
+                self.inotify.add_watch(self.folder, flags.CREATE | flags.CLOSE_WRITE | flags.MOVED_TO | flags.DELETE)
+            except OSError:  # e.g. out of watches; polling still works
+                self.inotify = None
+
+    def units(self):
+        # {(branch, pos, date): {file type: file name}} for the newest snapshots in the
+        # folder, every file name per unit (older snapshots too) and each file's mtime
+        entries = []
+        names = {}
+        mtimes = {}
+        with os.scandir(self.folder) as it:
+            for item in it:
+                entry = parse_listing_name(item.name) if item.name.endswith(".csv") else None
+                if entry is None:
+                    continue
+                try:
+                    mtimes[item.name] = item.stat().st_mtime
+                except FileNotFoundError:
+                    continue  # removed meanwhile, e.g. a deferred unit
+                entries.append(entry)
+                names.setdefault((entry.branch, entry.pos, entry.date), []).append(item.name)
+        units = {}
+        for entry in newest_snapshots(entries):
+            units.setdefault((entry.branch, entry.pos, entry.date), {})[entry.filetype] = entry.path
+        return units, names, mtimes
+
+    def ready(self, key, files, mtimes, final):
+        if final:
+            return True
+        if "rd5000" not in files:
+            return False
+        stage = self.journal.stage(*key) if self.journal is not None else ""
+        if stage in ("listed", "downloaded"):
+            return stage == "downloaded"
+        return time.time() - max(mtimes[name] for name in files.values()) >= self.settle
+
+    def scan(self, final=False):
+        # combine every complete unit not combined yet; final: the folder will not change
+        # any more, so every unit in it is complete
+        units, names, mtimes = self.units()
+        for key in sorted(units):
+            if key in self.done:
+                continue
+            if self.journal is not None and self.journal.complete(*key):
+                self.done.add(key)
+                continue
+            if self.ready(key, units[key], mtimes, final):
+                self.combine(key, units[key], names[key])
+
+    def combine(self, key, files, names):
+        branch, pos, date = key
+        rows = self.combiner.combine_unit(branch, pos, date, {ftype: name.rsplit(".", 1)[0] for ftype, name in files.items()})
+        self.done.add(key)
+        self.combined += 1
+        self.rows += rows
+        if self.remove:
+            for name in names:
+                try:
+                    os.unlink(os.path.join(self.folder, name))
+                except FileNotFoundError:
+                    pass
+
+    def wait(self):
+        # until something changes in the folder, or `interval` seconds at most
+        if self.inotify is not None:
+            self.inotify.read(timeout=int(self.interval * 1000))
+        else:
+            self.stopping.wait(self.interval)
+
+    def run(self):
+        while not self.stopping.is_set():
+            self.scan()
+            self.wait()
+
+    def guarded(self):
+        try:
+            self.run()
+        except BaseException as e:
+            self.error = e
+
+    def start(self):
+        self.thread = threading.Thread(target=self.guarded, name="combine-watcher", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        # the folder is final: combine what is left and close the combiner's outputs; an
+        # error from the watch thread is raised here
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join()
+        try:
+            if self.error is None:
+                self.scan(final=True)
+        finally:
+            self.combiner.finish()
+            if self.inotify is not None:
+                self.inotify.close()
+        if self.error is not None:
+            raise self.error
+
+
+if __name__ == "__main__":
+    from combiner import Combiner
+    from journal import Journal
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('folder', help='folder the exports are downloaded to, e.g. latest')
+    parser.add_argument('--journal', default=None, help='checkpoint journal, e.g. journal.log')
+    parser.add_argument('--settle', type=float, default=SETTLE, help='seconds without changes after which a unit outside the journal is complete')
+    parser.add_argument('--interval', type=float, default=INTERVAL)
+    parser.add_argument('--remove', action='store_true', help='delete a unit\'s files once it is combined')
+    args = parser.parse_args()
+
+    watcher = Watcher(Combiner(journal=Journal(args.journal) if args.journal else None), args.folder,
+                      args.settle, args.interval, args.remove)
+    print("Watching %s (%s); Ctrl-C to stop" % (watcher.folder, "inotify" if watcher.inotify else "polling"))
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+    # units still pending stay in the folder for the next run
+    watcher.combiner.finish()
+    print("Combined %d units, %d rows" % (watcher.combined, watcher.rows))